@@ -22,14 +22,8 @@ fi
 
 echo "[`date '+%F %T'`] Pipeline start"
 
-# 1) Ingest
-python -m herculesbet.ingest_theodds || { echo "ingest_theodds FAILED"; exit 1; }
-
-# 2) Model
-python -m herculesbet.run_model_poisson || { echo "run_model_poisson FAILED"; exit 1; }
-
-# 3) Pick generálás
-python -m herculesbet.generate_picks || { echo "generate_picks FAILED"; exit 1; }
+# ingest -> modellek -> pickek -> settlement egy interpreterben (PIPELINE_MODE=subprocess: régi mód)
+python -m herculesbet.run_pipeline || { echo "run_pipeline FAILED"; exit 1; }
 
 echo "[`date '+%F %T'`] Pipeline OK"
 
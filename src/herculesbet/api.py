@@ -1,87 +1,197 @@
-from fastapi import FastAPI
-from sqlalchemy.orm import Session, aliased
-from .db import SessionLocal
+import base64
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from .db_async import async_engine, get_async_db
+from . import metrics
 from .models import EdgePick, Match, Team, League, Bookmaker
+from .export import FORMATS, make_encoder, stream_export, picks_export_query, odds_export_query
+from .stats import SQL_CACHED_STATS, SQL_COMPUTE_STATS, SQL_RECOMPUTE_STATS, summary_from_row
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # leálláskor a pool kapcsolatai lezárulnak
+    await async_engine.dispose()
 
-app = FastAPI(title="HerculesBet API v0.1")
+app = FastAPI(title="HerculesBet API v0.1", lifespan=lifespan)
+metrics.set_default_stage("api")   # a kérések SQL-je "api" stage-ként számol
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text formátum; processzenként (több uvicorn worker -> workerenként külön)."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+Home = aliased(Team)
+Away = aliased(Team)
+
+MAX_PAGE_SIZE = 500
+
+# /picks mezők: név -> (oszlop, szükséges joinok); csak a kért mezők joinjai kerülnek a lekérdezésbe
+PICK_FIELDS = {
+    "match_id": (EdgePick.match_id, ()),
+    "league": (League.name, ("match", "league")),
+    "home": (Home.name, ("match", "home")),
+    "away": (Away.name, ("match", "away")),
+    "start_time": (Match.start_time, ("match",)),
+    "selection": (EdgePick.selection, ()),
+    "bookmaker": (Bookmaker.name, ("bookmaker",)),
+    "odds": (EdgePick.offered_odds, ()),
+    "p_model": (EdgePick.model_prob, ()),
+    "edge": (EdgePick.edge, ()),
+    "stake_fraction": (EdgePick.stake_fraction, ()),
+    "created_at": (EdgePick.created_at, ()),
+    "status": (EdgePick.status, ()),
+    "result": (EdgePick.result, ()),
+    "profit": (EdgePick.profit, ()),
+    "closing_odds": (EdgePick.closing_odds, ()),
+    "clv": (EdgePick.clv, ()),
+}
+
+def encode_cursor(created_at: datetime, pick_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{pick_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Hibás cursor -> ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, pick_id = raw.split("|")
+        return datetime.fromisoformat(ts), int(pick_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+def picks_query(limit: int, fields: Optional[Sequence[str]] = None,
+                after: Optional[Tuple[datetime, int]] = None,
+                league: Optional[str] = None, status: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None,
+                min_edge: Optional[float] = None):
+    """
+    /picks lekérdezés (sync és async sessionnel is futtatható); csak oszlopok, ORM entitás nélkül.
+    Keyset lapozás (created_at, id) DESC szerint: after = az előző oldal utolsó kulcsa.
+    A kulcs _k_ts / _k_id néven mindig benne van a sorban (cursorhoz).
+    """
+    fields = list(fields or PICK_FIELDS)
+    joins = {j for f in fields for j in PICK_FIELDS[f][1]}
+    if league is not None:
+        joins.add("match")
+
+    q = select(
+        *[PICK_FIELDS[f][0].label(f) for f in fields],
+        EdgePick.created_at.label("_k_ts"), EdgePick.id.label("_k_id"),
+    ).select_from(EdgePick)
+    if "match" in joins:
+        q = q.join(Match, EdgePick.match_id == Match.id)
+    if "home" in joins:
+        q = q.join(Home, Match.home_team_id == Home.id)
+    if "away" in joins:
+        q = q.join(Away, Match.away_team_id == Away.id)
+    if "league" in joins:
+        q = q.join(League, Match.league_id == League.id)
+    if "bookmaker" in joins:
+        q = q.join(Bookmaker, EdgePick.bookmaker_id == Bookmaker.id)
+
+    if league is not None:
+        q = q.where(Match.league_id == select(League.id).where(League.name == league).scalar_subquery())
+    if status is not None:
+        q = q.where(EdgePick.status == status)
+    if since is not None:
+        q = q.where(EdgePick.created_at >= since)
+    if until is not None:
+        q = q.where(EdgePick.created_at < until)
+    if min_edge is not None:
+        q = q.where(EdgePick.edge >= min_edge)
+    if after is not None:
+        q = q.where(tuple_(EdgePick.created_at, EdgePick.id) < tuple_(*after))
+
+    return q.order_by(EdgePick.created_at.desc(), EdgePick.id.desc()).limit(limit)
+
+def pick_to_dict(row) -> dict:
+    d = dict(row._mapping)
+    del d["_k_ts"], d["_k_id"]
+    for k in ("start_time", "created_at"):
+        if k in d:
+            d[k] = d[k].isoformat()
+    return d
+
 @app.get("/picks")
-def picks(limit: int = 50):
-    db: Session = SessionLocal()
+async def picks(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                cursor: Optional[str] = None,
+                league: Optional[str] = None,
+                status: Optional[str] = None,
+                since: Optional[datetime] = None,
+                until: Optional[datetime] = None,
+                min_edge: Optional[float] = None,
+                fields: Optional[str] = Query(None, description="vesszővel elválasztott mezőlista"),
+                db: AsyncSession = Depends(get_async_db)):
+    """Legfrissebb pickek; következő oldal: ?cursor=<X-Next-Cursor header>."""
+    wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    unknown = [f for f in wanted or () if f not in PICK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(unknown)}")
     try:
-        Home = aliased(Team)
-        Away = aliased(Team)
-
-        rows = (
-            db.query(EdgePick, Match, Home, Away, League, Bookmaker)
-            .join(Match, EdgePick.match_id == Match.id)
-            .join(Home, Match.home_team_id == Home.id)
-            .join(Away, Match.away_team_id == Away.id)
-            .join(League, Match.league_id == League.id)
-            .join(Bookmaker, EdgePick.bookmaker_id == Bookmaker.id)
-            .order_by(EdgePick.created_at.desc())
-            .limit(limit)
-            .all()
-        )
-
-        out = []
-        for ep, m, home, away, league, bk in rows:   # <-- 6 elem!
-            out.append({
-                "match_id": m.id,
-                "league": league.name,
-                "home": home.name,
-                "away": away.name,
-                "start_time": m.start_time.isoformat(),
-                "selection": ep.selection,
-                "bookmaker": bk.name,               # <-- új mező
-                "odds": ep.offered_odds,
-                "p_model": ep.model_prob,
-                "edge": ep.edge,
-                "stake_fraction": ep.stake_fraction,
-                "created_at": ep.created_at.isoformat(),
-                "status": ep.status,
-                "result": ep.result,
-                "profit": ep.profit,
-                "closing_odds": ep.closing_odds,
-                "clv": ep.clv,
-            })
-        return out
-    finally:
-        db.close()
-
-from sqlalchemy import func
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # limit+1 sor: így üres utolsó oldal nélkül tudjuk, van-e következő
+    rows = (await db.execute(picks_query(
+        limit + 1, wanted, after, league=league, status=status,
+        since=since, until=until, min_edge=min_edge,
+    ))).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1]._k_ts, rows[-1]._k_id)
+    # csak JSON-natív típusok -> jsonable_encoder kihagyható
+    return JSONResponse([pick_to_dict(row) for row in rows], headers=headers)
 
 @app.get("/stats/summary")
-def stats_summary():
-    db = SessionLocal()
+async def stats_summary(db: AsyncSession = Depends(get_async_db)):
+    # pick_stats: egy sor; az írók csak elavulttá jelölik -> friss sor konstans idő,
+    # elavult sor egy aggregáló menet (és az eredmény visszaírása)
+    row = (await db.execute(SQL_CACHED_STATS)).first()
+    if row is not None and not row.fresh:
+        # üres RETURNING: egy párhuzamos olvasó már frissítette
+        row = (await db.execute(SQL_RECOMPUTE_STATS)).first() or (await db.execute(SQL_CACHED_STATS)).first()
+        await db.commit()
+    if row is None:   # nincs gyorsítótár-sor (db_init előtti DB) -> egy aggregáló menet
+        row = (await db.execute(SQL_COMPUTE_STATS)).first()
+    return summary_from_row(row)
+
+def _export_response(query, fmt: str, name: str) -> StreamingResponse:
     try:
-        total = db.query(func.count()).select_from(EdgePick).scalar() or 0
-        settled = db.query(func.count()).select_from(
-            db.query(EdgePick).filter(EdgePick.status=="settled").subquery()
-        ).scalar() or 0
-        wins = db.query(func.count()).select_from(
-            db.query(EdgePick).filter(EdgePick.status=="settled", EdgePick.result=="win").subquery()
-        ).scalar() or 0
-
-        # egység-bankroll profit (összegzett 'profit' arány)
-        profit_sum = db.query(func.coalesce(func.sum(EdgePick.profit), 0.0))\
-            .filter(EdgePick.status=="settled").scalar() or 0.0
-
-        avg_edge = db.query(func.avg(EdgePick.edge)).scalar() or 0.0
-        avg_clv  = db.query(func.avg(EdgePick.clv)).filter(EdgePick.clv != None).scalar()
-        return {
-            "picks_total": total,
-            "picks_settled": settled,
-            "wins": wins,
-            "hit_rate": (wins/settled) if settled else None,
-            "profit_sum_units": profit_sum,
-            "avg_edge": avg_edge,
-            "avg_clv": avg_clv,
-        }
-    finally:
-        db.close()
+        encoder = make_encoder(fmt, query)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="format=arrow requires pyarrow")
+    ext = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows"}[fmt]
+    return StreamingResponse(
+        stream_export(query, encoder), media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{ext}"'},
+    )
+
+@app.get("/export/picks")
+async def export_picks(format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$"),
+                       league: Optional[str] = None,
+                       since: Optional[datetime] = None,
+                       until: Optional[datetime] = None):
+    """edge_picks stream (created_at szerint), szűrés: liga, created_at [since, until)."""
+    return _export_response(picks_export_query(league, since, until), format, "edge_picks")
 
+@app.get("/export/odds")
+async def export_odds(format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$"),
+                      league: Optional[str] = None,
+                      since: Optional[datetime] = None,
+                      until: Optional[datetime] = None):
+    """odds_snapshots stream, szűrés: liga, captured_at [since, until)."""
+    return _export_response(odds_export_query(league, since, until), format, "odds_snapshots")
@@ -0,0 +1,358 @@
+"""
+Walk-forward backtest: a történet visszajátszása ugyanazokkal a szabályokkal, mint élesben.
+
+Egyszer tölt: meccsek (LeagueHistory), odds_snapshots és (tárolt modelleknél) probabilities,
+mind oszlop-tömbökbe. Időben előre lépve BACKTEST_REFIT_DAYS-enként újrailleszti a Poisson / ELO
+modellt a döntés pillanatáig ismert eredményeken (kezdés + BACKTEST_RESULT_LAG_HOURS), majd
+a meccseket kezdés előtt BACKTEST_DECISION_HOURS-szal értékeli: az akkor érvényes legjobb ár
+(generate_picks: lookback, legjobb odds / legfrissebb / legkisebb iroda-id), MIN_EDGE és Kelly.
+Settlement szabályai: profit egység-bankrollban, closing = ugyanazon iroda utolsó ára kezdésig,
+CLV = (odds - closing) / closing. Drawdown a nem kamatos egység-bankroll görbén.
+
+Modellek: "poisson" és "elo" újraillesztve; bármely más név a model_runs.model_name tárolt
+kimenete, a döntés idején legutolsó futás szerint.
+    python -m herculesbet.backtest --start 2024-08-01 --end 2025-06-01 --models poisson,elo
+"""
+import argparse
+import csv
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from .config import (
+    BACKTEST_REFIT_DAYS, BACKTEST_DECISION_HOURS, BACKTEST_RESULT_LAG_HOURS, MODEL_WORKERS,
+)
+from .db import SessionLocal
+from .generate_picks import EDGE_MIN, KELLY_FRACTION, LOOKBACK_HOURS
+from .history import LeagueHistory, get_history, map_leagues, stream_array
+from .models_elo import EloState, apply_results, probs_for_pairs
+from .models_poisson import Rates, fit_rates, _lambdas, probs_1x2_batch
+
+SELECTIONS = ("H", "D", "A")   # kód = index (eredmény és kimenetel)
+REFIT_MODELS = ("poisson", "elo")
+
+def _epoch_s(dt: datetime) -> int:
+    return int(np.datetime64(dt, "s").astype(np.int64))
+
+# -----------------------------
+# Ligánkénti walk-forward (worker processzben is futhat)
+# -----------------------------
+@dataclass
+class LeagueTask:
+    history: LeagueHistory
+    t0: int                    # backtest kezdete (epoch mp)
+    step: int                  # újraillesztési lépés (mp)
+    n_windows: int
+    decision: int              # döntés ennyivel kezdés előtt (mp)
+    lag: int                   # eredmény ennyivel kezdés után ismert (mp)
+    models: tuple              # REFIT_MODELS részhalmaza
+
+@dataclass
+class LeagueReplay:
+    match_id: np.ndarray       # értékelt meccsek (lezártak, döntés a backtest ablakban)
+    start_s: np.ndarray
+    result: np.ndarray         # SELECTIONS index
+    probs: Dict[str, np.ndarray] = field(default_factory=dict)   # modell -> (N, 3)
+
+def replay_league(task: LeagueTask) -> LeagueReplay:
+    """Ablakonként: illesztés az addig ismert eredményeken, majd az ablak meccseinek valószínűségei."""
+    h = task.history
+    start_s = h.start_time.astype("datetime64[s]").astype(np.int64)
+    fin = h.finished_mask()
+    dec_s = start_s - task.decision
+    target = fin & (dec_s >= task.t0) & (dec_s < task.t0 + task.n_windows * task.step)
+    tpos = np.flatnonzero(target)
+    win = (dec_s[tpos] - task.t0) // task.step          # tpos időrendben -> win nem csökken
+
+    fin_pos = np.flatnonzero(fin)
+    fin_start = start_s[fin_pos]
+    hs, as_ = h.home_score[tpos], h.away_score[tpos]
+    out = LeagueReplay(h.match_id[tpos], start_s[tpos],
+                       np.where(hs > as_, 0, np.where(hs < as_, 2, 1)).astype(np.int8))
+    for m in task.models:
+        out.probs[m] = np.empty((len(tpos), 3))
+
+    rates: Optional[Rates] = None
+    elo, elo_done = EloState(), 0
+    bounds = np.flatnonzero(np.diff(win)) + 1
+    for lo, hi in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(tpos)]])):
+        if lo == hi:
+            continue
+        t_refit = task.t0 + int(win[lo]) * task.step
+        known = int(np.searchsorted(fin_start, t_refit - task.lag, side="right"))
+        pos = tpos[lo:hi]
+        home_ids = h.team_ids[h.home[pos]].tolist()
+        away_ids = h.team_ids[h.away[pos]].tolist()
+        if "poisson" in task.models:
+            if known:
+                # warm start az előző ablakból, mint az inkrementális éles futásnál
+                rates = fit_rates(*h.finished_arrays(fin_pos[:known]), init=rates)
+            lam_h, lam_a = _lambdas(rates or Rates(), home_ids, away_ids)
+            out.probs["poisson"][lo:hi] = probs_1x2_batch(lam_h, lam_a)
+        if "elo" in task.models:
+            new = fin_pos[elo_done:known]
+            apply_results(elo, h.match_id[new].tolist(), h.team_ids[h.home[new]].tolist(),
+                          h.team_ids[h.away[new]].tolist(), h.home_score[new].tolist(),
+                          h.away_score[new].tolist())
+            elo_done = max(elo_done, known)
+            out.probs["elo"][lo:hi] = probs_for_pairs(elo, home_ids, away_ids)
+    return out
+
+# -----------------------------
+# Odds és tárolt valószínűségek, időpont szerinti (as-of) kereséssel
+# -----------------------------
+_SQL_ODDS = text("""
+SELECT match_id, bookmaker_id,
+       CASE selection WHEN 'H' THEN 0 WHEN 'D' THEN 1 ELSE 2 END,
+       odds,
+       extract(epoch FROM captured_at)::bigint,
+       extract(epoch FROM COALESCE(last_seen_at, captured_at))::bigint
+FROM odds_snapshots
+WHERE market IN ('1X2','h2h') AND selection IN ('H','D','A')
+  AND COALESCE(last_seen_at, captured_at) >= :lo
+  AND captured_at < :hi
+  AND match_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_SQL_STORED_PROBS = text("""
+SELECT p.match_id,
+       CASE p.selection WHEN 'H' THEN 0 WHEN 'D' THEN 1 ELSE 2 END,
+       p.prob,
+       extract(epoch FROM mr.run_time)::bigint
+FROM probabilities p
+JOIN model_runs mr ON mr.id = p.model_run_id
+WHERE mr.model_name = :model
+  AND p.market IN ('1X2','h2h') AND p.selection IN ('H','D','A')
+  AND p.match_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+def asof(group: np.ndarray, t: np.ndarray, q_group: np.ndarray, q_t: np.ndarray) -> np.ndarray:
+    """
+    (group, t) szerint rendezett sorok közt minden lekérdezésre az azonos csoport utolsó t <= q_t
+    sorának indexe (-1, ha nincs). t, q_t: nemnegatív, 2^32 alatti relatív idők.
+    """
+    key = (group << 32) + t
+    q = (q_group << 32) + np.maximum(q_t, -1)
+    idx = np.searchsorted(key, q, side="right") - 1
+    ok = idx >= 0
+    ok[ok] = group[idx[ok]] == q_group[ok]
+    return np.where(ok, idx, -1)
+
+@dataclass
+class Prices:
+    """Meccs x kimenetelenként a döntéskori legjobb ár és a closing (ugyanannál az irodánál)."""
+    odds: np.ndarray           # (N, 3), NaN = nincs ár
+    bookmaker_id: np.ndarray   # (N, 3), -1 = nincs
+    closing: np.ndarray        # (N, 3), NaN = nincs
+
+def best_prices(odds_rows: np.ndarray, match_ids: np.ndarray, dec_s: np.ndarray,
+                start_s: np.ndarray, lookback: int) -> Prices:
+    """
+    odds_rows: (K, 6) [match_id, bookmaker_id, sel, odds, captured, seen]; match_ids rendezett.
+    Kulcsonként (meccs, iroda, kimenetel) a döntéskor érvényes ár (utolsó captured <= döntés),
+    ha lookback-en belül látták; kimenetelenként a legjobb (odds desc, seen desc, iroda asc).
+    """
+    n = len(match_ids)
+    res = Prices(np.full((n, 3), np.nan), np.full((n, 3), -1, dtype=np.int64), np.full((n, 3), np.nan))
+    if not len(odds_rows) or not n:
+        return res
+    m = np.searchsorted(match_ids, odds_rows[:, 0].astype(np.int64))
+    bk_ids, bk = np.unique(odds_rows[:, 1].astype(np.int64), return_inverse=True)
+    nb = len(bk_ids)
+    sel = odds_rows[:, 2].astype(np.int64)
+    t0 = int(min(odds_rows[:, 4].min(), dec_s.min())) - 1
+    cap = odds_rows[:, 4].astype(np.int64) - t0
+    seen = odds_rows[:, 5].astype(np.int64) - t0
+    g = (m * 3 + sel) * nb + bk
+    order = np.lexsort((cap, g))
+    g, cap, seen, price = g[order], cap[order], seen[order], odds_rows[order, 3]
+
+    ug = np.unique(g)
+    gm, gsel, gbk = ug // (3 * nb), (ug // nb) % 3, ug % nb
+    dec = dec_s[gm] - t0
+    at = asof(g, cap, ug, dec)
+    seen_at = np.minimum(seen[at], dec)
+    valid = (at >= 0) & (seen_at > dec - lookback)
+    ug, gm, gsel, gbk, at, seen_at = (a[valid] for a in (ug, gm, gsel, gbk, at, seen_at))
+    p = price[at]
+
+    ms = gm * 3 + gsel
+    best = np.lexsort((bk_ids[gbk], -seen_at, -p, ms))
+    _, first = np.unique(ms[best], return_index=True)
+    pick = best[first]
+    close = asof(g, cap, ug[pick], start_s[gm[pick]] - t0)
+
+    flat = ms[pick]
+    res.odds.reshape(-1)[flat] = p[pick]
+    res.bookmaker_id.reshape(-1)[flat] = bk_ids[gbk[pick]]
+    res.closing.reshape(-1)[flat] = np.where(close >= 0, price[np.maximum(close, 0)], np.nan)
+    return res
+
+def stored_probs(db: Session, model: str, match_ids: np.ndarray, dec_s: np.ndarray) -> np.ndarray:
+    """(N, 3) a döntés idején legutolsó tárolt futás valószínűségeiből (NaN = nem volt futás)."""
+    out = np.full((len(match_ids), 3), np.nan)
+    if not len(match_ids):
+        return out
+    rows = stream_array(db, _SQL_STORED_PROBS, {"model": model, "ids": match_ids.tolist()}, dtype=np.float64)
+    if not len(rows):
+        return out
+    m = np.searchsorted(match_ids, rows[:, 0].astype(np.int64))
+    g = m * 3 + rows[:, 1].astype(np.int64)
+    t0 = int(min(rows[:, 3].min(), dec_s.min())) - 1
+    t = rows[:, 3].astype(np.int64) - t0
+    order = np.lexsort((t, g))
+    g, t, prob = g[order], t[order], rows[order, 2]
+    ug = np.unique(g)
+    at = asof(g, t, ug, dec_s[ug // 3] - t0)
+    ok = at >= 0
+    out.reshape(-1)[ug[ok]] = prob[at[ok]]
+    return out
+
+# -----------------------------
+# Pickek és eredmények
+# -----------------------------
+@dataclass
+class BacktestResult:
+    model: str
+    matches: int
+    picks: int
+    staked: float
+    profit: float
+    roi: float
+    hit_rate: float
+    avg_clv: Optional[float]
+    max_drawdown: float          # az egység-bankroll görbe csúcsához képest
+    table: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+
+def evaluate(model: str, probs: np.ndarray, prices: Prices, match_ids: np.ndarray, start_s: np.ndarray,
+             result: np.ndarray, edge_min: float = EDGE_MIN, kelly: float = KELLY_FRACTION) -> BacktestResult:
+    """generate_picks szabályai (edge >= MIN_EDGE, odds > 1, tört Kelly 0..1) + settlement szabályai."""
+    odds = prices.odds
+    with np.errstate(invalid="ignore"):
+        edge = odds * probs - 1.0
+        mask = (edge >= edge_min) & (odds > 1.0)
+    m, sel = np.nonzero(mask)
+    # időrend (kezdés, meccs, kimenetel) -> drawdown a lezárás sorrendjében
+    order = np.lexsort((sel, match_ids[m], start_s[m]))
+    m, sel = m[order], sel[order]
+    o, e = odds[m, sel], edge[m, sel]
+    stake = np.clip(kelly * (e / (o - 1.0)), 0.0, 1.0)
+    win = result[m] == sel
+    profit = np.where(win, stake * (o - 1.0), -stake)
+    closing = prices.closing[m, sel]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        clv = (o - closing) / closing
+    equity = 1.0 + np.cumsum(profit)
+    peak = np.maximum.accumulate(np.concatenate([[1.0], equity]))[1:]
+    staked = float(stake.sum())
+    has_clv = ~np.isnan(clv)
+    return BacktestResult(
+        model=model, matches=int((~np.isnan(probs[:, 0])).sum()), picks=len(m),
+        staked=staked, profit=float(profit.sum()),
+        roi=float(profit.sum() / staked) if staked else 0.0,
+        hit_rate=float(win.mean()) if len(m) else 0.0,
+        avg_clv=float(clv[has_clv].mean()) if has_clv.any() else None,
+        max_drawdown=float(((peak - equity) / peak).max()) if len(m) else 0.0,
+        table={"match_id": match_ids[m], "start_s": start_s[m], "selection": sel,
+               "bookmaker_id": prices.bookmaker_id[m, sel], "odds": o, "prob": probs[m, sel],
+               "edge": e, "stake": stake, "win": win, "profit": profit,
+               "closing_odds": closing, "clv": clv},
+    )
+
+def run_backtest(db: Session, start: datetime, end: datetime,
+                 models: Sequence[str] = REFIT_MODELS,
+                 refit_days: float = BACKTEST_REFIT_DAYS,
+                 decision_hours: float = BACKTEST_DECISION_HOURS,
+                 lag_hours: float = BACKTEST_RESULT_LAG_HOURS,
+                 lookback_hours: float = LOOKBACK_HOURS,
+                 workers: int = MODEL_WORKERS) -> Dict[str, BacktestResult]:
+    """A [start, end) közötti döntések visszajátszása; modellenként egy BacktestResult."""
+    t0, t1 = _epoch_s(start), _epoch_s(end)
+    step = max(1, int(refit_days * 86400))
+    decision, lag = int(decision_hours * 3600), int(lag_hours * 3600)
+    refit = tuple(m for m in models if m in REFIT_MODELS)
+
+    hist = get_history(db)
+    tasks = [LeagueTask(h, t0, step, -(-(t1 - t0) // step), decision, lag, refit)
+             for _, h in sorted(hist.items())]
+    replays = map_leagues(replay_league, tasks, workers)
+
+    match_ids = np.concatenate([r.match_id for r in replays]) if replays else np.empty(0, np.int64)
+    order = np.argsort(match_ids, kind="stable")
+    match_ids = match_ids[order]
+    start_s = np.concatenate([r.start_s for r in replays])[order] if replays else match_ids
+    result = np.concatenate([r.result for r in replays])[order] if replays else match_ids
+    dec_s = start_s - decision
+    probs = {m: np.concatenate([r.probs[m] for r in replays])[order] for m in refit}
+    for m in models:
+        if m not in refit:
+            probs[m] = stored_probs(db, m, match_ids, dec_s)
+
+    if len(match_ids):
+        odds_rows = stream_array(db, _SQL_ODDS, {
+            "lo": start - timedelta(hours=decision_hours + lookback_hours),
+            "hi": end + timedelta(hours=decision_hours),
+            "ids": match_ids.tolist(),
+        }, dtype=np.float64)
+    else:
+        odds_rows = np.empty((0, 6))
+    prices = best_prices(odds_rows, match_ids, dec_s, start_s, int(lookback_hours * 3600))
+    return {m: evaluate(m, probs[m], prices, match_ids, start_s, result) for m in models}
+
+def write_picks_csv(path: str, results: Dict[str, BacktestResult]) -> int:
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["model", "kickoff", "match_id", "selection", "bookmaker_id", "odds", "prob", "edge",
+                    "stake", "win", "profit", "closing_odds", "clv"])
+        for res in results.values():
+            t = res.table
+            for i in range(res.picks):
+                kickoff = datetime.utcfromtimestamp(int(t["start_s"][i])).isoformat()
+                w.writerow([res.model, kickoff, int(t["match_id"][i]), SELECTIONS[t["selection"][i]],
+                            int(t["bookmaker_id"][i])] +
+                           [f"{float(t[c][i]):.6g}" for c in ("odds", "prob", "edge", "stake")] +
+                           [int(t["win"][i]), f"{float(t['profit'][i]):.6g}",
+                            f"{float(t['closing_odds'][i]):.6g}", f"{float(t['clv'][i]):.6g}"])
+                n += 1
+    return n
+
+def _date(s: str) -> datetime:
+    return datetime.fromisoformat(s)
+
+def main():
+    ap = argparse.ArgumentParser(description="Walk-forward backtest (Poisson / ELO / tárolt modellek)")
+    ap.add_argument("--start", type=_date, default=None, help="alapból end - 365 nap")
+    ap.add_argument("--end", type=_date, default=None, help="alapból most")
+    ap.add_argument("--models", type=lambda s: [m.strip() for m in s.split(",") if m.strip()],
+                    default=list(REFIT_MODELS), help="poisson,elo vagy model_runs.model_name")
+    ap.add_argument("--refit-days", type=float, default=BACKTEST_REFIT_DAYS)
+    ap.add_argument("--decision-hours", type=float, default=BACKTEST_DECISION_HOURS)
+    ap.add_argument("--workers", type=int, default=MODEL_WORKERS)
+    ap.add_argument("--out", default=None, help="pickek CSV-be")
+    args = ap.parse_args()
+    end = args.end or datetime.utcnow()
+    start = args.start or end - timedelta(days=365)
+
+    t = time.perf_counter()
+    with SessionLocal() as db:
+        results = run_backtest(db, start, end, args.models, refit_days=args.refit_days,
+                               decision_hours=args.decision_hours, workers=args.workers)
+    secs = time.perf_counter() - t
+    for r in results.values():
+        clv = "n/a" if r.avg_clv is None else f"{r.avg_clv:+.2%}"
+        print(f"✔ {r.model:<14} matches={r.matches} picks={r.picks} staked={r.staked:.2f} "
+              f"profit={r.profit:+.3f} ROI={r.roi:+.2%} hit={r.hit_rate:.1%} CLV={clv} "
+              f"maxDD={r.max_drawdown:.1%}")
+    if args.out:
+        n = write_picks_csv(args.out, results)
+        print(f"✔ {n} picks written to {args.out}")
+    print(f"✔ backtest {start:%Y-%m-%d}..{end:%Y-%m-%d} refit={args.refit_days:g}d in {secs:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Terheléses teszt: /picks áteresztőképesség a régi sync handlerrel vs. az async API-val.
+
+Mindkét appot külön uvicorn processzben indítja (1 worker), majd N párhuzamos
+keep-alive kliens adott ideig hívja a /picks végpontot; req/s és latencia percentilisek.
+A valódi adatbázist olvassa (DATABASE_URL), írni nem ír:
+    python -m herculesbet.bench.api_load --concurrency 64 --duration 15
+    python -m herculesbet.bench.api_load --url http://127.0.0.1:8000   # futó szerver ellen
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from fastapi import FastAPI
+from ..api import picks_query, pick_to_dict
+from ..db import SessionLocal
+
+# A korábbi /picks: sync handler (threadpool), kérésenként új SessionLocal()
+sync_app = FastAPI(title="HerculesBet API (sync reference)")
+
+@sync_app.get("/health")
+def health():
+    return {"ok": True}
+
+@sync_app.get("/picks")
+def picks(limit: int = 50):
+    db = SessionLocal()
+    try:
+        return [pick_to_dict(row) for row in db.execute(picks_query(limit)).all()]
+    finally:
+        db.close()
+
+APPS = {
+    "sync": "herculesbet.bench.api_load:sync_app",
+    "async": "herculesbet.api:app",
+}
+
+async def _client(host: str, port: int, path: str, deadline: float, lat: list) -> int:
+    """Egy keep-alive HTTP/1.1 kliens; visszaad: hibák száma."""
+    reader, writer = await asyncio.open_connection(host, port)
+    req = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    errors = 0
+    try:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            writer.write(req)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors += 1
+            lat.append(time.perf_counter() - t0)
+    finally:
+        writer.close()
+    return errors
+
+async def _load(url: str, concurrency: int, duration: float) -> dict:
+    u = urlsplit(url)
+    path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+    lat: list = []
+    deadline = time.perf_counter() + duration
+    t0 = time.perf_counter()
+    errors = await asyncio.gather(*[
+        _client(u.hostname, u.port or 80, path, deadline, lat) for _ in range(concurrency)
+    ])
+    secs = time.perf_counter() - t0
+    lat.sort()
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000 if lat else float("nan")
+    return {"requests": len(lat), "errors": sum(errors), "rps": len(lat) / secs,
+            "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99)}
+
+def _wait_ready(base: str, proc: subprocess.Popen, timeout: float = 20.0) -> None:
+    from urllib.request import urlopen
+    end = time.time() + timeout
+    while time.time() < end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            urlopen(base + "/health", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {base} not ready after {timeout}s")
+
+def run_target(name: str, port: int, args) -> dict:
+    cmd = [sys.executable, "-m", "uvicorn", APPS[name], "--port", str(port),
+           "--log-level", "warning", "--no-access-log"]
+    proc = subprocess.Popen(cmd, env=os.environ.copy())
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _wait_ready(base, proc)
+        url = f"{base}/picks?limit={args.limit}"
+        asyncio.run(_load(url, min(4, args.concurrency), 1.0))   # bemelegítés
+        return asyncio.run(_load(url, args.concurrency, args.duration))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def _print(name: str, r: dict) -> None:
+    print(f"✔ {name:<6} {r['rps']:8.1f} req/s  p50={r['p50_ms']:.1f}ms  "
+          f"p95={r['p95_ms']:.1f}ms  p99={r['p99_ms']:.1f}ms  "
+          f"(n={r['requests']}, errors={r['errors']})")
+
+def main():
+    ap = argparse.ArgumentParser(description="/picks terheléses teszt (sync vs async)")
+    ap.add_argument("--target", choices=["sync", "async", "both"], default="both")
+    ap.add_argument("--url", default=None, help="már futó szerver ellen (pl. http://127.0.0.1:8000)")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--duration", type=float, default=10.0, help="mp / target")
+    ap.add_argument("--limit", type=int, default=50, help="/picks?limit=")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    if args.url:
+        _print("url", asyncio.run(_load(f"{args.url.rstrip('/')}/picks?limit={args.limit}",
+                                        args.concurrency, args.duration)))
+        return
+    targets = ["sync", "async"] if args.target == "both" else [args.target]
+    res = {t: run_target(t, args.port + i, args) for i, t in enumerate(targets)}
+    for t, r in res.items():
+        _print(t, r)
+    if len(res) == 2 and res["sync"]["rps"]:
+        print(f"✔ async / sync throughput: {res['async']['rps'] / res['sync']['rps']:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: best odds a régi DISTINCT ON CTE-vel (odds_snapshots) vs. az odds_latest táblából.
+
+Külön sémában (alapból "bench") generál szintetikus adatot, a valódi táblákhoz nem nyúl:
+    python -m herculesbet.bench.best_odds --rows 1000000 10000000 50000000
+"""
+import argparse
+import time
+from sqlalchemy import text
+
+from ..db import Base, engine
+from .. import models  # noqa: F401  (táblák regisztrálása)
+from ..etl.store import SQL_BACKFILL_ODDS_LATEST
+from ..partitions import ensure_partitions
+
+N_BOOKMAKERS = 20
+POLLS = 50          # snapshot / (meccs, iroda, kimenetel)
+SELECTIONS = 3
+LOOKBACK_HOURS = 48
+
+# a generate_picks korábbi best_odds CTE-je (teljes odds_snapshots, lookback ablak)
+SQL_LEGACY = text("""
+SELECT count(*) FROM (
+  SELECT DISTINCT ON (o.match_id, o.selection)
+    o.match_id, o.selection, o.bookmaker_id, o.odds AS offered_odds
+  FROM odds_snapshots o
+  WHERE COALESCE(o.last_seen_at, o.captured_at) > now() - make_interval(hours => :lookback_hours)
+    AND o.market IN ('1X2','h2h')
+  ORDER BY o.match_id, o.selection, o.odds DESC, COALESCE(o.last_seen_at, o.captured_at) DESC
+) x
+""")
+
+# az új út: odds_latest
+SQL_LATEST = text("""
+SELECT count(*) FROM (
+  SELECT DISTINCT ON (o.match_id, o.selection)
+    o.match_id, o.selection, o.bookmaker_id, o.odds AS offered_odds
+  FROM odds_latest o
+  WHERE o.seen_at > now() - make_interval(hours => :lookback_hours)
+    AND o.market IN ('1X2','h2h')
+  ORDER BY o.match_id, o.selection, o.odds DESC, o.seen_at DESC
+) x
+""")
+
+def _populate(conn, rows: int) -> None:
+    """rows darab snapshot: meccsenként POLLS óránkénti lekérés, a kezdések 60 napra szórva (±30 nap)."""
+    n_matches = max(1, rows // (N_BOOKMAKERS * SELECTIONS * POLLS))
+    conn.execute(text("INSERT INTO leagues (id, name, sport) VALUES (1, 'bench', 'football')"))
+    conn.execute(text(
+        "INSERT INTO teams (id, league_id, name) SELECT g, 1, 't' || g FROM generate_series(1, 40) g"))
+    conn.execute(text(
+        "INSERT INTO bookmakers (id, name) SELECT g, 'b' || g FROM generate_series(1, :n) g"),
+        {"n": N_BOOKMAKERS})
+    conn.execute(text("""
+        INSERT INTO matches (id, league_id, home_team_id, away_team_id, start_time, status)
+        SELECT g, 1, 1 + g % 20, 21 + g % 20,
+               now() - interval '30 days' + g * (interval '60 days' / :n), 'scheduled'
+        FROM generate_series(1, :n) g
+    """), {"n": n_matches})
+    conn.execute(text("""
+        INSERT INTO odds_snapshots (match_id, bookmaker_id, market, selection, odds, captured_at)
+        SELECT m.id, b, '1X2', s, round((1.5 + random() * 4)::numeric, 2), m.start_time - p * interval '1 hour'
+        FROM matches m, generate_series(1, :n_bk) b, unnest(ARRAY['H','D','A']) s,
+             generate_series(1, :polls) p
+    """), {"n_bk": N_BOOKMAKERS, "polls": POLLS})
+    conn.execute(SQL_BACKFILL_ODDS_LATEST)
+    conn.execute(text("ANALYZE"))
+
+def _best_time(conn, stmt, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(stmt, {"lookback_hours": LOOKBACK_HOURS}).scalar()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def bench(rows: int, schema: str, repeat: int) -> dict:
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        Base.metadata.create_all(conn)
+        ensure_partitions(conn)
+        t0 = time.perf_counter()
+        _populate(conn, rows)
+        load_s = time.perf_counter() - t0
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        n_latest = conn.execute(text("SELECT count(*) FROM odds_latest")).scalar()
+        legacy_s = _best_time(conn, SQL_LEGACY, repeat)
+        latest_s = _best_time(conn, SQL_LATEST, repeat)
+    return {"rows": rows, "latest_rows": n_latest, "load_s": load_s,
+            "legacy_s": legacy_s, "latest_s": latest_s}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    ap.add_argument("--schema", default="bench")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--keep", action="store_true", help="ne dobja el a bench sémát a végén")
+    args = ap.parse_args()
+
+    print(f"{'snapshots':>12} {'odds_latest':>12} {'legacy CTE':>12} {'odds_latest':>12} {'speedup':>8}")
+    for rows in args.rows:
+        r = bench(rows, args.schema, args.repeat)
+        print(f"{r['rows']:>12,} {r['latest_rows']:>12,} {r['legacy_s']:>11.3f}s "
+              f"{r['latest_s']:>11.3f}s {r['legacy_s'] / max(r['latest_s'], 1e-9):>7.1f}x")
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+    print("✔ best odds benchmark done")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Helyi The Odds API stub + fetcher benchmark (hálózat és kvóta nélkül).
+
+A stub a /v4/sports/{sport}/odds végpontot szolgálja ki szintetikus eseményekkel,
+beállítható késleltetéssel, hibákkal (503 / 429 + Retry-After) és kvóta-fejlécekkel:
+    python -m herculesbet.bench.odds_stub --sports 25 --latency 0.3 --fail-every 5
+Más kódból: server, base_url = serve(); OddsApiClient(api_key="x", base_url=base_url)
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from ..providers.theoddsapi import OddsApiClient
+
+def _events(sport: str, n_events: int, n_bookmakers: int, markets) -> list:
+    """Determinisztikus szintetikus válasz (sport + index alapján)."""
+    now = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    out = []
+    for i in range(n_events):
+        home, away = f"{sport}-H{i}", f"{sport}-A{i}"
+        bks = []
+        for b in range(n_bookmakers):
+            base = 1.5 + ((hash((sport, i, b)) % 300) / 100.0)
+            bks.append({
+                "key": f"bk{b}", "title": f"Bookie {b}",
+                "last_update": (now - timedelta(minutes=b)).isoformat().replace("+00:00", "Z"),
+                "markets": [{"key": m, "outcomes": [
+                    {"name": home, "price": round(base, 2)},
+                    {"name": "Draw", "price": round(base + 1.1, 2)},
+                    {"name": away, "price": round(base + 0.7, 2)},
+                ]} for m in markets],
+            })
+        out.append({
+            "id": f"{sport}-{i}", "sport_key": sport, "sport_title": sport.upper(),
+            "commence_time": (now + timedelta(hours=i)).isoformat().replace("+00:00", "Z"),
+            "home_team": home, "away_team": away, "bookmakers": bks,
+        })
+    return out
+
+class StubState:
+    def __init__(self, latency: float, fail_every: int, quota: int, n_events: int, n_bookmakers: int):
+        self.latency = latency
+        self.fail_every = fail_every      # minden n-edik kérés átmeneti hiba (0 = soha)
+        self.remaining = quota
+        self.used = 0
+        self.n_events = n_events
+        self.n_bookmakers = n_bookmakers
+        self.requests = 0
+        self.lock = threading.Lock()
+
+def _handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, body: bytes, headers=None):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, str(v))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            u = urlsplit(self.path)
+            parts = u.path.strip("/").split("/")
+            qs = parse_qs(u.query)
+            if len(parts) != 4 or parts[:2] != ["v4", "sports"] or parts[3] != "odds":
+                return self._send(404, b'{"message":"not found"}')
+            if not qs.get("apiKey"):
+                return self._send(401, b'{"message":"missing apiKey"}')
+            markets = qs.get("markets", ["h2h"])[0].split(",")
+            time.sleep(state.latency)
+            with state.lock:
+                state.requests += 1
+                n = state.requests
+                fail = state.fail_every and n % state.fail_every == 0
+                if not fail:
+                    cost = len(markets)
+                    state.remaining -= cost
+                    state.used += cost
+                quota = {"x-requests-remaining": state.remaining, "x-requests-used": state.used,
+                         "x-requests-last": 0 if fail else len(markets)}
+            if fail:
+                code = 429 if n % 2 else 503
+                return self._send(code, b'{"message":"try again"}', {"Retry-After": "0", **quota})
+            body = json.dumps(_events(parts[2], state.n_events, state.n_bookmakers, markets)).encode()
+            self._send(200, body, quota)
+    return Handler
+
+def serve(port: int = 0, latency: float = 0.0, fail_every: int = 0, quota: int = 500,
+          n_events: int = 20, n_bookmakers: int = 10):
+    """Stub indítása háttérszálon; visszaad: (server, base_url). Leállítás: server.shutdown()."""
+    state = StubState(latency, fail_every, quota, n_events, n_bookmakers)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v4"
+
+def main():
+    ap = argparse.ArgumentParser(description="Odds API stub + szekvenciális vs. párhuzamos fetch")
+    ap.add_argument("--sports", type=int, default=25)
+    ap.add_argument("--markets", default="h2h")
+    ap.add_argument("--latency", type=float, default=0.3, help="mp / kérés a stubban")
+    ap.add_argument("--fail-every", type=int, default=0, help="minden n-edik kérés 429/503")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--quota", type=int, default=500)
+    args = ap.parse_args()
+
+    sports = [f"sport_{i:02d}" for i in range(args.sports)]
+    markets = args.markets.split(",")
+    results = {}
+    for label, conc in (("sequential", 1), ("concurrent", args.concurrency)):
+        server, base_url = serve(latency=args.latency, fail_every=args.fail_every, quota=args.quota)
+        try:
+            with OddsApiClient(api_key="stub", base_url=base_url, concurrency=conc,
+                               backoff=0.05) as client:
+                res = client.fetch_many(sports, markets)
+            results[label] = res
+            print(f"✔ {label:<10} conc={conc:<3} {res.seconds:6.2f}s fixtures={len(res.fixtures)} "
+                  f"odds={len(res.quotes)} errors={len(res.errors)} requests={client.quota.requests} "
+                  f"quota remaining={client.quota.remaining} used={client.quota.used}")
+        finally:
+            server.shutdown()
+    seq, con = results["sequential"], results["concurrent"]
+    same = [(q.ext_match_id, q.bookmaker, q.selection, q.odds) for q in seq.quotes] == \
+           [(q.ext_match_id, q.bookmaker, q.selection, q.odds) for q in con.quotes]
+    print(f"✔ speedup {seq.seconds / con.seconds:.1f}x, identical output: {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Benchmark suite: a pipeline stage-ek falióra-ideje szintetikus adaton, baseline-hoz mérve.
+
+Külön (eldobható) PostgreSQL adatbázisban dolgozik: BENCH_DATABASE_URL vagy --database-url;
+a sémát minden futás elején újraépíti, ezért a DATABASE_URL-lel egyező DB-t csak
+--allow-main-db mellett fogad el. Lépések: szintetikus feed (bench.synth) -> ingest_localjson_stream
+-> eredmények -> fit_attack_defence (minden liga) -> run_elo -> generate_picks.run_once (full)
+-> eredmények a pickelt meccsekre -> settle_finished_matches -> API (uvicorn, /picks, /stats/summary,
+/export). Az API-mérőszám mp / 1000 kérés (áteresztőképességből), az exportoké egy teljes letöltés.
+
+    python -m herculesbet.bench.suite --scale 10k 1m --save-baseline        # baseline rögzítése
+    python -m herculesbet.bench.suite --scale 10k 1m                        # összevetés, regresszió -> exit 1
+
+Regresszió: aktuális > baseline * (1 + threshold) ÉS a különbség > min-delta mp (zajküszöb).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List
+from urllib.parse import quote
+from urllib.request import urlopen
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from .synth import SCALES, SynthFeed, generate
+
+# a herculesbet DB-s moduljait csak a DATABASE_URL átállítása után importáljuk (lásd _use_database)
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "")
+BENCH_BASELINE = os.getenv("BENCH_BASELINE", "bench_baseline.json")
+BENCH_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.25"))    # 0.25 = 25%-kal lassabb már hiba
+BENCH_MIN_DELTA = float(os.getenv("BENCH_MIN_DELTA", "0.05"))    # mp; ennél kisebb eltérés zaj
+
+API_ENDPOINTS = {
+    "api_picks": "/picks?limit=50",
+    "api_picks_500": "/picks?limit=500",
+    "api_stats_summary": "/stats/summary",
+}
+
+@dataclass
+class BenchRun:
+    scale: str
+    odds_rows: int
+    stages: Dict[str, float] = field(default_factory=dict)   # összevetett idők (mp)
+    setup: Dict[str, float] = field(default_factory=dict)    # előkészítés, csak tájékoztató
+    info: Dict[str, float] = field(default_factory=dict)     # sorszámok, latenciák
+
+@contextmanager
+def _timed(out: Dict[str, float], name: str):
+    t0 = time.perf_counter()
+    yield
+    out[name] = time.perf_counter() - t0
+
+# -----------------------------
+# Adatbázis
+# -----------------------------
+def _use_database(url: str, allow_main: bool) -> None:
+    """DATABASE_URL -> bench DB (a config.py importja előtt!); ha nincs, létrehozzuk."""
+    if "herculesbet.db" in sys.modules:
+        raise RuntimeError("herculesbet.db already imported – the bench database must be set first")
+    if not url:
+        raise SystemExit("BENCH_DATABASE_URL / --database-url missing (a disposable database)")
+    main_url = os.getenv("DATABASE_URL", "")
+    if main_url and make_url(main_url) == make_url(url) and not allow_main:
+        raise SystemExit("bench database equals DATABASE_URL – it is wiped on every run; "
+                         "use a separate database or --allow-main-db")
+    os.environ["DATABASE_URL"] = url
+    u = make_url(url)
+    admin = create_engine(u.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    try:
+        with admin.connect() as conn:
+            if not conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :d"),
+                                {"d": u.database}).first():
+                conn.execute(text(f'CREATE DATABASE "{u.database}"'))
+    finally:
+        admin.dispose()
+
+def _reset_schema() -> None:
+    from ..db import engine
+    from .. import db_init, history
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA IF EXISTS public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    db_init.main()
+    history._cache.clear()   # azonos adat -> azonos fingerprint; az ismétlés ne cache-ből fusson
+
+SQL_APPLY_RESULTS = text("""
+UPDATE matches m
+SET status = 'finished', home_score = r.hs, away_score = r.aws
+FROM unnest(CAST(:league AS text[]), CAST(:home AS text[]), CAST(:away AS text[]),
+            CAST(:start AS timestamp[]), CAST(:hs AS int[]), CAST(:aws AS int[]))
+       AS r(league, home, away, start_time, hs, aws)
+JOIN leagues l ON l.name = r.league
+JOIN teams th ON th.league_id = l.id AND th.name = r.home
+JOIN teams ta ON ta.league_id = l.id AND ta.name = r.away
+WHERE m.league_id = l.id AND m.home_team_id = th.id AND m.away_team_id = ta.id
+  AND m.start_time = r.start_time
+""")
+
+def apply_results(db, results) -> int:
+    """Szintetikus végeredmények egy UPDATE-tel (a feed nem hoz eredményt az ingestnek)."""
+    cols = list(zip(*results)) if results else [()] * 6
+    res = db.execute(SQL_APPLY_RESULTS, {
+        "league": list(cols[0]), "home": list(cols[1]), "away": list(cols[2]),
+        "start": list(cols[3]), "hs": list(cols[4]), "aws": list(cols[5])})
+    db.commit()
+    return res.rowcount
+
+# -----------------------------
+# Stage-ek
+# -----------------------------
+def _bench_pipeline(run: BenchRun, feed: SynthFeed) -> None:
+    from ..db import SessionLocal
+    from ..ingest_provider import ingest_localjson_stream
+    from ..models import League
+    from ..history import get_history
+    from ..models_poisson import fit_attack_defence
+    from ..models_elo import run_elo, MODEL_NAME
+    from ..generate_picks import run_once
+    from ..settlement import settle_finished_matches
+
+    with _timed(run.stages, "ingest_provider"):
+        ingest_localjson_stream(feed.path, progress_every=10 ** 9)
+    with SessionLocal() as db:
+        with _timed(run.setup, "results_played"):
+            run.info["matches_finished"] = apply_results(db, [r[:6] for r in feed.results if r.played])
+
+        league_ids = [lid for (lid,) in db.query(League.id).order_by(League.id).all()]
+        with _timed(run.stages, "fit_attack_defence"):
+            hist = get_history(db)
+            for lid in league_ids:
+                fit_attack_defence(db, lid, hist=hist)
+        with _timed(run.stages, "run_elo"):
+            _, run.info["elo_matches"] = run_elo(db)
+        with _timed(run.stages, "generate_picks"):
+            counts = run_once(db, full=True, model=MODEL_NAME)
+            db.commit()
+        run.info["picks"] = counts.inserted + counts.updated
+
+        # a pickek "megtétele" és a közelgő meccsek "lejátszása" -> a settlement ezeket zárja le
+        with _timed(run.setup, "results_upcoming"):
+            db.execute(text("UPDATE edge_picks SET status = 'placed' WHERE status = 'open'"))
+            apply_results(db, [r[:6] for r in feed.results if not r.played])
+        with _timed(run.stages, "settle_finished_matches"):
+            run.info["settled"] = settle_finished_matches(db)
+            db.commit()
+
+def _get(url: str) -> int:
+    with urlopen(url, timeout=600) as resp:
+        return sum(len(chunk) for chunk in iter(lambda: resp.read(1 << 16), b""))
+
+def _bench_api(run: BenchRun, feed: SynthFeed, port: int, concurrency: int, duration: float) -> None:
+    from .api_load import _load, _wait_ready
+    cmd = [sys.executable, "-m", "uvicorn", "herculesbet.api:app", "--port", str(port),
+           "--log-level", "warning", "--no-access-log"]
+    proc = subprocess.Popen(cmd, env=os.environ.copy())
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _wait_ready(base, proc)
+        for name, path in API_ENDPOINTS.items():
+            asyncio.run(_load(base + path, min(4, concurrency), 0.5))   # bemelegítés
+            r = asyncio.run(_load(base + path, concurrency, duration))
+            if r["errors"] or not r["requests"]:
+                raise RuntimeError(f"{path}: {r['errors']} errors / {r['requests']} requests")
+            run.stages[name] = 1000.0 / r["rps"]
+            run.info[f"{name}_p95_ms"] = r["p95_ms"]
+        league = quote(feed.results[0].league)
+        for name, path in (("api_export_picks", "/export/picks?format=ndjson"),
+                           ("api_export_odds", f"/export/odds?format=csv&league={league}")):
+            with _timed(run.stages, name):
+                run.info[f"{name}_bytes"] = _get(base + path)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def run_scale(scale: str, workdir: str, args) -> BenchRun:
+    spec = SCALES[scale]
+    run = BenchRun(scale, spec.odds_rows)
+    _reset_schema()
+    path = os.path.join(workdir, f"synth_{scale}.ndjson")
+    with _timed(run.setup, "synth"):
+        feed = generate(spec, path)
+    try:
+        _bench_pipeline(run, feed)
+        if not args.skip_api:
+            _bench_api(run, feed, args.port, args.concurrency, args.duration)
+    finally:
+        os.remove(path)
+    return run
+
+def best_of(runs: List[BenchRun]) -> BenchRun:
+    """Ismétlések: stage-enként a legjobb idő (a zaj felfelé torzít)."""
+    best = runs[0]
+    for r in runs[1:]:
+        for k, v in r.stages.items():
+            best.stages[k] = min(best.stages.get(k, v), v)
+    return best
+
+# -----------------------------
+# Baseline
+# -----------------------------
+def compare(current: Dict[str, float], baseline: Dict[str, float],
+            threshold: float, min_delta: float) -> List[tuple]:
+    """(stage, aktuális, baseline, arány, status) sorok; status: ok|REGRESSION|faster|new."""
+    rows = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, cur, None, None, "new"))
+            continue
+        ratio = cur / base if base > 0 else float("inf")
+        if ratio > 1 + threshold and cur - base > min_delta:
+            status = "REGRESSION"
+        elif ratio < 1 - threshold and base - cur > min_delta:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, cur, base, ratio, status))
+    return rows
+
+def _load_json(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_json(path: str, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def _print_run(run: BenchRun, rows: List[tuple]) -> None:
+    print(f"\n[{run.scale}] odds rows={run.odds_rows:,}  "
+          + "  ".join(f"{k}={v:.2f}s" for k, v in run.setup.items()))
+    print(f"{'stage':<26} {'seconds':>10} {'baseline':>10} {'ratio':>7}  status")
+    for name, cur, base, ratio, status in rows:
+        b = f"{base:10.3f}" if base is not None else f"{'-':>10}"
+        r = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{name:<26} {cur:10.3f} {b} {r}  {status}")
+    print("  " + "  ".join(f"{k}={v:,.0f}" for k, v in run.info.items()))
+
+def main():
+    ap = argparse.ArgumentParser(description="Pipeline benchmark szintetikus adaton, baseline-hoz mérve")
+    ap.add_argument("--scale", nargs="+", choices=list(SCALES), default=["10k"])
+    ap.add_argument("--database-url", default=BENCH_DATABASE_URL,
+                    help="eldobható bench DB (BENCH_DATABASE_URL); minden futás újraépíti")
+    ap.add_argument("--allow-main-db", action="store_true",
+                    help="a DATABASE_URL-lel egyező DB is törölhető")
+    ap.add_argument("--baseline", default=BENCH_BASELINE, help="baseline JSON (skálánként stage -> mp)")
+    ap.add_argument("--save-baseline", action="store_true", help="az eredmény legyen az új baseline")
+    ap.add_argument("--threshold", type=float, default=BENCH_THRESHOLD)
+    ap.add_argument("--min-delta", type=float, default=BENCH_MIN_DELTA)
+    ap.add_argument("--repeat", type=int, default=1, help="teljes futás ennyiszer, stage-enként a legjobb")
+    ap.add_argument("--out", default=None, help="az eredmények JSON-ja")
+    ap.add_argument("--skip-api", action="store_true")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=5.0, help="mp / API végpont")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--workdir", default=tempfile.gettempdir(), help="ide kerül a szintetikus feed")
+    args = ap.parse_args()
+
+    _use_database(args.database_url, args.allow_main_db)
+    baseline = _load_json(args.baseline)
+    results, regressions = {}, []
+    for scale in args.scale:
+        run = best_of([run_scale(scale, args.workdir, args) for _ in range(max(1, args.repeat))])
+        rows = compare(run.stages, baseline.get(scale, {}), args.threshold, args.min_delta)
+        _print_run(run, rows)
+        regressions += [f"{scale}/{r[0]}" for r in rows if r[4] == "REGRESSION"]
+        results[scale] = {"odds_rows": run.odds_rows, "stages": run.stages,
+                          "setup": run.setup, "info": run.info}
+
+    if args.out:
+        _save_json(args.out, results)
+    if args.save_baseline:
+        for scale, r in results.items():
+            baseline[scale] = r["stages"]
+        _save_json(args.baseline, baseline)
+        print(f"✔ baseline saved: {args.baseline} ({', '.join(results)})")
+        return
+    if regressions:
+        print(f"✘ {len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"✔ bench done, no regression over {args.threshold:.0%}"
+          + ("" if baseline else f" (no baseline at {args.baseline})"))
+
+if __name__ == "__main__":
+    main()
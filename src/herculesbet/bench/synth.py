@@ -0,0 +1,197 @@
+"""
+Determinisztikus szintetikus adat: ligák, csapatok, oda-vissza fordulós sorsolás valószerű
+(Poisson, hazai előny, csapaterősség) eredményekkel, és több iroda időben mozgó 1X2 oddsai.
+
+A kimenet localjson NDJSON feed ("kind": "fixture" | "odds"), így a valódi ingest útvonalon
+(ingest_provider) tölthető be; a lejátszott meccsek fixture-sora home_score / away_score-t
+is visz (az ingest figyelmen kívül hagyja). Az utolsó fordulók a horgony (anchor) utániak:
+ütemezettek, friss oddsokkal -> a pick-generálásnak is van munkája.
+    python -m herculesbet.bench.synth --scale 1m --out /tmp/feed_1m.ndjson
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+# snapshot időpontok (óra a kezdés előtt); a legközelebbi `snapshots` darab kerül a feedbe
+SNAPSHOT_HOURS = (168, 120, 96, 72, 48, 24, 12, 6, 3, 1)
+
+@dataclass(frozen=True)
+class SynthSpec:
+    leagues: int = 1
+    teams: int = 20                # páros; szezononként 2 * (teams - 1) forduló
+    seasons: int = 1
+    bookmakers: int = 3
+    snapshots: int = 3             # odds snapshot / (meccs, iroda, kimenetel)
+    upcoming_rounds: int = 2       # az utolsó ennyi forduló még nincs lejátszva
+    seed: int = 42
+
+    @property
+    def rounds(self) -> int:
+        return self.seasons * 2 * (self.teams - 1)
+
+    @property
+    def matches(self) -> int:
+        return self.leagues * self.rounds * (self.teams // 2)
+
+    @property
+    def odds_rows(self) -> int:
+        return self.matches * self.bookmakers * 3 * self.snapshots
+
+# ~10k / ~1M / ~10M odds sor
+SCALES = {
+    "10k": SynthSpec(leagues=1, seasons=1, bookmakers=3, snapshots=3),
+    "1m": SynthSpec(leagues=10, seasons=2, bookmakers=11, snapshots=4),
+    "10m": SynthSpec(leagues=44, seasons=2, bookmakers=20, snapshots=5),
+}
+
+class Result(NamedTuple):
+    league: str
+    home: str
+    away: str
+    start_time: datetime
+    home_score: int
+    away_score: int
+    played: bool                   # anchor előtt kezdődött (a feedben is benne van az eredmény)
+
+@dataclass
+class SynthFeed:
+    path: str
+    spec: SynthSpec
+    anchor: datetime
+    fixtures: int = 0
+    odds: int = 0
+    seconds: float = 0.0
+    results: List[Result] = field(default_factory=list)
+
+def default_anchor() -> datetime:
+    """Az aktuális óra (UTC): ehhez képest múlt / jövő a sorsolás."""
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+def round_robin(n: int) -> np.ndarray:
+    """Körmérkőzéses sorsolás (circle method), oda-vissza: (2 * (n - 1), n / 2, 2) csapatindex."""
+    idx = list(range(n))
+    first = []
+    for r in range(n - 1):
+        pairs = [(idx[k], idx[n - 1 - k]) for k in range(n // 2)]
+        # a fix csapat felváltva hazai / vendég
+        first.append([(a, b) if (r + k) % 2 == 0 else (b, a) for k, (a, b) in enumerate(pairs)])
+        idx = [idx[0], idx[-1]] + idx[1:-1]
+    rr = np.array(first, dtype=np.int64)
+    return np.concatenate([rr, rr[:, :, ::-1]])
+
+def _names(spec: SynthSpec, l: int):
+    league = f"Synth League {l + 1:02d}"
+    teams = [f"L{l + 1:02d} Team {t + 1:02d}" for t in range(spec.teams)]
+    return league, teams
+
+def _iso(ts: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(ts, unit="s")
+
+def generate(spec: SynthSpec, path: str, anchor: Optional[datetime] = None) -> SynthFeed:
+    """A feed kiírása; ugyanaz a (spec, anchor) mindig ugyanazt a fájlt adja."""
+    from ..models_poisson import probs_1x2_batch   # lusta: a bench suite előbb a DATABASE_URL-t állítja
+    anchor = anchor or default_anchor()
+    if spec.teams % 2 or spec.teams < 2:
+        raise ValueError("teams must be even and >= 2")
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(spec.seed)
+    feed = SynthFeed(path, spec, anchor)
+    books = [f"Book {b + 1:02d}" for b in range(spec.bookmakers)]
+    hours = np.array(SNAPSHOT_HOURS[-spec.snapshots:], dtype="timedelta64[h]")
+    anchor64 = np.datetime64(anchor, "s")
+    sched = round_robin(spec.teams)
+    per_round = spec.teams // 2
+    first_upcoming = spec.rounds - spec.upcoming_rounds
+
+    with open(path, "w", encoding="utf-8") as f:
+        for l in range(spec.leagues):
+            league, teams = _names(spec, l)
+            att = rng.normal(0.0, 0.25, spec.teams)
+            dfn = rng.normal(0.0, 0.20, spec.teams)
+            # sorsolás: szezononként új (véletlen) csapat-hozzárendelés, enyhe erősség-drift
+            home, away, lam_h, lam_a = [], [], [], []
+            for s in range(spec.seasons):
+                perm = rng.permutation(spec.teams)
+                h, a = perm[sched[:, :, 0]].ravel(), perm[sched[:, :, 1]].ravel()
+                home.append(h)
+                away.append(a)
+                lam_h.append(1.10 * np.exp(0.25 + att[h] - dfn[a]))
+                lam_a.append(1.10 * np.exp(att[a] - dfn[h]))
+                att += rng.normal(0.0, 0.05, spec.teams)
+                dfn += rng.normal(0.0, 0.05, spec.teams)
+            home, away = np.concatenate(home), np.concatenate(away)
+            lam_h, lam_a = np.concatenate(lam_h), np.concatenate(lam_a)
+            n = len(home)
+            hs, as_ = rng.poisson(lam_h), rng.poisson(lam_a)
+
+            # kezdés: heti fordulók, a first_upcoming forduló az anchor utáni napon; meccsek 2 órás sávokban
+            rnd = np.arange(n) // per_round
+            slot = np.arange(n) % per_round % 4
+            ko = (anchor64 + np.timedelta64(1, "D") + (rnd - first_upcoming) * np.timedelta64(7, "D")
+                  + (l % 3 + 2 * slot) * np.timedelta64(1, "h"))
+            played = rnd < first_upcoming
+            ext = [f"synth-{spec.seed}-{l + 1}-{i}" for i in range(n)]
+
+            ko_s = _iso(ko)
+            for i in range(n):
+                rec = {"kind": "fixture", "ext_match_id": ext[i], "league": league,
+                       "home": teams[home[i]], "away": teams[away[i]], "start_time": ko_s[i]}
+                if played[i]:
+                    rec["home_score"], rec["away_score"] = int(hs[i]), int(as_[i])
+                f.write(json.dumps(rec) + "\n")
+                feed.results.append(Result(league, teams[home[i]], teams[away[i]],
+                                           ko[i].astype(datetime), int(hs[i]), int(as_[i]), bool(played[i])))
+            feed.fixtures += n
+
+            # odds: valódi valószínűség / iroda-margin, (meccs, iroda, kimenetel) zajjal,
+            # snapshotonként véletlen bolyongás; jövőbeli snapshot az anchor elé húzva (percenként)
+            p = probs_1x2_batch(lam_h, lam_a)
+            margin = 1.03 + 0.04 * rng.random(spec.bookmakers)
+            q = p[:, None, :] * np.exp(rng.normal(0.0, 0.06, (n, spec.bookmakers, 3)))
+            walk = np.exp(np.cumsum(rng.normal(0.0, 0.02, (spec.snapshots, n, spec.bookmakers, 3)), axis=0))
+            odds = np.maximum(1.01, np.round(1.0 / (q[None] * walk * margin[None, None, :, None]), 2))
+            cap = np.minimum(ko[None, :] - hours[:, None],
+                             anchor64 - (spec.snapshots - np.arange(spec.snapshots))[:, None]
+                             * np.timedelta64(1, "m"))
+            cap_s = _iso(cap)
+            for k in range(spec.snapshots):      # időrendben, ahogy egy valódi stream érkezne
+                ok, cs = odds[k], cap_s[k]
+                for i in range(n):
+                    head = f'{{"kind": "odds", "ext_match_id": "{ext[i]}", "bookmaker": "'
+                    tail = f', "captured_at": "{cs[i]}"}}\n'
+                    for b, book in enumerate(books):
+                        o = ok[i, b]
+                        f.write(f'{head}{book}", "selection": "H", "odds": {o[0]:.2f}{tail}'
+                                f'{head}{book}", "selection": "D", "odds": {o[1]:.2f}{tail}'
+                                f'{head}{book}", "selection": "A", "odds": {o[2]:.2f}{tail}')
+            feed.odds += odds.size
+    feed.seconds = time.perf_counter() - t0
+    return feed
+
+def main():
+    ap = argparse.ArgumentParser(description="Szintetikus localjson NDJSON feed (fixture-k + odds stream)")
+    ap.add_argument("--scale", choices=list(SCALES), default="10k")
+    ap.add_argument("--out", required=True, help="kimeneti .ndjson")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--leagues", type=int, default=None)
+    ap.add_argument("--bookmakers", type=int, default=None)
+    ap.add_argument("--snapshots", type=int, default=None)
+    ap.add_argument("--anchor", type=datetime.fromisoformat, default=None,
+                    help="ISO időpont (UTC), alapból az aktuális óra")
+    args = ap.parse_args()
+
+    spec = SCALES[args.scale]
+    overrides = {k: getattr(args, k) for k in ("seed", "leagues", "bookmakers", "snapshots")
+                 if getattr(args, k) is not None}
+    spec = replace(spec, **overrides)
+    feed = generate(spec, args.out, args.anchor)
+    print(f"✔ synth feed {args.out}: leagues={spec.leagues} fixtures={feed.fixtures} odds={feed.odds} "
+          f"({feed.seconds:.1f}s)")
+
+if __name__ == "__main__":
+    main()
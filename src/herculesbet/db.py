@@ -1,12 +1,23 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from .config import DATABASE_URL
+from .config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+)
+from .metrics import instrument_engine
 
 # Declarative Base – ezt importálja a models.py
 Base = declarative_base()
 
 # Modul-szintű engine
-_engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+_engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+)
+instrument_engine(_engine, "sync")   # SQL darab / idő stage-enként, pool checkoutok
 
 # Session gyár
 SessionLocal = sessionmaker(bind=_engine, autocommit=False, autoflush=False)
@@ -0,0 +1,35 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from .config import (
+    DATABASE_URL, ASYNC_DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+)
+from .metrics import instrument_engine
+
+def async_url(url: str) -> str:
+    """Sync postgres URL -> psycopg3 async driver (postgresql+psycopg), más dialektus marad."""
+    u = make_url(url)
+    if u.get_backend_name() == "postgresql" and u.get_driver_name() != "asyncpg":
+        u = u.set(drivername="postgresql+psycopg")
+    return u.render_as_string(hide_password=False)
+
+# Modul-szintű async engine (API) – a pool méretei a config.py-ból
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL or async_url(DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+)
+instrument_engine(async_engine.sync_engine, "async")
+
+# Async session gyár; expire_on_commit=False -> commit után is olvashatók az attribútumok
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+)
+
+async def get_async_db():
+    """FastAPI dependency: kérésenként egy AsyncSession a poolból."""
+    async with AsyncSessionLocal() as db:
+        yield db
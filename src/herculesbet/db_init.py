@@ -1,12 +1,41 @@
+from sqlalchemy import text
 from .db import Base, engine
 # model osztályok importja, hogy a táblák regisztrálva legyenek:
 from .models import (
     League, Team, Match, Bookmaker, OddsSnapshot,
-    ModelRun, Probability, EdgePick, BankrollLog
+    ModelRun, Probability, EdgePick, BankrollLog, EloRatingState, OddsLatest, OddsArchive,
+    PickQueue, PickStats, PipelineRun, PipelineStage,
 )
+from .etl.store import SQL_BACKFILL_ODDS_LATEST
+from .partitions import ensure_partitions, is_partitioned
+from .stats import SQL_INVALIDATE_STATS
+
+# create_all meglévő táblához nem ad oszlopot -> idempotens séma-frissítések
+SCHEMA_UPGRADES = [
+    "ALTER TABLE odds_snapshots ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP",
+    "DROP INDEX IF EXISTS ix_odds_latest_match_sel",   # helyette: ix_odds_latest_best
+    "ALTER TABLE pick_stats ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE pick_stats ADD COLUMN IF NOT EXISTS computed_version BIGINT NOT NULL DEFAULT 0",
+]
 
 def main():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for stmt in SCHEMA_UPGRADES:
+            conn.execute(text(stmt))
+        if is_partitioned(conn):
+            ensure_partitions(conn)
+        else:
+            print("! odds_snapshots is not partitioned – run: python -m herculesbet.partitions migrate")
+        # odds_latest első létrehozásakor feltöltjük a meglévő snapshotokból
+        if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM odds_latest)")).scalar():
+            conn.execute(SQL_BACKFILL_ODDS_LATEST)
+        # /stats/summary gyorsítótár: elavultnak jelölve, az első olvasás számolja újra
+        conn.execute(SQL_INVALIDATE_STATS)
+    # create_all meglévő táblára nem tesz új indexet -> pótoljuk
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(bind=engine, checkfirst=True)
     print("✔ Tables created in database.")
 
 if __name__ == "__main__":
@@ -1,8 +1,15 @@
+import time
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import (
+    select, tuple_, text, MetaData, Table, Column, Integer, String, Float, DateTime
+)
 from datetime import datetime
-from ..models import League, Team, Match, Bookmaker, OddsSnapshot
+from ..models import League, Team, Match, Bookmaker, OddsSnapshot, Probability
 from ..providers.base import Fixture, OddsQuote
+from ..config import ODDS_CHANGE_ONLY
+from ..metrics import add_rows
 from sqlalchemy.dialects.postgresql import insert
 
 def get_or_create_league(db: Session, name: str, country="") -> League:
@@ -23,29 +30,116 @@ def get_or_create_bookmaker(db: Session, name: str) -> Bookmaker:
     obj = Bookmaker(name=name)
     db.add(obj); db.commit(); db.refresh(obj); return obj
 
-def upsert_fixture(db: Session, fx: Fixture) -> Match:
-    lg = get_or_create_league(db, fx.league)
-    h = get_or_create_team(db, lg.id, fx.home)
-    a = get_or_create_team(db, lg.id, fx.away)
+class DimensionCache:
+    """
+    Ingest-szintű identity map a dimenzió-táblákra (leagues, teams, bookmakers).
+    preload(): táblánként egy lekérdezés név->id térképpé; a hiányzókat batch-ben,
+    INSERT ... ON CONFLICT DO NOTHING RETURNING-gel hozza létre. Nem commitol (a hívó dolga).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.leagues: Dict[str, int] = {}
+        self.teams: Dict[Tuple[int, str], int] = {}
+        self.bookmakers: Dict[str, int] = {}
+
+    def preload(self) -> "DimensionCache":
+        self.leagues = dict(self.db.execute(select(League.name, League.id)).all())
+        self.teams = {(lid, n): tid for lid, n, tid in
+                      self.db.execute(select(Team.league_id, Team.name, Team.id)).all()}
+        self.bookmakers = dict(self.db.execute(select(Bookmaker.name, Bookmaker.id)).all())
+        return self
+
+    def _create_missing(self, model, key_cols, rows: List[dict]) -> Dict[tuple, int]:
+        """Hiányzó sorok beszúrása; amit közben más hozott létre (ütközés), azt visszaolvassuk."""
+        if not rows:
+            return {}
+        cols = [getattr(model, c) for c in key_cols]
+        stmt = (
+            insert(model).values(rows)
+            .on_conflict_do_nothing(index_elements=cols)
+            .returning(model.id, *cols)
+        )
+        out = {tuple(r[1:]): r[0] for r in self.db.execute(stmt).all()}
+        missing = [tuple(r[c] for c in key_cols) for r in rows]
+        missing = [k for k in missing if k not in out]
+        if missing:
+            q = select(model.id, *cols).where(tuple_(*cols).in_(missing))
+            out.update({tuple(r[1:]): r[0] for r in self.db.execute(q).all()})
+        return out
+
+    def league_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        todo = sorted({n for n in names if n not in self.leagues})
+        created = self._create_missing(
+            League, ("name",),
+            [{"name": n, "country": None, "sport": "football"} for n in todo])
+        self.leagues.update({k[0]: v for k, v in created.items()})
+        return self.leagues
+
+    def team_ids(self, keys: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+        todo = sorted({k for k in keys if k not in self.teams})
+        created = self._create_missing(
+            Team, ("league_id", "name"),
+            [{"league_id": lid, "name": n} for lid, n in todo])
+        self.teams.update(created)
+        return self.teams
+
+    def bookmaker_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        todo = sorted({n for n in names if n not in self.bookmakers})
+        created = self._create_missing(Bookmaker, ("name",), [{"name": n} for n in todo])
+        self.bookmakers.update({k[0]: v for k, v in created.items()})
+        return self.bookmakers
+
+    def prime(self, fixtures: Iterable[Fixture] = (), quotes: Iterable[OddsQuote] = ()) -> "DimensionCache":
+        """Egy feed összes liga/csapat/iroda nevének feloldása, táblánként max. egy INSERT."""
+        fixtures = list(fixtures)
+        lg = self.league_ids(fx.league for fx in fixtures)
+        self.team_ids(
+            (lg[fx.league], name) for fx in fixtures for name in (fx.home, fx.away))
+        self.bookmaker_ids(q.bookmaker for q in quotes)
+        return self
+
+    def league_id(self, name: str) -> int:
+        return self.league_ids((name,))[name]
+
+    def team_id(self, league_id: int, name: str) -> int:
+        return self.team_ids(((league_id, name),))[(league_id, name)]
+
+    def bookmaker_id(self, name: str) -> int:
+        return self.bookmaker_ids((name,))[name]
+
+def upsert_fixture(db: Session, fx: Fixture, dims: Optional[DimensionCache] = None) -> Match:
+    if dims is not None:
+        lg_id = dims.league_id(fx.league)
+        h_id = dims.team_id(lg_id, fx.home)
+        a_id = dims.team_id(lg_id, fx.away)
+    else:
+        lg_id = get_or_create_league(db, fx.league).id
+        h_id = get_or_create_team(db, lg_id, fx.home).id
+        a_id = get_or_create_team(db, lg_id, fx.away).id
     # keresünk azonos (liga, home, away, start) alapján
     q = select(Match).where(
-        Match.league_id==lg.id,
-        Match.home_team_id==h.id,
-        Match.away_team_id==a.id,
+        Match.league_id==lg_id,
+        Match.home_team_id==h_id,
+        Match.away_team_id==a_id,
         Match.start_time==fx.start_time
     )
     m = db.execute(q).scalar_one_or_none()
     if m: return m
-    m = Match(league_id=lg.id, home_team_id=h.id, away_team_id=a.id,
+    m = Match(league_id=lg_id, home_team_id=h_id, away_team_id=a_id,
               start_time=fx.start_time, status="scheduled")
-    db.add(m); db.commit(); db.refresh(m); return m
+    db.add(m); db.flush(); return m
 
-def insert_odds_snapshot(db: Session, oq: OddsQuote, match_id: int):
-    bk = get_or_create_bookmaker(db, oq.bookmaker)
+def insert_odds_snapshot(db: Session, oq: OddsQuote, match_id: int,
+                         dims: Optional[DimensionCache] = None):
+    if dims is not None:
+        bk_id = dims.bookmaker_id(oq.bookmaker)
+    else:
+        bk_id = get_or_create_bookmaker(db, oq.bookmaker).id
 
     stmt = insert(OddsSnapshot).values(
         match_id=match_id,
-        bookmaker_id=bk.id,
+        bookmaker_id=bk_id,
         market=oq.market,
         selection=oq.selection,
         odds=oq.odds,
@@ -64,3 +158,405 @@ def insert_odds_snapshot(db: Session, oq: OddsQuote, match_id: int):
         set_={"odds": oq.odds},
     )
     db.execute(stmt)
+    upsert_odds_latest(db, match_id, bk_id, oq.market, oq.selection, oq.odds, oq.captured_at)
+
+# -----------------------------
+# Set-alapú bulk ingest (staging temp táblák + néhány merge utasítás)
+# -----------------------------
+STAGE_BATCH_SIZE = 5000  # soronként max. 7 bind paraméter
+
+_stage_meta = MetaData()
+_STG_FIXTURES = Table(
+    "_stg_fixtures", _stage_meta,
+    Column("ext_match_id", String), Column("league_id", Integer),
+    Column("home_team_id", Integer), Column("away_team_id", Integer),
+    Column("start_time", DateTime),
+)
+_STG_ODDS = Table(
+    "_stg_odds", _stage_meta,
+    Column("seq", Integer), Column("match_id", Integer), Column("bookmaker_id", Integer),
+    Column("market", String), Column("selection", String),
+    Column("odds", Float), Column("captured_at", DateTime),
+)
+
+_SQL_CREATE_STG_FIXTURES = text("""
+CREATE TEMP TABLE IF NOT EXISTS _stg_fixtures (
+  ext_match_id text, league_id int, home_team_id int, away_team_id int, start_time timestamp
+) ON COMMIT DROP
+""")
+_SQL_CREATE_STG_ODDS = text("""
+CREATE TEMP TABLE IF NOT EXISTS _stg_odds (
+  seq int, match_id int, bookmaker_id int, market text, selection text,
+  odds double precision, captured_at timestamp
+) ON COMMIT DROP
+""")
+
+_SQL_MERGE_FIXTURES = text("""
+INSERT INTO matches (league_id, home_team_id, away_team_id, start_time, status)
+SELECT DISTINCT s.league_id, s.home_team_id, s.away_team_id, s.start_time, 'scheduled'
+FROM _stg_fixtures s
+WHERE NOT EXISTS (
+  SELECT 1 FROM matches m
+  WHERE m.league_id = s.league_id
+    AND m.home_team_id = s.home_team_id
+    AND m.away_team_id = s.away_team_id
+    AND m.start_time = s.start_time
+)
+""")
+_SQL_FIXTURE_IDS = text("""
+SELECT s.ext_match_id, MIN(m.id)
+FROM _stg_fixtures s
+JOIN matches m
+  ON m.league_id = s.league_id
+ AND m.home_team_id = s.home_team_id
+ AND m.away_team_id = s.away_team_id
+ AND m.start_time = s.start_time
+GROUP BY s.ext_match_id
+""")
+
+# egy INSERT ... ON CONFLICT nem érintheti kétszer ugyanazt a sort -> kulcsonként a feedben
+# utolsó (legnagyobb seq) ár marad, mint a soronkénti on_conflict_do_update-nél
+_SQL_MERGE_ODDS = text("""
+INSERT INTO odds_snapshots (match_id, bookmaker_id, market, selection, odds, captured_at)
+SELECT DISTINCT ON (s.match_id, s.bookmaker_id, s.market, s.selection, s.captured_at)
+       s.match_id, s.bookmaker_id, s.market, s.selection, s.odds, s.captured_at
+FROM _stg_odds s
+ORDER BY s.match_id, s.bookmaker_id, s.market, s.selection, s.captured_at, s.seq DESC
+ON CONFLICT ON CONSTRAINT uq_odds_point_in_time DO UPDATE SET odds = EXCLUDED.odds
+""")
+
+# change-only mód: a feed kulcsaihoz tartozó utolsó tárolt sor
+_SQL_STG_LATEST = text("""
+CREATE TEMP TABLE _stg_latest ON COMMIT DROP AS
+SELECT DISTINCT ON (o.match_id, o.bookmaker_id, o.market, o.selection)
+       o.id, o.match_id, o.bookmaker_id, o.market, o.selection, o.odds, o.captured_at
+FROM odds_snapshots o
+JOIN (SELECT DISTINCT match_id, bookmaker_id, market, selection FROM _stg_odds) k
+  USING (match_id, bookmaker_id, market, selection)
+ORDER BY o.match_id, o.bookmaker_id, o.market, o.selection, o.captured_at DESC
+""")
+
+# az utolsó tárolt sornál frissebb quote-ok "futamokra" bontva: futam = egymást követő azonos ár.
+# run_no = 0: az ár megegyezik a tárolt utolsóval -> csak last_seen_at tolódik;
+# run_no > 0: új ár -> új sor (captured_at = futam eleje, last_seen_at = futam vége)
+_SQL_STG_RUNS = text("""
+CREATE TEMP TABLE _stg_runs ON COMMIT DROP AS
+WITH s AS (
+  SELECT DISTINCT ON (match_id, bookmaker_id, market, selection, captured_at)
+         match_id, bookmaker_id, market, selection, odds, captured_at
+  FROM _stg_odds
+  ORDER BY match_id, bookmaker_id, market, selection, captured_at, seq DESC
+),
+fresh AS (
+  SELECT s.*, l.id AS latest_id, l.captured_at AS latest_at,
+         COALESCE(LAG(s.odds) OVER w, l.odds) AS prev_odds
+  FROM s
+  LEFT JOIN _stg_latest l USING (match_id, bookmaker_id, market, selection)
+  WHERE l.captured_at IS NULL OR s.captured_at > l.captured_at
+  WINDOW w AS (PARTITION BY s.match_id, s.bookmaker_id, s.market, s.selection ORDER BY s.captured_at)
+),
+flagged AS (
+  SELECT f.*,
+         SUM(CASE WHEN f.prev_odds IS NOT DISTINCT FROM f.odds THEN 0 ELSE 1 END) OVER w AS run_no
+  FROM fresh f
+  WINDOW w AS (PARTITION BY f.match_id, f.bookmaker_id, f.market, f.selection ORDER BY f.captured_at)
+)
+SELECT match_id, bookmaker_id, market, selection, run_no,
+       MIN(latest_id) AS latest_id, MIN(latest_at) AS latest_at, MIN(odds) AS odds,
+       MIN(captured_at) AS first_at, MAX(captured_at) AS last_at
+FROM flagged
+GROUP BY match_id, bookmaker_id, market, selection, run_no
+""")
+
+# latest_at: a partíciókulcs is kell, különben minden partíció PK-indexét végignézi
+_SQL_EXTEND_LAST_SEEN = text("""
+UPDATE odds_snapshots o
+SET last_seen_at = GREATEST(COALESCE(o.last_seen_at, o.captured_at), r.last_at)
+FROM _stg_runs r
+WHERE r.run_no = 0 AND o.id = r.latest_id AND o.captured_at = r.latest_at
+""")
+
+_SQL_INSERT_RUNS = text("""
+INSERT INTO odds_snapshots (match_id, bookmaker_id, market, selection, odds, captured_at, last_seen_at)
+SELECT match_id, bookmaker_id, market, selection, odds, first_at, last_at
+FROM _stg_runs
+WHERE run_no > 0
+ON CONFLICT ON CONSTRAINT uq_odds_point_in_time
+DO UPDATE SET odds = EXCLUDED.odds, last_seen_at = EXCLUDED.last_seen_at
+""")
+
+# késve érkező (a tárolt utolsónál nem frissebb) quote-ok: a régi pont-idejű upsert szemantika
+_SQL_MERGE_LATE_ODDS = text("""
+INSERT INTO odds_snapshots (match_id, bookmaker_id, market, selection, odds, captured_at)
+SELECT DISTINCT ON (s.match_id, s.bookmaker_id, s.market, s.selection, s.captured_at)
+       s.match_id, s.bookmaker_id, s.market, s.selection, s.odds, s.captured_at
+FROM _stg_odds s
+JOIN _stg_latest l USING (match_id, bookmaker_id, market, selection)
+WHERE s.captured_at <= l.captured_at
+ORDER BY s.match_id, s.bookmaker_id, s.market, s.selection, s.captured_at, s.seq DESC
+ON CONFLICT ON CONSTRAINT uq_odds_point_in_time DO UPDATE SET odds = EXCLUDED.odds
+""")
+
+# odds_latest karbantartása: kulcsonként a legfrissebb quote; azonos árnál a captured_at marad,
+# késve érkező (régebbi) quote nem írja felül
+_ODDS_LATEST_CONFLICT = """
+ON CONFLICT (match_id, bookmaker_id, market, selection) DO UPDATE
+SET odds = EXCLUDED.odds,
+    captured_at = CASE WHEN odds_latest.odds = EXCLUDED.odds
+                       THEN odds_latest.captured_at ELSE EXCLUDED.captured_at END,
+    seen_at = EXCLUDED.seen_at
+WHERE EXCLUDED.seen_at >= odds_latest.seen_at
+"""
+
+_SQL_UPSERT_LATEST_FROM_STAGE = text("""
+INSERT INTO odds_latest (match_id, bookmaker_id, market, selection, odds, captured_at, seen_at)
+SELECT DISTINCT ON (s.match_id, s.bookmaker_id, s.market, s.selection)
+       s.match_id, s.bookmaker_id, s.market, s.selection, s.odds, s.captured_at, s.captured_at
+FROM _stg_odds s
+ORDER BY s.match_id, s.bookmaker_id, s.market, s.selection, s.captured_at DESC, s.seq DESC
+""" + _ODDS_LATEST_CONFLICT)
+
+_SQL_UPSERT_LATEST_ONE = text("""
+INSERT INTO odds_latest (match_id, bookmaker_id, market, selection, odds, captured_at, seen_at)
+VALUES (:match_id, :bookmaker_id, :market, :selection, :odds, :captured_at, :captured_at)
+""" + _ODDS_LATEST_CONFLICT)
+
+# egyszeri feltöltés a meglévő történetből (db_init, ha az odds_latest üres)
+SQL_BACKFILL_ODDS_LATEST = text("""
+INSERT INTO odds_latest (match_id, bookmaker_id, market, selection, odds, captured_at, seen_at)
+SELECT DISTINCT ON (o.match_id, o.bookmaker_id, o.market, o.selection)
+       o.match_id, o.bookmaker_id, o.market, o.selection, o.odds, o.captured_at,
+       COALESCE(o.last_seen_at, o.captured_at)
+FROM odds_snapshots o
+ORDER BY o.match_id, o.bookmaker_id, o.market, o.selection, o.captured_at DESC
+ON CONFLICT DO NOTHING
+""")
+
+def upsert_odds_latest(db: Session, match_id: int, bookmaker_id: int, market: str,
+                       selection: str, odds: float, captured_at: datetime) -> None:
+    db.execute(_SQL_UPSERT_LATEST_ONE, {
+        "match_id": match_id, "bookmaker_id": bookmaker_id, "market": market,
+        "selection": selection, "odds": odds, "captured_at": captured_at,
+    })
+    enqueue_matches(db, [match_id])
+
+# -----------------------------
+# Dirty-match sor (pick_queue): a generate_picks csak ezeket értékeli újra
+# -----------------------------
+_SQL_ENQUEUE = text("""
+INSERT INTO pick_queue (match_id, queued_at)
+SELECT DISTINCT unnest(CAST(:ids AS integer[])), now()
+ON CONFLICT (match_id) DO NOTHING
+""")
+
+# az odds_latest upsert ELŐTT fut: új kulcs vagy megváltozott (nem elavult) ár -> sorba
+_SQL_ENQUEUE_CHANGED_ODDS = text("""
+INSERT INTO pick_queue (match_id, queued_at)
+SELECT DISTINCT s.match_id, now()
+FROM (
+  SELECT DISTINCT ON (match_id, bookmaker_id, market, selection)
+         match_id, bookmaker_id, market, selection, odds, captured_at
+  FROM _stg_odds
+  ORDER BY match_id, bookmaker_id, market, selection, captured_at DESC, seq DESC
+) s
+LEFT JOIN odds_latest l
+  ON l.match_id = s.match_id AND l.bookmaker_id = s.bookmaker_id
+ AND l.market = s.market AND l.selection = s.selection
+WHERE l.match_id IS NULL
+   OR (l.odds <> s.odds AND s.captured_at >= l.seen_at)
+ON CONFLICT (match_id) DO NOTHING
+""")
+
+# a generate_picks a legutolsó model_run-t használja -> az ugyanazon modell előző futásához képest
+# változott (vagy abban nem szereplő) valószínűségű meccsek kerülnek sorba; match_id sorrendben,
+# hogy a párhuzamosan futó modellek ne akadjanak össze (deadlock) a pick_queue-n
+_SQL_ENQUEUE_CHANGED_PROBS = text("""
+INSERT INTO pick_queue (match_id, queued_at)
+SELECT DISTINCT n.match_id, now()
+FROM probabilities n
+LEFT JOIN probabilities o
+  ON o.model_run_id = (SELECT MAX(id) FROM model_runs
+                       WHERE id < :rid
+                         AND model_name = (SELECT model_name FROM model_runs WHERE id = :rid))
+ AND o.match_id = n.match_id AND o.market = n.market AND o.selection = n.selection
+WHERE n.model_run_id = :rid
+  AND o.prob IS DISTINCT FROM n.prob
+ORDER BY n.match_id
+ON CONFLICT (match_id) DO NOTHING
+""")
+
+def enqueue_matches(db: Session, match_ids: Iterable[int]) -> None:
+    """Meccsek explicit sorba tétele pick-újraszámoláshoz. Commit a hívó dolga."""
+    ids = sorted(set(match_ids))
+    if ids:
+        db.execute(_SQL_ENQUEUE, {"ids": ids})
+
+def _stage(db: Session, create_sql, table: Table, rows: List[dict], batch_size: int) -> None:
+    """Temp staging tábla (tranzakció végén eldobva) feltöltése többsoros VALUES batch-ekkel."""
+    db.execute(create_sql)
+    db.execute(text(f"TRUNCATE {table.name}"))
+    stmt = table.insert().execution_options(insertmanyvalues_page_size=batch_size)
+    for i in range(0, len(rows), batch_size):
+        db.execute(stmt, rows[i:i + batch_size])
+
+def bulk_upsert_fixtures(db: Session, fixtures: List[Fixture], dims: DimensionCache,
+                         batch_size: int = STAGE_BATCH_SIZE) -> Dict[str, int]:
+    """Fixture-k set-alapú upsertje; visszaad: ext_match_id -> match_id."""
+    if not fixtures:
+        return {}
+    dims.prime(fixtures)
+    rows = []
+    for fx in fixtures:
+        lg_id = dims.leagues[fx.league]
+        rows.append({
+            "ext_match_id": fx.ext_match_id, "league_id": lg_id,
+            "home_team_id": dims.teams[(lg_id, fx.home)],
+            "away_team_id": dims.teams[(lg_id, fx.away)],
+            "start_time": fx.start_time,
+        })
+    _stage(db, _SQL_CREATE_STG_FIXTURES, _STG_FIXTURES, rows, batch_size)
+    db.execute(_SQL_MERGE_FIXTURES)
+    return {ext: mid for ext, mid in db.execute(_SQL_FIXTURE_IDS).all()}
+
+def _merge_odds_change_only(db: Session) -> int:
+    """Change-only merge a _stg_odds-ból; visszaad: új + kiterjesztett + késve jött sorok száma."""
+    db.execute(text("DROP TABLE IF EXISTS _stg_latest, _stg_runs"))
+    db.execute(_SQL_STG_LATEST)
+    db.execute(_SQL_STG_RUNS)
+    n = db.execute(_SQL_EXTEND_LAST_SEEN).rowcount
+    n += db.execute(_SQL_INSERT_RUNS).rowcount
+    n += db.execute(_SQL_MERGE_LATE_ODDS).rowcount
+    return n
+
+def bulk_insert_odds(db: Session, quotes: List[OddsQuote], id_map: Dict[str, int],
+                     dims: DimensionCache, batch_size: int = STAGE_BATCH_SIZE,
+                     change_only: bool = ODDS_CHANGE_ONLY) -> int:
+    """
+    Odds snapshotok set-alapú beírása; az uq_odds_point_in_time ütközés szemantikája
+    ugyanaz, mint insert_odds_snapshot-nál (frissül az odds). Ismeretlen meccsű quote kimarad.
+    change_only: ha a quote ára megegyezik a (match, bookmaker, market, selection) utolsó
+    tárolt árával, nem lesz új sor, csak annak last_seen_at-je tolódik ki.
+    Visszaad: beírt/frissített sorok száma.
+    """
+    dims.bookmaker_ids(q.bookmaker for q in quotes)
+    rows = [
+        {"seq": i, "match_id": id_map[q.ext_match_id],
+         "bookmaker_id": dims.bookmakers[q.bookmaker], "market": q.market,
+         "selection": q.selection, "odds": q.odds, "captured_at": q.captured_at}
+        for i, q in enumerate(quotes) if q.ext_match_id in id_map
+    ]
+    if not rows:
+        return 0
+    _stage(db, _SQL_CREATE_STG_ODDS, _STG_ODDS, rows, batch_size)
+    if change_only:
+        n = _merge_odds_change_only(db)
+    else:
+        n = db.execute(_SQL_MERGE_ODDS).rowcount
+    # ugyanabban a tranzakcióban a pick_queue és az odds_latest is frissül
+    db.execute(_SQL_ENQUEUE_CHANGED_ODDS)
+    db.execute(_SQL_UPSERT_LATEST_FROM_STAGE)
+    return n
+
+def bulk_ingest(db: Session, fixtures: List[Fixture], quotes: List[OddsQuote],
+                dims: Optional[DimensionCache] = None) -> Tuple[Dict[str, int], int]:
+    """Egy provider-feed teljes ingestje néhány round trippel. Commit a hívó dolga."""
+    dims = dims or DimensionCache(db).preload()
+    id_map = bulk_upsert_fixtures(db, fixtures, dims)
+    n_odds = bulk_insert_odds(db, quotes, id_map, dims)
+    _count_ingest(len(fixtures), len(quotes), n_odds)
+    return id_map, n_odds
+
+def _count_ingest(n_fixtures: int, n_quotes: int, n_odds: int) -> None:
+    add_rows(n_fixtures, "fixtures")
+    add_rows(n_quotes, "quotes")
+    add_rows(n_odds, "odds_written")
+
+# Streaming ingest: egy micro-batch quote-jai korábbi batch fixture-jeire is hivatkozhatnak.
+# A matches táblában nincs ext_match_id -> a leképezés egy kapcsolat-szintű TEMP táblában él
+# (a Pythonban tartott dict a fixture-k számával nőne).
+_SQL_CREATE_EXT_IDS = text("""
+CREATE TEMP TABLE IF NOT EXISTS _ext_match_ids (
+  ext_match_id text PRIMARY KEY, match_id integer NOT NULL
+)
+""")
+
+_SQL_REMEMBER_EXT_IDS = text("""
+INSERT INTO _ext_match_ids (ext_match_id, match_id)
+SELECT * FROM unnest(CAST(:ext AS text[]), CAST(:mid AS integer[]))
+ON CONFLICT (ext_match_id) DO UPDATE SET match_id = EXCLUDED.match_id
+""")
+
+# a TEMP tábla a kapcsolattal a pool-ba kerülne (és a DROP SCHEMA public-ot is túléli)
+_SQL_DROP_EXT_IDS = text("DROP TABLE IF EXISTS _ext_match_ids")
+
+_SQL_LOOKUP_EXT_IDS = text("""
+SELECT ext_match_id, match_id FROM _ext_match_ids
+WHERE ext_match_id = ANY(CAST(:ext AS text[]))
+""")
+
+def bulk_ingest_batch(db: Session, fixtures: List[Fixture], quotes: List[OddsQuote],
+                      dims: DimensionCache) -> Tuple[int, int]:
+    """
+    bulk_ingest egy streaming micro-batch-re: a korábbi batch-ek fixture-jeire hivatkozó
+    quote-ok a _ext_match_ids TEMP táblából oldódnak fel. A session egyetlen kapcsolathoz
+    legyen kötve (Session(bind=connection)), hogy a TEMP tábla commitok között is megmaradjon.
+    Visszaad: (fixture-k, beírt odds sorok). Commit a hívó dolga.
+    """
+    db.execute(_SQL_CREATE_EXT_IDS)
+    id_map = bulk_upsert_fixtures(db, fixtures, dims)
+    if id_map:
+        db.execute(_SQL_REMEMBER_EXT_IDS, {"ext": list(id_map), "mid": list(id_map.values())})
+    missing = list({q.ext_match_id for q in quotes} - id_map.keys())
+    if missing:
+        id_map.update(db.execute(_SQL_LOOKUP_EXT_IDS, {"ext": missing}).all())
+    n_odds = bulk_insert_odds(db, quotes, id_map, dims)
+    _count_ingest(len(fixtures), len(quotes), n_odds)
+    return len(fixtures), n_odds
+
+def drop_ext_match_ids(db: Session) -> None:
+    """
+    A _ext_match_ids TEMP tábla eldobása (stream eleje / vége), hogy egy korábbi ingest
+    ext id -> match_id leképezése ne oldjon fel elavult meccsre. Félbeszakadt tranzakciót visszagörget.
+    """
+    db.rollback()
+    db.execute(_SQL_DROP_EXT_IDS)
+    db.commit()
+
+PROB_BATCH_SIZE = 5000  # soronként 6 bind paraméter -> jóval a 65535-ös PG limit alatt
+
+def bulk_insert_probabilities(db: Session, model_run_id: int,
+                              rows: Iterable[Tuple[int, str, float, float]],
+                              market: str = "1X2",
+                              batch_size: int = PROB_BATCH_SIZE) -> Tuple[int, float]:
+    """
+    (match_id, selection, prob, fair_odds) sorok írása a probabilities táblába
+    többsoros INSERT-ekkel, batch_size-onként egy round trip, ORM objektumok nélkül.
+    A rows lehet generátor is (nem kerül egyszerre memóriába). Commit a hívó dolga.
+    A megváltozott valószínűségű meccsek a pick_queue-ba kerülnek.
+    Visszaad: (beírt sorok száma, eltelt másodperc).
+    """
+    t0 = time.perf_counter()
+    n = 0
+    it = iter(rows)
+    while True:
+        chunk = [
+            {"model_run_id": model_run_id, "match_id": mid, "market": market,
+             "selection": sel, "prob": p, "fair_odds": fo}
+            for mid, sel, p, fo in islice(it, batch_size)
+        ]
+        if not chunk:
+            break
+        # executemany -> SQLAlchemy "insertmanyvalues": egy többsoros VALUES batch-enként
+        db.execute(
+            Probability.__table__.insert().execution_options(insertmanyvalues_page_size=batch_size),
+            chunk,
+        )
+        n += len(chunk)
+    if n:
+        db.execute(_SQL_ENQUEUE_CHANGED_PROBS, {"rid": model_run_id})
+    add_rows(n, "probabilities")
+    return n, time.perf_counter() - t0
+
+def record_write_stats(mr, rows: int, seconds: float) -> None:
+    """Írási statisztika a ModelRun.params-ba (a meglévő kulcsok megmaradnak)."""
+    mr.params = {**(mr.params or {}), "prob_write": {"rows": rows, "seconds": round(seconds, 4)}}
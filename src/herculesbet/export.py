@@ -0,0 +1,170 @@
+"""
+Streaming export (edge_picks, odds_snapshots): NDJSON, CSV vagy Arrow IPC stream.
+
+A lekérdezés server-side cursorral fut (AsyncSession.stream + yield_per), a sorok
+EXPORT_BATCH_ROWS-onként kódolva mennek ki -> a memóriahasználat nem függ a sorok számától.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import DateTime, Float, Integer, select
+from sqlalchemy.orm import aliased
+from .config import EXPORT_BATCH_ROWS
+from .db_async import AsyncSessionLocal
+from .models import EdgePick, Match, Team, League, Bookmaker, OddsSnapshot
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+Home = aliased(Team)
+Away = aliased(Team)
+
+def picks_export_query(league: Optional[str] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None):
+    """edge_picks meccs/liga/iroda nevekkel; szűrés created_at-re és ligára."""
+    q = (
+        select(
+            EdgePick.id, EdgePick.match_id, League.name.label("league"),
+            Home.name.label("home"), Away.name.label("away"), Match.start_time,
+            EdgePick.market, EdgePick.selection, Bookmaker.name.label("bookmaker"),
+            EdgePick.offered_odds, EdgePick.model_prob, EdgePick.edge, EdgePick.stake_fraction,
+            EdgePick.created_at, EdgePick.status, EdgePick.result, EdgePick.profit,
+            EdgePick.closing_odds, EdgePick.clv,
+        )
+        .join(Match, EdgePick.match_id == Match.id)
+        .join(Home, Match.home_team_id == Home.id)
+        .join(Away, Match.away_team_id == Away.id)
+        .join(League, Match.league_id == League.id)
+        .join(Bookmaker, EdgePick.bookmaker_id == Bookmaker.id)
+    )
+    if league is not None:
+        q = q.where(League.name == league)
+    if since is not None:
+        q = q.where(EdgePick.created_at >= since)
+    if until is not None:
+        q = q.where(EdgePick.created_at < until)
+    return q.order_by(EdgePick.created_at, EdgePick.id)
+
+def odds_export_query(league: Optional[str] = None, since: Optional[datetime] = None,
+                      until: Optional[datetime] = None):
+    """odds_snapshots liga/iroda nevekkel; a captured_at szűrés partíciókat vág le. Rendezés nincs."""
+    q = (
+        select(
+            OddsSnapshot.id, OddsSnapshot.match_id, League.name.label("league"),
+            Bookmaker.name.label("bookmaker"), OddsSnapshot.market, OddsSnapshot.selection,
+            OddsSnapshot.odds, OddsSnapshot.captured_at, OddsSnapshot.last_seen_at,
+        )
+        .join(Match, OddsSnapshot.match_id == Match.id)
+        .join(League, Match.league_id == League.id)
+        .join(Bookmaker, OddsSnapshot.bookmaker_id == Bookmaker.id)
+    )
+    if league is not None:
+        q = q.where(League.name == league)
+    if since is not None:
+        q = q.where(OddsSnapshot.captured_at >= since)
+    if until is not None:
+        q = q.where(OddsSnapshot.captured_at < until)
+    return q
+
+def _iso(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+# -----------------------------
+# Kódolók: oszlopnevek + sor-batch -> bytes
+# -----------------------------
+class NdjsonEncoder:
+    def __init__(self, query):
+        self.names = [c.name for c in query.selected_columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    def batch(self, rows: List[tuple]) -> bytes:
+        names = self.names
+        return "".join(
+            json.dumps(dict(zip(names, map(_iso, r))), separators=(",", ":")) + "\n" for r in rows
+        ).encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+class CsvEncoder:
+    def __init__(self, query):
+        self.names = [c.name for c in query.selected_columns]
+
+    def _write(self, rows) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._write([self.names])
+
+    def batch(self, rows: List[tuple]) -> bytes:
+        return self._write([tuple(map(_iso, r)) for r in rows])
+
+    def footer(self) -> bytes:
+        return b""
+
+class ArrowEncoder:
+    """Arrow IPC stream: séma egyszer, utána batch-enként egy RecordBatch. pyarrow opcionális."""
+
+    def __init__(self, query):
+        import pyarrow as pa   # opcionális függőség: csak format=arrow kéri
+        self.pa = pa
+        fields = []
+        for c in query.selected_columns:
+            if isinstance(c.type, Integer):
+                t = pa.int64()
+            elif isinstance(c.type, Float):
+                t = pa.float64()
+            elif isinstance(c.type, DateTime):
+                t = pa.timestamp("us")
+            else:
+                t = pa.string()
+            fields.append(pa.field(c.name, t))
+        self.schema = pa.schema(fields)
+        self.sink = io.BytesIO()
+        self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def _drain(self) -> bytes:
+        out = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return out
+
+    def header(self) -> bytes:
+        return self._drain()   # a séma üzenet
+
+    def batch(self, rows: List[tuple]) -> bytes:
+        cols = list(zip(*rows))
+        self.writer.write_batch(self.pa.record_batch(
+            [self.pa.array(col, type=f.type) for col, f in zip(cols, self.schema)],
+            schema=self.schema,
+        ))
+        return self._drain()
+
+    def footer(self) -> bytes:
+        self.writer.close()
+        return self._drain()
+
+ENCODERS = {"ndjson": NdjsonEncoder, "csv": CsvEncoder, "arrow": ArrowEncoder}
+
+def make_encoder(fmt: str, query):
+    """ImportError, ha format=arrow és nincs pyarrow (a hívó még a stream előtt kezeli)."""
+    return ENCODERS[fmt](query)
+
+async def stream_export(query, encoder, batch_rows: int = EXPORT_BATCH_ROWS) -> AsyncIterator[bytes]:
+    """Saját session + server-side cursor; batch_rows soronként egy kódolt chunk."""
+    yield encoder.header()
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_rows))
+        async for rows in result.partitions(batch_rows):
+            yield encoder.batch(rows)
+    yield encoder.footer()
@@ -1,9 +1,13 @@
 # src/herculesbet/generate_picks.py
+import argparse
 import os
+from dataclasses import dataclass
 from typing import Optional
 
 from sqlalchemy import text
 from .db import SessionLocal
+from .metrics import add_rows, cli, staged
+from .stats import invalidate_pick_stats
 
 # -----------------------------
 # Env paramok
@@ -42,28 +46,27 @@ KELLY_FRACTION = _get_float("KELLY_FRACTION", 0.25)
 UPCOMING_ONLY = _get_bool("UPCOMING_ONLY", True)
 UPCOMING_GRACE_MIN = _get_int("UPCOMING_GRACE_MIN", 15)   # meccs kezdéséhez képest ennyivel “hátra” még ok
 LOOKBACK_HOURS = _get_int("LOOKBACK_HOURS", 48)           # odds snapshot lookback ablak
+FULL_REFRESH = _get_bool("PICKS_FULL_REFRESH", False)     # False: csak a pick_queue meccsei
+PICKS_MODEL = os.getenv("PICKS_MODEL", "")                # model_runs.model_name; üres = bármely utolsó futás
 
 # -----------------------------
 # SQL (bind paramokkal!)
 # -----------------------------
-# 1) UPDATE meglévő OPEN rekordok
-SQL_UPDATE_OPEN = text("""
-WITH last_run AS (
-  SELECT MAX(id) AS rid FROM model_runs
-),
-upcoming AS (
-  SELECT m.id AS match_id
-  FROM matches m
-  WHERE (:upcoming_only = FALSE)
-     OR (m.start_time > now() - make_interval(mins => :grace_min))
+# Egyetlen menet: a jelöltek egyszer számolódnak, és egy INSERT ... ON CONFLICT
+# a nyitott pickek részleges unique indexén (uq_edge_picks_open) beszúr vagy frissít.
+# A jelöltek az utolsó futás valószínűségeiből indulnak (csak ütemezett meccsek),
+# a meccsekhez PK-n kapcsolódnak -> a munka a közelgő meccsekkel arányos, nem a teljes történettel.
+# A legjobb ár (meccs, kimenetel)-enként LIMIT 1 az ix_odds_latest_best indexen (nincs nagy rendezés).
+# Frissítés csak akkor történik, ha a pick tényleg változott (iroda, odds vagy modell-valószínűség).
+# Inkrementális mód: csak a pick_queue-ban lévő (ingest / modellfutás által jelölt) meccsek;
+# a sor mindkét módban ugyanebben az utasításban ürül (claimed CTE).
+SQL_UPSERT_PICKS = text("""
+WITH claimed AS (
+  DELETE FROM pick_queue RETURNING match_id
 ),
-best_odds AS (
-  SELECT DISTINCT ON (o.match_id, o.selection)
-    o.match_id, o.selection, o.bookmaker_id, o.odds AS offered_odds
-  FROM odds_snapshots o
-  WHERE o.captured_at > now() - make_interval(hours => :lookback_hours)
-    AND o.market IN ('1X2','h2h')
-  ORDER BY o.match_id, o.selection, o.odds DESC, o.captured_at DESC
+last_run AS (
+  SELECT MAX(id) AS rid FROM model_runs
+  WHERE :model = '' OR model_name = :model
 ),
 probs AS (
   SELECT p.model_run_id, p.match_id,
@@ -71,6 +74,7 @@ probs AS (
   FROM probabilities p, last_run
   WHERE p.model_run_id = last_run.rid
     AND p.market IN ('1X2','h2h')
+    AND (:full OR p.match_id IN (SELECT match_id FROM claimed))
 ),
 candidates AS (
   SELECT pr.match_id, pr.market, pr.selection,
@@ -78,59 +82,19 @@ candidates AS (
          pr.prob, pr.fair_odds,
          (bo.offered_odds * pr.prob - 1.0) AS edge_raw
   FROM probs pr
-  JOIN best_odds bo USING (match_id, selection)
-  JOIN upcoming u ON u.match_id = pr.match_id
-)
-UPDATE edge_picks ep
-SET bookmaker_id = c.bookmaker_id,
-    offered_odds = c.offered_odds,
-    model_prob   = c.prob,
-    edge         = c.edge_raw,
-    stake_fraction = GREATEST(0, LEAST(1, :kelly * (c.edge_raw / NULLIF(c.offered_odds - 1.0, 0)))),
-    created_at   = now()
-FROM candidates c
-WHERE ep.status = 'open'
-  AND ep.match_id  = c.match_id
-  AND ep.market    = c.market
-  AND ep.selection = c.selection
-  AND c.edge_raw >= :edge_min
-  AND c.offered_odds > 1.0;
-""")
-
-# 2) INSERT csak ami még nem létezik OPEN-ként
-SQL_INSERT_NEW = text("""
-WITH last_run AS (
-  SELECT MAX(id) AS rid FROM model_runs
-),
-upcoming AS (
-  SELECT m.id AS match_id
-  FROM matches m
+  JOIN matches m ON m.id = pr.match_id
+  CROSS JOIN LATERAL (
+    SELECT o.bookmaker_id, o.odds AS offered_odds
+    FROM odds_latest o
+    WHERE o.match_id = pr.match_id
+      AND o.selection = pr.selection
+      AND o.market IN ('1X2','h2h')
+      AND o.seen_at > now() - make_interval(hours => :lookback_hours)
+    ORDER BY o.odds DESC, o.seen_at DESC, o.bookmaker_id
+    LIMIT 1
+  ) bo
   WHERE (:upcoming_only = FALSE)
      OR (m.start_time > now() - make_interval(mins => :grace_min))
-),
-best_odds AS (
-  SELECT DISTINCT ON (o.match_id, o.selection)
-    o.match_id, o.selection, o.bookmaker_id, o.odds AS offered_odds
-  FROM odds_snapshots o
-  WHERE o.captured_at > now() - make_interval(hours => :lookback_hours)
-    AND o.market IN ('1X2','h2h')
-  ORDER BY o.match_id, o.selection, o.odds DESC, o.captured_at DESC
-),
-probs AS (
-  SELECT p.model_run_id, p.match_id,
-         COALESCE(p.market,'1X2') AS market, p.selection, p.prob, p.fair_odds
-  FROM probabilities p, last_run
-  WHERE p.model_run_id = last_run.rid
-    AND p.market IN ('1X2','h2h')
-),
-candidates AS (
-  SELECT pr.match_id, pr.market, pr.selection,
-         bo.bookmaker_id, bo.offered_odds,
-         pr.prob, pr.fair_odds,
-         (bo.offered_odds * pr.prob - 1.0) AS edge_raw
-  FROM probs pr
-  JOIN best_odds bo USING (match_id, selection)
-  JOIN upcoming u ON u.match_id = pr.match_id
 )
 INSERT INTO edge_picks
   (match_id, market, selection, bookmaker_id,
@@ -145,37 +109,60 @@ SELECT
 FROM candidates c
 WHERE c.edge_raw >= :edge_min
   AND c.offered_odds > 1.0
-  AND NOT EXISTS (
-    SELECT 1 FROM edge_picks ep
-    WHERE ep.status='open'
-      AND ep.match_id  = c.match_id
-      AND ep.market    = c.market
-      AND ep.selection = c.selection
-  )
-RETURNING match_id;
+ON CONFLICT (match_id, market, selection) WHERE status = 'open'
+DO UPDATE
+SET bookmaker_id   = EXCLUDED.bookmaker_id,
+    offered_odds   = EXCLUDED.offered_odds,
+    model_prob     = EXCLUDED.model_prob,
+    edge           = EXCLUDED.edge,
+    stake_fraction = EXCLUDED.stake_fraction,
+    created_at     = now()
+WHERE (edge_picks.bookmaker_id, edge_picks.offered_odds, edge_picks.model_prob)
+      IS DISTINCT FROM (EXCLUDED.bookmaker_id, EXCLUDED.offered_odds, EXCLUDED.model_prob)
+RETURNING (xmax = 0) AS inserted;
 """)
 
-def run_once(session) -> int:
+SQL_COUNT_OPEN = text("SELECT count(*) FROM edge_picks WHERE status = 'open'")
+
+@dataclass
+class PickCounts:
+    inserted: int = 0
+    updated: int = 0
+    untouched: int = 0   # nyitva maradt pick, amihez nem nyúltunk
+
+@staged("picks")
+def run_once(session, full: bool = FULL_REFRESH, model: str = PICKS_MODEL) -> PickCounts:
     params = {
+        "full": full,
+        "model": model or "",
         "kelly": KELLY_FRACTION,
         "edge_min": EDGE_MIN,
         "upcoming_only": UPCOMING_ONLY,
         "grace_min": UPCOMING_GRACE_MIN,
         "lookback_hours": LOOKBACK_HOURS,
     }
-    # először frissítjük a meglévő OPEN rekordokat
-    session.execute(SQL_UPDATE_OPEN, params)
-    # majd beszúrjuk az újakat
-    res = session.execute(SQL_INSERT_NEW, params)
-    rows = res.fetchall()
-    return len(rows)
+    flags = session.execute(SQL_UPSERT_PICKS, params).scalars().all()
+    inserted = sum(1 for f in flags if f)
+    updated = len(flags) - inserted
+    if flags:
+        invalidate_pick_stats(session)
+    n_open = session.execute(SQL_COUNT_OPEN).scalar() or 0
+    add_rows(inserted, "picks_inserted")
+    add_rows(updated, "picks_updated")
+    return PickCounts(inserted=inserted, updated=updated, untouched=max(n_open - len(flags), 0))
 
+@cli("generate_picks")
 def main():
-    inserted = 0
+    ap = argparse.ArgumentParser(description="Edge pickek generálása")
+    ap.add_argument("--full", action="store_true", default=FULL_REFRESH,
+                    help="minden közelgő meccs újraértékelése (nem csak a pick_queue)")
+    args = ap.parse_args()
     with SessionLocal() as session:
-        inserted = run_once(session)
+        counts = run_once(session, full=args.full)
         session.commit()
-    print(f"✔ Picks upsert done (inserted ~{inserted} rows)")
+    mode = "full" if args.full else "incremental"
+    print(f"✔ Picks upsert done [{mode}] (inserted={counts.inserted}, updated={counts.updated}, "
+          f"untouched={counts.untouched})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+"""
+Lezárt meccs-történet segédek, amiket több modell is használ.
+"""
+from __future__ import annotations
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .config import MODEL_WORKERS
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# (start_time, match_id) – a feldolgozás sorrendje és a high-water mark
+HighWater = Tuple[datetime, int]
+
+# -----------------------------
+# LeagueHistory: a meccs-történet oszlop-tömbökként, futásonként egyszer betöltve
+# -----------------------------
+STATUSES = ("scheduled", "live", "finished")   # status kód = index; ismeretlen -> len(STATUSES)
+NO_SCORE = -1
+LOAD_CHUNK = 50_000
+
+@dataclass
+class LeagueHistory:
+    """
+    Egy liga összes meccse oszloponként, (start_time, id) szerint rendezve.
+    home/away: index a team_ids-be; hiányzó gól: NO_SCORE. Nincs ORM objektum, soronként ~30 bájt.
+    """
+    league_id: int
+    team_ids: np.ndarray      # index -> team id (növekvő)
+    match_id: np.ndarray      # int64
+    start_time: np.ndarray    # datetime64[us]
+    home: np.ndarray          # int32
+    away: np.ndarray          # int32
+    home_score: np.ndarray    # int16
+    away_score: np.ndarray    # int16
+    status: np.ndarray        # int8
+
+    @classmethod
+    def empty(cls, league_id: int) -> "LeagueHistory":
+        i = np.empty(0, dtype=np.int64)
+        return cls(league_id, i, i, np.empty(0, dtype="datetime64[us]"),
+                   i.astype(np.int32), i.astype(np.int32), i.astype(np.int16), i.astype(np.int16),
+                   i.astype(np.int8))
+
+    def __len__(self) -> int:
+        return len(self.match_id)
+
+    def status_mask(self, status: str) -> np.ndarray:
+        return self.status == STATUSES.index(status)
+
+    def finished_mask(self) -> np.ndarray:
+        """Lezárt és van eredmény (ezeken tanulnak a modellek)."""
+        return (self.status_mask("finished")
+                & (self.home_score != NO_SCORE) & (self.away_score != NO_SCORE))
+
+    def _upto_mask(self, hw: HighWater) -> np.ndarray:
+        t = np.datetime64(hw[0], "us")
+        return (self.start_time < t) | ((self.start_time == t) & (self.match_id <= hw[1]))
+
+    def finished_after(self, after: Optional[HighWater] = None) -> np.ndarray:
+        """Lezárt meccsek pozíciói időrendben, opcionálisan csak a (start_time, id) > after utániak."""
+        m = self.finished_mask()
+        if after is not None:
+            m &= ~self._upto_mask(after)
+        return np.flatnonzero(m)
+
+    def fingerprint(self, upto: Optional[HighWater] = None) -> Tuple[int, int, str]:
+        """
+        Lenyomat a lezárt meccs-halmazról: (darabszám, max id, eredmény-checksum).
+        upto: csak a (start_time, id) <= upto meccsek számítanak.
+        A checksum SUM(id * (1009*home + away + 1)), így bármely eredmény-javítás,
+        új/törölt vagy státuszt váltó meccs megváltoztatja.
+        """
+        m = self.finished_mask()
+        if upto is not None:
+            m &= self._upto_mask(upto)
+        ids = self.match_id[m]
+        weights = self.home_score[m].astype(np.int64) * 1009 + self.away_score[m] + 1
+        checksum = sum((ids * weights).tolist())   # Python int: nincs int64 túlcsordulás az összegben
+        return len(ids), int(ids.max()) if len(ids) else 0, str(checksum)
+
+    def finished_arrays(self, pos: Optional[np.ndarray] = None
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Lezárt meccsek a Poisson illesztéshez: (team_ids, home idx, away idx, hazai gól, vendég gól).
+        pos: csak ezek a (lezárt) sorok, pl. egy időpontig ismert eredmények (backtest).
+        """
+        if pos is None:
+            pos = np.flatnonzero(self.finished_mask())
+        n = len(pos)
+        used, idx = np.unique(np.concatenate([self.home[pos], self.away[pos]]), return_inverse=True)
+        return (self.team_ids[used], idx[:n], idx[n:],
+                self.home_score[pos].astype(float), self.away_score[pos].astype(float))
+
+    def scheduled(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Scheduled meccsek (start_time szerint): (match_id, home team id, away team id)."""
+        pos = np.flatnonzero(self.status_mask("scheduled"))
+        return self.match_id[pos], self.team_ids[self.home[pos]], self.team_ids[self.away[pos]]
+
+# csak egész oszlopok (start_time: epoch µs, status: STATUSES index, hiányzó gól: NO_SCORE)
+# -> egy chunk egyetlen np.array hívással alakul át, nincs soronkénti Python konverzió
+_SQL_HISTORY = text(f"""
+SELECT league_id, id,
+       (extract(epoch FROM start_time) * 1000000)::bigint AS start_us,
+       home_team_id, away_team_id,
+       CASE status {" ".join(f"WHEN '{st}' THEN {i}" for i, st in enumerate(STATUSES))}
+                   ELSE {len(STATUSES)} END AS status,
+       COALESCE(home_score, {NO_SCORE}), COALESCE(away_score, {NO_SCORE})
+FROM matches
+ORDER BY league_id, start_time, id
+""")
+
+# érvénytelenítés: legutolsó lezárt meccs + darabszámok + eredmény-checksum (egy aggregáló scan)
+_SQL_HISTORY_KEY = text("""
+SELECT count(*), COALESCE(max(id), 0),
+       count(*) FILTER (WHERE status = 'scheduled'),
+       count(*) FILTER (WHERE status = 'finished'),
+       COALESCE(sum(id::bigint * (home_score * 1009 + away_score + 1))
+                FILTER (WHERE status = 'finished'), 0),
+       (SELECT id FROM matches WHERE status = 'finished'
+        ORDER BY start_time DESC, id DESC LIMIT 1)
+FROM matches
+""")
+
+def _split_leagues(cols: Dict[str, np.ndarray]) -> Dict[int, LeagueHistory]:
+    out: Dict[int, LeagueHistory] = {}
+    lg = cols["league_id"]
+    bounds = np.flatnonzero(np.diff(lg)) + 1
+    for lo, hi in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(lg)]])):
+        if lo == hi:
+            continue
+        home, away = cols["home"][lo:hi], cols["away"][lo:hi]
+        team_ids, idx = np.unique(np.concatenate([home, away]), return_inverse=True)
+        n = hi - lo
+        out[int(lg[lo])] = LeagueHistory(
+            int(lg[lo]), team_ids, cols["id"][lo:hi], cols["start_time"][lo:hi],
+            idx[:n].astype(np.int32), idx[n:].astype(np.int32),
+            cols["home_score"][lo:hi], cols["away_score"][lo:hi], cols["status"][lo:hi],
+        )
+    return out
+
+def stream_array(db: Session, stmt, params: Optional[dict] = None, dtype=np.int64) -> np.ndarray:
+    """
+    Csak számokat adó lekérdezés -> (N, oszlopok) tömb; server-side cursor, LOAD_CHUNK soronként,
+    chunkonként egyetlen np.fromiter (nincs soronkénti Python konverzió, nincs teljes sorlista).
+    Külön kapcsolaton fut, hogy a stream_results (named cursor) ne ragadjon a session kapcsolatán.
+    """
+    chunks = []
+    with db.get_bind().connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=LOAD_CHUNK).execute(
+            stmt, params or {})
+        width = len(result.keys())
+        for rows in result.partitions(LOAD_CHUNK):
+            flat = itertools.chain.from_iterable(rows)
+            chunks.append(np.fromiter(flat, dtype=dtype, count=len(rows) * width).reshape(-1, width))
+        if not chunks:
+            return np.empty((0, width), dtype=dtype)
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+def load_history(db: Session) -> Dict[int, LeagueHistory]:
+    """Minden liga egyetlen, oszlopokra szűkített lekérdezéssel (stream_array)."""
+    a = stream_array(db, _SQL_HISTORY)
+    if not len(a):
+        return {}
+    return _split_leagues({
+        "league_id": a[:, 0], "id": a[:, 1].copy(),
+        "start_time": a[:, 2].astype("datetime64[us]"),
+        "home": a[:, 3], "away": a[:, 4],
+        "status": a[:, 5].astype(np.int8),
+        "home_score": a[:, 6].astype(np.int16), "away_score": a[:, 7].astype(np.int16),
+    })
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, tuple] = {}   # engine url -> (kulcs, {league_id: LeagueHistory})
+
+def get_history(db: Session) -> Dict[int, LeagueHistory]:
+    """
+    Az aktuális történet, processzen belül cache-elve (egy pipeline futás modelljei közösen használják).
+    Újratölt, ha a kulcs (legutolsó lezárt meccs, darabszámok, eredmény-checksum) változott.
+    A kulcs egy aggregáló scan -> futásonként egyszer hívandó, a ligák a visszaadott dict-ből jönnek.
+    """
+    key = tuple(db.execute(_SQL_HISTORY_KEY).one())
+    url = str(db.get_bind().url)
+    with _cache_lock:
+        hit = _cache.get(url)
+        if hit is not None and hit[0] == key:
+            return hit[1]
+        data = load_history(db)
+        _cache[url] = (key, data)
+        return data
+
+def league_history(db: Session, league_id: int,
+                   hist: Optional[Dict[int, LeagueHistory]] = None) -> LeagueHistory:
+    """Egy liga története; hist: a futás elején egyszer betöltött get_history() (nincs újabb kulcs-scan)."""
+    hist = hist if hist is not None else get_history(db)
+    return hist.get(league_id) or LeagueHistory.empty(league_id)
+
+def map_leagues(fn: Callable[[T], R], tasks: Sequence[T], workers: int = MODEL_WORKERS) -> List[R]:
+    """
+    fn(task) ligánként; workers > 1 -> ProcessPoolExecutor. fn és task legyen picklelhető
+    (modul-szintű függvény, numpy tömbök / dataclass), DB-t nem érhet el.
+    Az eredmény a tasks sorrendjében jön vissza, így a kimenet nem függ a workerek számától.
+    spawn: a pipeline szálai közben futnak (zárak, pool-kapcsolatok) -> fork helyett tiszta processz.
+    """
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        return [fn(t) for t in tasks]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        return list(pool.map(fn, tasks))
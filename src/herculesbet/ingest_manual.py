@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 from .db import SessionLocal
 from .models import League, Team, Match, Bookmaker, OddsSnapshot
+from .etl.store import upsert_odds_latest
 
 def get_or_create_league(db: Session, name: str, country="HU", sport="football") -> League:
     obj = db.execute(select(League).where(League.name == name)).scalar_one_or_none()
@@ -37,10 +38,12 @@ def add_match(db: Session, league_name: str, home: str, away: str, start_iso: st
 
 def add_odds_snapshot_1x2(db: Session, match_id: int, bookmaker: str, oh: float, od: float, oa: float):
     bk = get_or_create_bookmaker(db, bookmaker)
+    now = datetime.utcnow()
     for sel, o in (("H", oh), ("D", od), ("A", oa)):
         snap = OddsSnapshot(match_id=match_id, bookmaker_id=bk.id,
-                            market="1X2", selection=sel, odds=o)
+                            market="1X2", selection=sel, odds=o, captured_at=now)
         db.add(snap)
+        upsert_odds_latest(db, match_id, bk.id, "1X2", sel, o, now)
     db.commit()
 
 def main():
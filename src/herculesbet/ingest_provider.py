@@ -1,34 +1,90 @@
+import time
 from sqlalchemy.orm import Session
 from datetime import datetime
-from .db import SessionLocal
-from .etl.store import upsert_fixture, insert_odds_snapshot
-from .providers.localjson import load_from_file
+from .db import SessionLocal, engine
+from .etl.store import DimensionCache, bulk_ingest, bulk_ingest_batch, drop_ext_match_ids
+from .metrics import cli, staged
+from .partitions import ensure_partitions_for_ingest
+from .providers.base import Fixture
+from .providers.localjson import load_from_file, iter_feed
 
+STREAM_BATCH_ROWS = 20000   # fixture + quote / micro-batch (egy tranzakció)
+
+@staged("ingest")
 def ingest_localjson(path: str):
     fixtures, quotes = load_from_file(path)
     db: Session = SessionLocal()
     try:
-        # 1) fixture-k upsert
-        id_map = {}  # ext_match_id -> match_id
-        for fx in fixtures:
-            m = upsert_fixture(db, fx)
-            id_map[fx.ext_match_id] = m.id
-        # 2) odds snapshotok
-        for q in quotes:
-            if q.ext_match_id in id_map:
-                insert_odds_snapshot(db, q, id_map[q.ext_match_id])
+        ensure_partitions_for_ingest(db.connection())
+        db.commit()
+        # fixture-k + odds snapshotok set-alapon (staging + merge)
+        bulk_ingest(db, fixtures, quotes)
         db.commit()
         print(f"✔ ingested fixtures={len(fixtures)}, odds={len(quotes)}")
     finally:
         db.close()
 
+@staged("ingest")
+def ingest_localjson_stream(path: str, batch_rows: int = STREAM_BATCH_ROWS, fmt: str = "auto",
+                            progress_every: int = 50):
+    """
+    Nagy feed (NDJSON / darabolt tömb) streaming ingestje: batch_rows soronként egy
+    bulk_ingest_batch + commit, így a memória a batch méretével arányos, nem a fájléval.
+    """
+    t0 = time.perf_counter()
+    n_rows = n_fx = n_odds = batches = 0
+    fixtures, quotes = [], []
+    with engine.connect() as conn:
+        db = Session(bind=conn)   # egy kapcsolat: a _ext_match_ids TEMP tábla commitok között is él
+        try:
+            ensure_partitions_for_ingest(db.connection())
+            db.commit()
+            drop_ext_match_ids(db)
+            dims = DimensionCache(db).preload()
+
+            def flush():
+                nonlocal n_fx, n_odds, batches
+                f, o = bulk_ingest_batch(db, fixtures, quotes, dims)
+                db.commit()
+                n_fx += f
+                n_odds += o
+                batches += 1
+                fixtures.clear()
+                quotes.clear()
+                if batches % progress_every == 0:
+                    secs = time.perf_counter() - t0
+                    print(f"… {n_rows} rows, {n_rows / secs:,.0f} rows/s", flush=True)
+
+            for rec in iter_feed(path, fmt):
+                (fixtures if isinstance(rec, Fixture) else quotes).append(rec)
+                n_rows += 1
+                if len(fixtures) + len(quotes) >= batch_rows:
+                    flush()
+            if fixtures or quotes:
+                flush()
+        finally:
+            try:
+                drop_ext_match_ids(db)   # a kapcsolat tiszta TEMP állapottal megy vissza a pool-ba
+            finally:
+                db.close()
+    secs = time.perf_counter() - t0
+    print(f"✔ streamed {n_rows} rows (fixtures={n_fx}, odds written={n_odds}) in {batches} batches, "
+          f"{secs:.1f}s, {n_rows / secs if secs else 0:,.0f} rows/s")
+
+@cli("ingest_provider")
 def main():
     import argparse
     ap = argparse.ArgumentParser()
     ap.add_argument("--file", required=True, help="JSON feed path (local)")
+    ap.add_argument("--stream", action="store_true",
+                    help="streaming mód (NDJSON vagy darabolt tömb), micro-batch ingest")
+    ap.add_argument("--batch-rows", type=int, default=STREAM_BATCH_ROWS)
+    ap.add_argument("--format", choices=["auto", "ndjson", "document"], default="auto")
     args = ap.parse_args()
-    ingest_localjson(args.file)
+    if args.stream:
+        ingest_localjson_stream(args.file, args.batch_rows, args.format)
+    else:
+        ingest_localjson(args.file)
 
 if __name__ == "__main__":
     main()
-
@@ -1,25 +1,48 @@
+import argparse
 from sqlalchemy.orm import Session
+from .config import ODDS_SPORT_KEYS, ODDS_MARKETS
 from .db import SessionLocal
-from .etl.store import upsert_fixture, insert_odds_snapshot
-from .providers.theoddsapi import fetch_fixtures_and_odds
+from .etl.store import bulk_ingest
+from .metrics import QUOTA_REMAINING, cli, staged
+from .partitions import ensure_partitions_for_ingest
+from .providers.theoddsapi import OddsApiClient
 
+def _csv(s: str):
+    return [x.strip() for x in s.split(",") if x.strip()]
+
+@staged("ingest")
+def ingest(db: Session, sports=None, markets=None):
+    """Lekérés + bulk ingest + commit; visszaad: (FetchResult, Quota, beírt odds sorok)."""
+    sports = sports or ODDS_SPORT_KEYS
+    with OddsApiClient() as client:
+        res = client.fetch_many(sports, markets or ODDS_MARKETS)
+    for sport, err in res.errors.items():
+        print(f"[WARN] {sport} skipped: {err}")
+    if client.quota.remaining is not None:
+        QUOTA_REMAINING.set(client.quota.remaining)
+    if res.errors and len(res.errors) == len(sports):
+        raise RuntimeError("every sport failed")
+    ensure_partitions_for_ingest(db.connection())
+    db.commit()
+    _, n_odds = bulk_ingest(db, res.fixtures, res.quotes)
+    db.commit()
+    return res, client.quota, n_odds
+
+@cli("ingest_theodds")
 def main():
-    fixtures, quotes = fetch_fixtures_and_odds()
+    ap = argparse.ArgumentParser(description="The Odds API ingest (több sport / piac párhuzamosan)")
+    ap.add_argument("--sports", type=_csv, default=ODDS_SPORT_KEYS, help="pl. soccer_epl,soccer_spain_la_liga")
+    ap.add_argument("--markets", type=_csv, default=ODDS_MARKETS, help="pl. h2h")
+    args = ap.parse_args()
+
     db: Session = SessionLocal()
     try:
-        id_map = {}
-        for fx in fixtures:
-            m = upsert_fixture(db, fx)
-            id_map[fx.ext_match_id] = m.id
-        for q in quotes:
-            mid = id_map.get(q.ext_match_id)
-            if mid:
-                insert_odds_snapshot(db, q, mid)
-        db.commit()
-        print(f"✔ the-odds-api ingested fixtures={len(fixtures)}, odds={len(quotes)}")
+        res, quota, _ = ingest(db, args.sports, args.markets)
+        print(f"✔ the-odds-api ingested sports={len(args.sports) - len(res.errors)}/{len(args.sports)} "
+              f"fixtures={len(res.fixtures)}, odds={len(res.quotes)} in {res.seconds:.2f}s "
+              f"(requests={quota.requests}, quota remaining={quota.remaining}, used={quota.used})")
     finally:
         db.close()
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,285 @@
+"""
+Processzen belüli metrika-regiszter Prometheus text formátumban (külső függőség nélkül).
+
+Stage-ek: `with stage("picks"):` méri a futásidőt és státuszt; a közben futó SQL utasítások
+(darab, idő) és pool checkoutok a stage címkéjét kapják (ContextVar -> szálanként / taskonként).
+Beágyazott stage a külsőhöz számol (pl. pipeline "ingest" stage -> ingest()).
+API: GET /metrics. Batch CLI-k: METRICS_FILE (textfile collector; "{job}" helyettesítve) és/vagy
+METRICS_PUSH_URL (Pushgateway, PUT /metrics/job/<job>) a futás végén.
+"""
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import event
+
+from .config import METRICS_FILE, METRICS_PUSH_URL, METRICS_PUSH_TIMEOUT
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# mp; a leggyorsabb stage-ektől a nagy ingestig
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return str(int(v)) if float(v).is_integer() and abs(v) < 1e15 else repr(float(v))
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._lock = lock
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {list(self.label_names)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def _samples(self) -> Iterator[str]:
+        for key, v in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.label_names, key)} {_fmt(v)}"
+
+    def render(self) -> List[str]:
+        head = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        return head + list(self._samples())
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        if value < 0:
+            raise ValueError("counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def dec(self, value: float = 1.0, **labels) -> None:
+        self.inc(-value, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels, lock, buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, doc, labels, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * len(self.buckets), 0.0, 0]   # bucketek, sum, count
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    st[0][i] += 1
+                    break
+            st[1] += value
+            st[2] += 1
+
+    def _samples(self) -> Iterator[str]:
+        for key, (counts, total, n) in sorted(self._values.items()):
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                le = _labels(self.label_names, key, f'le="{_fmt(b)}"')
+                yield f"{self.name}_bucket{le} {acc}"
+            le = _labels(self.label_names, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {n}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {_fmt(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {n}"
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get(self, cls, name: str, doc: str, labels: Sequence[str], **kw) -> _Metric:
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, doc, labels, self._lock, **kw)
+            elif not isinstance(m, cls) or m.label_names != tuple(labels):
+                raise ValueError(f"metric {name} already registered with another type / labels")
+            return m
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, doc, labels)
+
+    def gauge(self, name: str, doc: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, doc, labels)
+
+    def histogram(self, name: str, doc: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, doc, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus text exposition (0.0.4)."""
+        with self._lock:
+            lines = [line for m in self._metrics.values() for line in m.render()]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_RUNS = REGISTRY.counter("herculesbet_stage_runs_total", "Stage runs by status.", ("stage", "status"))
+STAGE_SECONDS = REGISTRY.histogram("herculesbet_stage_duration_seconds", "Stage wall time.", ("stage",))
+STAGE_LAST_SUCCESS = REGISTRY.gauge("herculesbet_stage_last_success_timestamp_seconds",
+                                    "Unix time of the last successful stage run.", ("stage",))
+ROWS = REGISTRY.counter("herculesbet_rows_total", "Rows processed by stage and kind.", ("stage", "kind"))
+SQL_STATEMENTS = REGISTRY.counter("herculesbet_sql_statements_total", "SQL statements executed.", ("stage",))
+SQL_SECONDS = REGISTRY.counter("herculesbet_sql_seconds_total", "Time spent in SQL statements.", ("stage",))
+POOL_CHECKOUTS = REGISTRY.counter("herculesbet_db_pool_checkouts_total", "Connection pool checkouts.",
+                                  ("engine", "stage"))
+POOL_CHECKED_OUT = REGISTRY.gauge("herculesbet_db_pool_checked_out", "Connections currently checked out.",
+                                  ("engine",))
+QUOTA_REMAINING = REGISTRY.gauge("herculesbet_odds_api_quota_remaining", "The Odds API requests remaining.")
+
+# -----------------------------
+# Stage kontextus
+# -----------------------------
+_stage: ContextVar[str] = ContextVar("herculesbet_stage", default="")
+_default_stage = "other"
+
+def set_default_stage(name: str) -> None:
+    """Stage-en kívüli SQL címkéje ebben a processzben (pl. az API-ban "api")."""
+    global _default_stage
+    _default_stage = name
+
+def current_stage() -> str:
+    return _stage.get() or _default_stage
+
+def record_stage(name: str, seconds: float, ok: bool) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    STAGE_RUNS.inc(stage=name, status="ok" if ok else "failed")
+    if ok:
+        STAGE_LAST_SUCCESS.set(time.time(), stage=name)
+
+@contextmanager
+def stage(name: str):
+    """Stage futásidő + státusz; a blokkon belüli SQL / sorok a stage-hez számolnak."""
+    if _stage.get():          # már egy stage-en belül: a külső méri
+        yield
+        return
+    token = _stage.set(name)
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        _stage.reset(token)
+        record_stage(name, time.perf_counter() - t0, ok)
+
+def staged(name: str):
+    """Dekorátor: a függvény egy stage (lásd stage())."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def add_rows(n: int, kind: str = "rows") -> None:
+    if n:
+        ROWS.inc(n, stage=current_stage(), kind=kind)
+
+# -----------------------------
+# SQLAlchemy engine: utasítások + pool
+# -----------------------------
+def instrument_engine(engine, name: str) -> None:
+    """SQL darab / idő a futó stage-re, pool checkout számláló + kint lévő kapcsolatok."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["metrics_t0"].pop()
+        st = current_stage()
+        SQL_STATEMENTS.inc(stage=st)
+        SQL_SECONDS.inc(time.perf_counter() - t0, stage=st)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        if ctx.connection is not None and ctx.connection.info.get("metrics_t0"):
+            ctx.connection.info["metrics_t0"].pop()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        POOL_CHECKOUTS.inc(engine=name, stage=current_stage())
+        POOL_CHECKED_OUT.inc(engine=name)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        POOL_CHECKED_OUT.dec(engine=name)
+
+# -----------------------------
+# Batch CLI-k: fájl / push
+# -----------------------------
+def write_file(path: str) -> None:
+    """Atomikus csere (a textfile collector sosem lát félkész fájlt)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+def push(url: str, job: str) -> None:
+    """Pushgateway: PUT <url>/metrics/job/<job> (a job korábbi metrikáit lecseréli)."""
+    import requests
+    resp = requests.put(f"{url.rstrip('/')}/metrics/job/{job}", data=REGISTRY.render().encode(),
+                        headers={"Content-Type": CONTENT_TYPE}, timeout=METRICS_PUSH_TIMEOUT)
+    resp.raise_for_status()
+
+def flush(job: str) -> None:
+    """METRICS_FILE / METRICS_PUSH_URL szerint; hiba csak WARN, a job eredményét nem rontja."""
+    if METRICS_FILE:
+        try:
+            write_file(METRICS_FILE.replace("{job}", job))
+        except OSError as e:
+            print(f"[WARN] metrics file not written: {e}")
+    if METRICS_PUSH_URL:
+        try:
+            push(METRICS_PUSH_URL, job)
+        except Exception as e:
+            print(f"[WARN] metrics push failed: {type(e).__name__}: {e}")
+
+@contextmanager
+def cli(job: str):
+    """Batch CLI main() köré (@cli("job") is): a futás végén, hiba esetén is, kiírja / pusholja a metrikákat."""
+    try:
+        yield
+    finally:
+        flush(job)
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, ForeignKey, Float, UniqueConstraint, JSON
+    Column, Integer, BigInteger, String, DateTime, ForeignKey, Float, UniqueConstraint, JSON, Index, text
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -11,6 +11,7 @@ class League(Base):
     name = Column(String, nullable=False)
     country = Column(String, nullable=True)
     sport = Column(String, nullable=False, default="football")
+    __table_args__ = (Index("uq_leagues_name", "name", unique=True),)
 
 class Team(Base):
     __tablename__ = "teams"
@@ -35,6 +36,11 @@ class Match(Base):
     home_team = relationship("Team", foreign_keys=[home_team_id])
     away_team = relationship("Team", foreign_keys=[away_team_id])
 
+    __table_args__ = (
+        Index("ix_matches_league_status_start", "league_id", "status", "start_time", "id"),
+        Index("ix_matches_fixture_key", "league_id", "home_team_id", "away_team_id", "start_time"),
+    )
+
 class Bookmaker(Base):
     __tablename__ = "bookmakers"
     id = Column(Integer, primary_key=True)
@@ -42,16 +48,54 @@ class Bookmaker(Base):
 
 class OddsSnapshot(Base):
     __tablename__ = "odds_snapshots"
-    id = Column(Integer, primary_key=True)
+    # captured_at szerint havi RANGE partíciók (partitions.py); a PK-nak tartalmaznia kell a kulcsot
+    id = Column(Integer, primary_key=True, autoincrement=True)
     match_id = Column(Integer, ForeignKey("matches.id"), nullable=False)
     bookmaker_id = Column(Integer, ForeignKey("bookmakers.id"), nullable=False)
     market = Column(String, nullable=False)      # pl. '1X2'
     selection = Column(String, nullable=False)   # 'H'|'D'|'A'
     odds = Column(Float, nullable=False)
-    captured_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    captured_at = Column(DateTime, default=datetime.utcnow, nullable=False, primary_key=True)
+    # change-only ingest: az azonos árú ismétlések csak ezt tolják ki (NULL = captured_at)
+    last_seen_at = Column(DateTime, nullable=True)
     __table_args__ = (
         UniqueConstraint('match_id','bookmaker_id','market','selection','captured_at',
                          name='uq_odds_point_in_time'),
+        Index("ix_odds_snapshots_seen", text("COALESCE(last_seen_at, captured_at)")),
+        {"postgresql_partition_by": "RANGE (captured_at)"},
+    )
+
+class OddsArchive(Base):
+    """Leválasztott odds partíciók tömör összesítője: havonta kulcsonként open/close/min/max."""
+    __tablename__ = "odds_archive"
+    match_id = Column(Integer, ForeignKey("matches.id"), primary_key=True)
+    bookmaker_id = Column(Integer, ForeignKey("bookmakers.id"), primary_key=True)
+    market = Column(String, primary_key=True)
+    selection = Column(String, primary_key=True)
+    month = Column(DateTime, primary_key=True)      # a partíció hónapjának első napja
+    open_odds = Column(Float, nullable=False)
+    close_odds = Column(Float, nullable=False)
+    min_odds = Column(Float, nullable=False)
+    max_odds = Column(Float, nullable=False)
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+    n_snapshots = Column(Integer, nullable=False)
+
+class OddsLatest(Base):
+    """Kulcsonként az utolsó ár (ingest tartja karban) – a best odds ebből számolódik."""
+    __tablename__ = "odds_latest"
+    match_id = Column(Integer, ForeignKey("matches.id"), primary_key=True)
+    bookmaker_id = Column(Integer, ForeignKey("bookmakers.id"), primary_key=True)
+    market = Column(String, primary_key=True)
+    selection = Column(String, primary_key=True)
+    odds = Column(Float, nullable=False)
+    captured_at = Column(DateTime, nullable=False)   # mióta ez az ár
+    seen_at = Column(DateTime, nullable=False)       # utolsó quote ideje
+    __table_args__ = (
+        Index("ix_odds_latest_seen", "seen_at"),
+        # best odds: (meccs, kimenetel) -> legjobb ár az index elején, LIMIT 1 rendezés nélkül
+        Index("ix_odds_latest_best", "match_id", "selection", text("odds DESC"),
+              text("seen_at DESC"), "bookmaker_id"),
     )
 
 class ModelRun(Base):
@@ -95,9 +139,74 @@ class EdgePick(Base):
     closing_odds = Column(Float, nullable=True)
     clv = Column(Float, nullable=True)
 
+    __table_args__ = (
+        # (meccs, piac, kimenetel) -> legfeljebb egy nyitott pick; a generate_picks upsert célpontja
+        Index("uq_edge_picks_open", "match_id", "market", "selection",
+              unique=True, postgresql_where=text("status = 'open'")),
+        # /picks: legfrissebb pickek ORDER BY created_at DESC LIMIT n -> index scan, nincs rendezés
+        Index("ix_edge_picks_created", "created_at", "id"),
+        # /picks?status=... keyset lapozás
+        Index("ix_edge_picks_status_created", "status", "created_at", "id"),
+    )
+
+class PickQueue(Base):
+    """Dirty-match sor: meccsek, amiknek az inputja (odds / modell-valószínűség) változott."""
+    __tablename__ = "pick_queue"
+    match_id = Column(Integer, ForeignKey("matches.id"), primary_key=True)
+    queued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class PickStats(Base):
+    """/stats/summary gyorsítótár: egyetlen sor (id=1). A settlement és a generate_picks csak a
+    version-t lépteti; az API olvasáskor számol újra, ha computed_version lemaradt."""
+    __tablename__ = "pick_stats"
+    id = Column(Integer, primary_key=True)
+    picks_total = Column(Integer, nullable=False, default=0)
+    picks_settled = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    profit_sum_units = Column(Float, nullable=False, default=0.0)
+    avg_edge = Column(Float, nullable=True)
+    avg_clv = Column(Float, nullable=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    computed_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 class BankrollLog(Base):
     __tablename__ = "bankroll_log"
     id = Column(Integer, primary_key=True)
     at = Column(DateTime, default=datetime.utcnow, nullable=False)
     bankroll = Column(Float, nullable=False)
 
+
+class EloRatingState(Base):
+    """Ligánként perzisztált ELO állapot + high-water mark az inkrementális futáshoz."""
+    __tablename__ = "elo_states"
+    league_id = Column(Integer, ForeignKey("leagues.id"), primary_key=True)
+    ratings = Column(JSON, nullable=False, default=dict)   # {team_id: elo}
+    draws = Column(Integer, nullable=False, default=0)
+    games = Column(Integer, nullable=False, default=0)
+    last_start_time = Column(DateTime, nullable=True)       # utolsó feldolgozott meccs (start_time, id)
+    last_match_id = Column(Integer, nullable=True)
+    checksum = Column(String, nullable=True)                # LeagueHistory.fingerprint checksum a HWM-ig
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class PipelineRun(Base):
+    """run_pipeline egy futása (in-process DAG vagy subprocess mód)."""
+    __tablename__ = "pipeline_runs"
+    id = Column(Integer, primary_key=True)
+    mode = Column(String, nullable=False)                 # inprocess|subprocess
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    status = Column(String, nullable=False, default="running")   # running|ok|failed
+    seconds = Column(Float, nullable=True)
+
+class PipelineStage(Base):
+    """Stage-enkénti falióra-idő és sorszám egy pipeline futásban."""
+    __tablename__ = "pipeline_stages"
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("pipeline_runs.id"), nullable=False, index=True)
+    stage = Column(String, nullable=False)
+    status = Column(String, nullable=False)               # ok|failed|skipped
+    started_at = Column(DateTime, nullable=True)
+    seconds = Column(Float, nullable=True)
+    rows = Column(Integer, nullable=True)                 # stage-specifikus (odds sor, valószínűség, pick...)
+    error = Column(String, nullable=True)
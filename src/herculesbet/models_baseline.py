@@ -3,21 +3,25 @@ Egyszerű baseline: minden scheduled meccsre fix 1X2 valószínűségeket ír.
 Később DC/Poisson/ELO váltja.
 """
 from sqlalchemy.orm import Session
-from .models import Match, ModelRun, Probability
+from .models import ModelRun
+from .etl.store import bulk_insert_probabilities, record_write_stats
+from .history import get_history
+from .metrics import add_rows, staged
 
 P = {"H": 0.45, "D": 0.27, "A": 0.28}  # home-advantage íz
 
+@staged("model_baseline")
 def run(db: Session, model_name="baseline", version="0.1"):
     mr = ModelRun(model_name=model_name, version=version)
     db.add(mr); db.commit(); db.refresh(mr)
-    count = 0
-    for m in db.query(Match).filter_by(status="scheduled").all():
-        for sel, p in P.items():
-            db.add(Probability(
-                model_run_id=mr.id, match_id=m.id, market="1X2",
-                selection=sel, prob=p, fair_odds=round(1.0 / max(p, 1e-9), 4)
-            ))
-        count += 1
+    match_ids = [mid for h in get_history(db).values() for mid in h.scheduled()[0].tolist()]
+    rows = (
+        (mid, sel, p, round(1.0 / max(p, 1e-9), 4))
+        for mid in match_ids
+        for sel, p in P.items()
+    )
+    n_rows, secs = bulk_insert_probabilities(db, mr.id, rows)
+    record_write_stats(mr, n_rows, secs)
     db.commit()
-    return mr.id, count
-
+    add_rows(len(match_ids), "matches")
+    return mr.id, len(match_ids)
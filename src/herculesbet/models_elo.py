@@ -1,12 +1,17 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from .models import Match, Team, League, ModelRun, Probability
+from .models import League, ModelRun, EloRatingState
+from .config import MODEL_WORKERS
+from .history import HighWater, LeagueHistory, get_history, league_history, map_leagues
+from .etl.store import bulk_insert_probabilities, record_write_stats
+from .metrics import add_rows, staged
 
 # --- Paraméterek ---
+MODEL_NAME = "elo_v0_1"
 K_DEFAULT = 20.0       # ELO frissítés erőssége
 HFA_PTS   = 60.0       # hazai pálya előny pontban (liga-függő lehet, MVP-re fix)
 ELO_INIT  = 1500.0     # kezdő rating
@@ -21,6 +26,8 @@ class EloState:
     ratings: Dict[int, float] = field(default_factory=dict)   # team_id -> elo
     draws: int = 0
     games: int = 0
+    last: Optional[HighWater] = None   # utolsó feldolgozott meccs (start_time, id)
+    checksum: int = 0                  # LeagueHistory.fingerprint checksum a last-ig
 
     def rating(self, team_id: int) -> float:
         return self.ratings.get(team_id, ELO_INIT)
@@ -55,24 +62,89 @@ class EloState:
         if result == "D":
             self.draws += 1
 
-def learn_elo_for_league(db: Session, league_id: int) -> EloState:
-    """Végigmegy a lezárt meccseken időrendben és tanulja az ELO-t."""
-    st = EloState()
-    q = (
-        db.query(Match)
-        .filter(Match.league_id == league_id, Match.status == "finished")
-        .order_by(Match.start_time.asc())
-    )
-    for m in q.all():
-        if m.home_score is None or m.away_score is None:
-            continue
-        if m.home_score > m.away_score:
+def _finished_after(h: LeagueHistory, after: Optional[HighWater] = None) -> Tuple[np.ndarray, Optional[HighWater]]:
+    """
+    Lezárt meccsek időrendben, az after utániak: (N, 5) [id, home_id, away_id, home_score, away_score]
+    és az utolsó (start_time, id), ha van ilyen meccs.
+    """
+    pos = h.finished_after(after)
+    cols = np.column_stack([h.match_id[pos], h.team_ids[h.home[pos]], h.team_ids[h.away[pos]],
+                            h.home_score[pos], h.away_score[pos]]).astype(np.int64)
+    last = (h.start_time[pos[-1]].item(), int(h.match_id[pos[-1]])) if len(pos) else None
+    return cols, last
+
+def apply_results(st: EloState, mids, home_ids, away_ids, hs, as_) -> EloState:
+    """Eredmények alkalmazása sorban (időrend); a checksum a LeagueHistory.fingerprint-é."""
+    for mid, home_id, away_id, h, a in zip(mids, home_ids, away_ids, hs, as_):
+        if h > a:
             res = "H"
-        elif m.home_score < m.away_score:
+        elif h < a:
             res = "A"
         else:
             res = "D"
-        st.update(m.home_team_id, m.away_team_id, res)
+        st.update(home_id, away_id, res)
+        st.checksum += mid * (h * 1009 + a + 1)
+    return st
+
+def learn_elo_for_league(db: Session, league_id: int, state: Optional[EloState] = None,
+                         after: Optional[HighWater] = None,
+                         hist: Optional[Dict[int, LeagueHistory]] = None) -> EloState:
+    """
+    Végigmegy a lezárt meccseken időrendben és tanulja az ELO-t.
+    state/after: meglévő állapotot folytat, csak az (start_time, id) > after meccsekkel.
+    hist: előre betöltött get_history() (lásd league_history).
+    """
+    st = state if state is not None else EloState()
+    cols, last = _finished_after(league_history(db, league_id, hist), after)
+    if last is not None:
+        apply_results(st, *(cols[:, k].tolist() for k in range(5)))
+        st.last = last
+    return st
+
+def _state_from_row(row: EloRatingState) -> EloState:
+    return EloState(
+        ratings={int(k): float(v) for k, v in (row.ratings or {}).items()},
+        draws=row.draws, games=row.games,
+        last=(row.last_start_time, row.last_match_id),
+        checksum=int(row.checksum or 0),
+    )
+
+def _stored_state(db: Session, h: LeagueHistory) -> Optional[EloState]:
+    """A perzisztált állapot, ha a HWM-ig tartó lezárt halmaz lenyomata változatlan; különben None."""
+    row = db.get(EloRatingState, h.league_id)
+    if row is not None and row.last_match_id is not None:
+        cnt, _, checksum = h.fingerprint(upto=(row.last_start_time, row.last_match_id))
+        if cnt == row.games and checksum == row.checksum:
+            return _state_from_row(row)
+    return None
+
+def save_state(db: Session, league_id: int, st: EloState) -> None:
+    """Állapot az elo_states táblába; commit a hívó dolga."""
+    row = db.get(EloRatingState, league_id)
+    if row is None:
+        row = EloRatingState(league_id=league_id)
+        db.add(row)
+    row.ratings = {str(k): v for k, v in st.ratings.items()}
+    row.draws = st.draws
+    row.games = st.games
+    row.last_start_time, row.last_match_id = st.last if st.last else (None, None)
+    row.checksum = str(st.checksum)
+    row.updated_at = datetime.utcnow()
+
+def update_elo_for_league(db: Session, league_id: int,
+                          hist: Optional[Dict[int, LeagueHistory]] = None) -> EloState:
+    """
+    Inkrementális ELO: a perzisztált állapotból csak a high-water mark utáni meccseket alkalmazza.
+    Ha a HWM-ig tartó lezárt halmaz lenyomata eltér (korábbi eredmény be/javítva), teljes újratanulás.
+    Az állapotot az elo_states táblába írja; commit a hívó dolga.
+    """
+    hist = hist if hist is not None else get_history(db)
+    st = _stored_state(db, league_history(db, league_id, hist))
+    if st is None:
+        st = learn_elo_for_league(db, league_id, hist=hist)
+    else:
+        st = learn_elo_for_league(db, league_id, state=st, after=st.last, hist=hist)
+    save_state(db, league_id, st)
     return st
 
 def league_draw_rate(state: EloState) -> float:
@@ -80,48 +152,79 @@ def league_draw_rate(state: EloState) -> float:
         return state.draws / state.games
     return FALLBACK_DRAW_RATE
 
-def schedule_probs_for_league(db: Session, league_id: int, state: EloState) -> Tuple[int, int]:
-    """Kiírja a valószínűségeket a 'scheduled' meccsekre a ligában."""
-    mr = ModelRun(model_name="elo_v0_1", version="0.1")
-    db.add(mr); db.commit(); db.refresh(mr)
-
+def probs_for_pairs(state: EloState, home_ids, away_ids) -> np.ndarray:
+    """(N, 3) [pH, pD, pA] a csapat-id párokra; a döntetlen a liga döntetlen-arányából."""
     pD = league_draw_rate(state)
-    n_matches = 0
-    q = (
-        db.query(Match)
-        .filter(Match.league_id == league_id, Match.status == "scheduled")
-        .order_by(Match.start_time.asc())
-    )
-    for m in q.all():
-        rh = state.rating(m.home_team_id)
-        ra = state.rating(m.away_team_id)
+    out = np.empty((len(home_ids), 3))
+    for i, (home_id, away_id) in enumerate(zip(home_ids, away_ids)):
+        rh = state.rating(home_id)
+        ra = state.rating(away_id)
         pH_star = logistic_winprob((rh + HFA_PTS) - ra)
         # elosztjuk a maradékot a két kimenetel között
         pH = (1.0 - pD) * pH_star
         pA = (1.0 - pD) * (1.0 - pH_star)
         # normalizáció végett (numerikai biztonság)
         s = pH + pD + pA
-        pH, pD_n, pA = pH/s, pD/s, pA/s
+        out[i] = (pH/s, pD/s, pA/s)
+    return out
 
-        for sel, p in (("H", pH), ("D", pD_n), ("A", pA)):
-            db.add(Probability(
-                model_run_id=mr.id, match_id=m.id, market="1X2",
-                selection=sel, prob=float(p), fair_odds=round(1.0/max(p,1e-9), 4)
-            ))
-        n_matches += 1
+def _prob_rows(match_ids, probs):
+    for mid, row in zip(match_ids, probs.tolist()):
+        for sel, p in zip(("H", "D", "A"), row):
+            yield (mid, sel, float(p), round(1.0/max(p,1e-9), 4))
 
-    db.commit()
-    return mr.id, n_matches
-
-def run_elo(db: Session) -> Tuple[int, int]:
-    """Tanul minden ligára, majd kiírja a scheduled meccsekre a probabilityt."""
-    leagues = db.query(League).all()
-    total_matches = 0
-    last_run_id = None
-    for lg in leagues:
-        st = learn_elo_for_league(db, lg.id)
-        run_id, n = schedule_probs_for_league(db, lg.id, st)
-        total_matches += n
-        last_run_id = run_id
-    return (last_run_id or 0), total_matches
+@dataclass
+class LeagueTask:
+    """Egy liga ELO frissítéséhez és pontozásához kellő adat, DB nélkül (processzek között picklelhető)."""
+    league_id: int
+    state: EloState                     # folytatandó állapot (vagy üres, teljes újratanuláshoz)
+    finished: np.ndarray                # (N, 5) [id, home_id, away_id, home_score, away_score] időrendben
+    last: Optional[HighWater]           # az utolsó betöltött lezárt meccs (start_time, id)
+    sched: np.ndarray                   # (M, 3) [id, home_id, away_id]
 
+@dataclass
+class LeagueResult:
+    league_id: int
+    state: EloState
+    match_ids: List[int]
+    probs: np.ndarray                   # (M, 3)
+
+def prepare_league(db: Session, league_id: int,
+                   hist: Optional[Dict[int, LeagueHistory]] = None) -> LeagueTask:
+    """Perzisztált állapot (ha érvényes) + a HWM utáni lezárt meccsek + scheduled meccsek, a LeagueHistory-ból."""
+    h = league_history(db, league_id, hist)
+    st = _stored_state(db, h)
+    finished, last = _finished_after(h, st.last if st is not None else None)
+    st = st if st is not None else EloState()
+    sched = np.column_stack(h.scheduled()).astype(np.int64).reshape(-1, 3)
+    return LeagueTask(league_id, st, finished, last or st.last, sched)
+
+def score_league(task: LeagueTask) -> LeagueResult:
+    """ELO frissítés + 1X2 valószínűségek (worker processzben is futhat)."""
+    st = apply_results(task.state, *(task.finished[:, k].tolist() for k in range(5)))
+    st.last = task.last
+    probs = probs_for_pairs(st, task.sched[:, 1].tolist(), task.sched[:, 2].tolist())
+    return LeagueResult(task.league_id, st, task.sched[:, 0].tolist(), probs)
+
+@staged("model_elo")
+def run_elo(db: Session, workers: int = MODEL_WORKERS) -> Tuple[int, int]:
+    """
+    Tanul minden ligára, majd kiírja a scheduled meccsekre a probabilityt.
+    Ligánként tömbök a DB-ből, frissítés + pontozás ligánként (workers > 1: ProcessPoolExecutor),
+    az állapotok és a valószínűségek liga-sorrendben, egyetlen ModelRun alá íródnak.
+    """
+    league_ids = [lid for (lid,) in db.query(League.id).order_by(League.id).all()]
+    hist = get_history(db)
+    tasks = [prepare_league(db, lid, hist) for lid in league_ids]
+    results = map_leagues(score_league, tasks, workers)
+
+    mr = ModelRun(model_name=MODEL_NAME, version="0.1")
+    db.add(mr); db.flush()
+    for res in results:
+        save_state(db, res.league_id, res.state)
+    n_rows, secs = bulk_insert_probabilities(
+        db, mr.id, (row for res in results for row in _prob_rows(res.match_ids, res.probs)))
+    record_write_stats(mr, n_rows, secs)
+    db.commit()
+    add_rows(n_rows // 3, "matches")
+    return mr.id, n_rows // 3
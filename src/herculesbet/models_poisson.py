@@ -1,20 +1,25 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from math import exp
 import numpy as np
 import math
 
-from .models import Match, Team, League, ModelRun, Probability
-from .config import RHO
+from .models import League, ModelRun
+from .config import RHO, MODEL_WORKERS
+from .metrics import add_rows, staged
+from .etl.store import bulk_insert_probabilities, record_write_stats
+from .history import LeagueHistory, get_history, league_history, map_leagues
 
 # Hyperparaméterek (MVP)
 MAX_GOALS = 10         # konvolúciós rács 0..MAX_GOALS
 HFA_MULT = 1.10        # hazai gólvárható „szorzó”
 REG = 1e-3             # kicsi regularizáció, hogy ne szálljanak el a szorzók
-ITERS = 15             # tám/ved skálázás iterációk száma
+ITERS = 15             # tám/ved skálázás iterációk felső korlátja
+TOL = 1e-6             # konvergencia: max. relatív szorzó-változás egy iterációban
+
+MODEL_NAME = "poisson_v0_1"
 
 @dataclass
 class Rates:
@@ -23,125 +28,272 @@ class Rates:
     base_home: float = 1.3
     base_away: float = 1.1
 
-def _collect_finished(db: Session, league_id: int):
-    q = (
-        db.query(Match)
-        .filter(Match.league_id == league_id, Match.status == "finished")
-        .all()
-    )
-    return q
-
-def _init_rates(team_ids):
-    r = Rates()
-    for tid in team_ids:
-        r.att[tid] = 1.0
-        r.deff[tid] = 1.0
-    return r
-
-def fit_attack_defence(db: Session, league_id: int) -> Rates:
-    """Egyszerű iteratív skálázás: goals ~ Pois( base * att_home * def_away )."""
-    matches = _collect_finished(db, league_id)
-    if not matches:
-        # fallback paraméterek
-        return Rates()
+def fit_rates(team_ids, hi, ai, hs, as_, init: Rates | None = None,
+              tol: float = TOL, max_iters: int = ITERS) -> Rates:
+    """
+    Vektorizált tám/véd skálázás index-tömbökön (np.bincount).
 
-    # csapat lista
-    team_ids = set()
-    for m in matches:
-        team_ids.add(m.home_team_id)
-        team_ids.add(m.away_team_id)
-    rates = _init_rates(team_ids)
+    team_ids: csapat-id-k (index -> id); hi/ai: hazai/vendég index meccsenként;
+    hs/as_: gólok (NaN = hiányzó eredmény, a nevezőbe beszámít, a számlálóba nem).
+    init: kezdő szorzók (warm start), hiányzó csapatra 1.0.
+    Megáll, ha egy iterációban minden szorzó relatív változása < tol, legfeljebb max_iters kör.
+    Tűrés: ugyanazon iterációszámnál a (javított védekezés-lépésű) dict-es ciklussal 1e-9
+    relatív pontosságon belül egyezik (csak az összegzési sorrend más); konvergált állapotban
+    a fixponttól legfeljebb ~tol relatívan tér el.
+    """
+    rates = Rates()
+    n_teams = len(team_ids)
+    if n_teams == 0:
+        return rates
 
+    hmask = ~np.isnan(hs)
+    amask = ~np.isnan(as_)
     # baseline gólátlagok liga-szinten
-    hg = [m.home_score for m in matches if m.home_score is not None]
-    ag = [m.away_score for m in matches if m.away_score is not None]
-    rates.base_home = max(np.mean(hg), 0.6)
-    rates.base_away = max(np.mean(ag), 0.6)
+    rates.base_home = float(max(hs[hmask].mean(), 0.6)) if hmask.any() else rates.base_home
+    rates.base_away = float(max(as_[amask].mean(), 0.6)) if amask.any() else rates.base_away
+    hg = np.where(hmask, hs, 0.0)
+    ag = np.where(amask, as_, 0.0)
+
+    att = np.ones(n_teams)
+    deff = np.ones(n_teams)
+    if init is not None:
+        att = np.array([init.att.get(int(t), 1.0) for t in team_ids], dtype=float)
+        deff = np.array([init.deff.get(int(t), 1.0) for t in team_ids], dtype=float)
 
-    # iteratív skálázás
-    for _ in range(ITERS):
+    # a számlálók nem függnek a szorzóktól: gólok szerzett/kapott csapatonként
+    goals_for = REG + np.bincount(hi, hg, n_teams) + np.bincount(ai, ag, n_teams)
+    goals_against = REG + np.bincount(ai, hg, n_teams) + np.bincount(hi, ag, n_teams)
+    bh = rates.base_home * HFA_MULT
+    ba = rates.base_away
+
+    for _ in range(max_iters):
         # update attack
-        num = {tid: REG for tid in team_ids}
-        den = {tid: REG for tid in team_ids}
-        for m in matches:
-            lam_h = rates.base_home * rates.att[m.home_team_id] * rates.deff[m.away_team_id] * HFA_MULT
-            lam_a = rates.base_away * rates.att[m.away_team_id] * rates.deff[m.home_team_id]
-            # hozzájárulás
-            num[m.home_team_id] += m.home_score if m.home_score is not None else 0.0
-            den[m.home_team_id] += max(lam_h, 1e-6)
-            num[m.away_team_id] += m.away_score if m.away_score is not None else 0.0
-            den[m.away_team_id] += max(lam_a, 1e-6)
-        for tid in team_ids:
-            rates.att[tid] *= num[tid] / den[tid]
-
-        # update defence (gyengébb = nagyobb szám; ezért goals against-hoz skálázunk)
-        num = {tid: REG for tid in team_ids}
-        den = {tid: REG for tid in team_ids}
-        for m in matches:
-            lam_h = rates.base_home * rates.att[m.home_team_id] * rates.deff[m.away_team_id] * HFA_MULT
-            lam_a = rates.base_away * rates.att[m.away_team_id] * rates.deff[m.home_team_id]
-            num[m.away_team_id] += m.home_score if m.home_score is not None else 0.0
-            den[m.away_team_id] += max(rates.base_home * rates.att[m.home_team_id] * HFA_MULT, 1e-6)
-            num[m.home_team_id] += m.away_score if m.away_score is not None else 0.0
-            den[m.home_team_id] += max(rates.base_away * rates.att[m.away_team_id], 1e-6)
-        for tid in team_ids:
-            rates.deff[tid] *= num[tid] / den[tid]
+        lam_h = np.maximum(bh * att[hi] * deff[ai], 1e-6)
+        lam_a = np.maximum(ba * att[ai] * deff[hi], 1e-6)
+        den = REG + np.bincount(hi, lam_h, n_teams) + np.bincount(ai, lam_a, n_teams)
+        att_new = att * goals_for / den
+
+        # update defence (gyengébb = nagyobb szám; goals against-hoz skálázunk)
+        lam_h = np.maximum(bh * att_new[hi] * deff[ai], 1e-6)
+        lam_a = np.maximum(ba * att_new[ai] * deff[hi], 1e-6)
+        den = REG + np.bincount(ai, lam_h, n_teams) + np.bincount(hi, lam_a, n_teams)
+        deff_new = deff * goals_against / den
+
+        delta = max(np.max(np.abs(att_new / att - 1.0)), np.max(np.abs(deff_new / deff - 1.0)))
+        att, deff = att_new, deff_new
+        if delta < tol:
+            break
 
+    rates.att = {int(t): float(v) for t, v in zip(team_ids, att)}
+    rates.deff = {int(t): float(v) for t, v in zip(team_ids, deff)}
     return rates
 
-def poisson_prob_grid(lam_h: float, lam_a: float, max_goals=MAX_GOALS):
+def fit_attack_defence(db: Session, league_id: int, init: Rates | None = None,
+                       hist: Dict[int, LeagueHistory] | None = None) -> Rates:
+    """
+    Egyszerű iteratív skálázás: goals ~ Pois( base * att_home * def_away ). init: warm start.
+    hist: előre betöltött get_history() (több liga illesztésekor egyszer töltsd be).
+    """
+    h = league_history(db, league_id, hist)
+    if not h.finished_mask().any():
+        # fallback paraméterek
+        return Rates()
+    return fit_rates(*h.finished_arrays(), init=init)
+
+def rates_to_params(rates: Rates) -> dict:
+    return {
+        "att": {str(k): v for k, v in rates.att.items()},
+        "deff": {str(k): v for k, v in rates.deff.items()},
+        "base_home": rates.base_home,
+        "base_away": rates.base_away,
+    }
+
+def rates_from_params(d: dict) -> Rates:
+    return Rates(
+        att={int(k): float(v) for k, v in d.get("att", {}).items()},
+        deff={int(k): float(v) for k, v in d.get("deff", {}).items()},
+        base_home=float(d.get("base_home", 1.3)),
+        base_away=float(d.get("base_away", 1.1)),
+    )
+
+def _previous_league_params(db: Session) -> Dict[str, dict]:
+    """Az utolsó Poisson futás liga-állapota: {league_id: {"fingerprint": [...], "rates": {...}}}."""
+    prev = (
+        db.query(ModelRun.params)
+        .filter(ModelRun.model_name == MODEL_NAME, ModelRun.params.isnot(None))
+        .order_by(ModelRun.id.desc())
+        .first()
+    )
+    return ((prev[0] if prev else None) or {}).get("leagues", {})
+
+@dataclass
+class LeagueTask:
+    """Egy liga illesztéséhez és pontozásához kellő adat, DB nélkül (processzek között picklelhető)."""
+    league_id: int
+    fingerprint: list
+    prev: Optional[dict]               # előző futás: {"fingerprint": [...], "rates": {...}}
+    finished: Optional[tuple]          # LeagueHistory.finished_arrays(); None = változatlan (skip), () = nincs meccs
+    sched_ids: np.ndarray              # scheduled meccsek (start_time szerint)
+    sched_home: np.ndarray
+    sched_away: np.ndarray
+
+@dataclass
+class LeagueResult:
+    league_id: int
+    params: dict                       # {"fingerprint": [...], "rates": {...}} -> ModelRun.params
+    mode: str                          # skip|warm|cold
+    match_ids: np.ndarray
+    probs: np.ndarray                  # (N, 3) [pH, pD, pA]
+
+def prepare_league(db: Session, league_id: int, prev: dict | None,
+                   hist: Dict[int, LeagueHistory] | None = None) -> LeagueTask:
+    """Lenyomat + (csak ha változott) a lezárt meccsek tömbjei + scheduled meccsek, a LeagueHistory-ból."""
+    h = league_history(db, league_id, hist)
+    fp = list(h.fingerprint())
+    finished = None
+    if not (prev and prev.get("fingerprint") == fp):
+        finished = h.finished_arrays() if fp[0] else ()
+    sched_ids, sched_home, sched_away = h.scheduled()
+    return LeagueTask(league_id, fp, prev, finished, sched_ids, sched_home, sched_away)
+
+def fit_league(task: LeagueTask) -> Tuple[Rates, str]:
+    """
+    Változatlan lezárt halmaz -> előző Rates (nincs illesztés),
+    változott -> illesztés az előző Rates-ből indítva (warm start), nincs előző -> hideg illesztés.
+    """
+    prev = task.prev
+    if task.finished is None:
+        return rates_from_params(prev["rates"]), "skip"
+    init = rates_from_params(prev["rates"]) if prev and prev.get("rates") else None
+    rates = fit_rates(*task.finished, init=init) if task.finished else Rates()
+    return rates, ("warm" if init is not None else "cold")
+
+def score_league(task: LeagueTask) -> LeagueResult:
+    """Illesztés + 1X2 valószínűségek a liga scheduled meccseire (worker processzben is futhat)."""
+    rates, mode = fit_league(task)
+    probs = np.empty((0, 3))
+    if len(task.sched_ids):
+        lam_h, lam_a = _lambdas(rates, task.sched_home.tolist(), task.sched_away.tolist())
+        probs = probs_1x2_batch(lam_h, lam_a)
+    params = {"fingerprint": task.fingerprint, "rates": rates_to_params(rates)}
+    return LeagueResult(task.league_id, params, mode, task.sched_ids, probs)
+
+def fit_league_incremental(db: Session, league_id: int, prev: dict | None) -> Tuple[Rates, list, str]:
+    """Egy liga illesztése a fő processzben. Visszaad: (rates, fingerprint, "skip" | "warm" | "cold")."""
+    task = prepare_league(db, league_id, prev)
+    rates, mode = fit_league(task)
+    return rates, task.fingerprint, mode
+
+@lru_cache(maxsize=None)
+def _log_factorials(max_goals: int) -> np.ndarray:
+    """log(k!) k=0..max_goals-ra, egyszer számolva."""
+    out = np.array([math.lgamma(k + 1) for k in range(max_goals + 1)], dtype=float)
+    out.setflags(write=False)
+    return out
+
+def poisson_prob_grids(lam_h, lam_a, max_goals=MAX_GOALS) -> np.ndarray:
+    """(N, G, G) tenzor: [n, i, j] = P(H=i, A=j) az n. meccsre, levágás miatt normalizálva."""
+    lam_h = np.atleast_1d(np.asarray(lam_h, dtype=float))
+    lam_a = np.atleast_1d(np.asarray(lam_a, dtype=float))
     i = np.arange(0, max_goals + 1)
-    # P(X=i) = e^-λ λ^i / i!
-    factorials = np.array([math.factorial(k) for k in i], dtype=float)
-    ph = np.exp(-lam_h) * np.power(lam_h, i) / factorials
-    pa = np.exp(-lam_a) * np.power(lam_a, i) / factorials
-    mat = np.outer(ph, pa)  # P(H=i, A=j)
-    return mat / mat.sum()  # normalizáció a levágás miatt
+    log_fact = _log_factorials(max_goals)
+    # log P(X=i) = -λ + i*log λ - log i!
+    ph = np.exp(i * np.log(np.maximum(lam_h, 1e-300))[:, None] - lam_h[:, None] - log_fact)
+    pa = np.exp(i * np.log(np.maximum(lam_a, 1e-300))[:, None] - lam_a[:, None] - log_fact)
+    mat = ph[:, :, None] * pa[:, None, :]
+    mat /= mat.sum(axis=(1, 2), keepdims=True)
+    return mat
 
-def probs_1x2_from_lambdas(lam_h: float, lam_a: float):
-    mat = poisson_prob_grid(lam_h, lam_a, MAX_GOALS)
+def poisson_prob_grid(lam_h: float, lam_a: float, max_goals=MAX_GOALS):
+    return poisson_prob_grids(lam_h, lam_a, max_goals)[0]
+
+def dixon_coles_adjust_batch(mats: np.ndarray, lam_h, lam_a, rho: float) -> np.ndarray:
+    """dixon_coles_adjust (N, G, G) tenzorra, helyben (másolás nélkül)."""
+    lam_h = np.atleast_1d(np.asarray(lam_h, dtype=float))
+    lam_a = np.atleast_1d(np.asarray(lam_a, dtype=float))
+    tau = np.ones((mats.shape[0], 2, 2))
+    tau[:, 0, 0] = 1.0 - rho * lam_h * lam_a
+    tau[:, 1, 0] = 1.0 + rho * lam_h
+    tau[:, 0, 1] = 1.0 + rho * lam_a
+    tau[:, 1, 1] = 1.0 - rho
+    # biztonsági korlát: nehogy negatívba menjen
+    np.maximum(tau, 0.0000001, out=tau)
+    k = min(2, mats.shape[1])
+    l = min(2, mats.shape[2])
+    mats[:, :k, :l] *= tau[:, :k, :l]
+
+    # renormalizálás, hogy összeg=1
+    s = mats.sum(axis=(1, 2), keepdims=True)
+    np.divide(mats, s, out=mats, where=s > 0)
+    return mats
+
+def probs_1x2_batch(lam_h, lam_a, rho: float = RHO, max_goals=MAX_GOALS) -> np.ndarray:
+    """Sok meccs 1X2 valószínűségei egy hívással: (N,) λ-tömbök -> (N, 3) [pH, pD, pA]."""
+    mats = poisson_prob_grids(lam_h, lam_a, max_goals)
     # DC-korrekció
-    if RHO != 0.0:
-        mat = dixon_coles_adjust(mat, lam_h, lam_a, RHO)
-
-    # 1X2 összegezés
-    pH = np.tril(mat, -1).sum()
-    pD = np.trace(mat)
-    pA = np.triu(mat, 1).sum()
-    s = pH + pD + pA
-    return float(pH/s), float(pD/s), float(pA/s)
-
-def run_poisson(db: Session) -> Tuple[int, int]:
-    """Liga-szintű att/def becslés, majd scheduled meccsekre 1X2 valószínűségek."""
-    leagues = db.query(League).all()
-    mr = ModelRun(model_name="poisson_v0_1", version="0.1")
+    if rho != 0.0:
+        dixon_coles_adjust_batch(mats, lam_h, lam_a, rho)
+
+    # 1X2 összegezés (H: i>j alsó háromszög, D: átló, A: i<j felső háromszög)
+    g = mats.shape[1]
+    out = np.empty((mats.shape[0], 3))
+    out[:, 0] = (mats * np.tri(g, k=-1)).sum(axis=(1, 2))
+    out[:, 1] = np.trace(mats, axis1=1, axis2=2)
+    out[:, 2] = (mats * np.tri(g, k=-1).T).sum(axis=(1, 2))
+    out /= out.sum(axis=1, keepdims=True)
+    return out
+
+def probs_1x2_from_lambdas(lam_h: float, lam_a: float):
+    pH, pD, pA = probs_1x2_batch(lam_h, lam_a)[0]
+    return float(pH), float(pD), float(pA)
+
+def _lambdas(rates: Rates, home_ids, away_ids) -> Tuple[np.ndarray, np.ndarray]:
+    """Várható gólok tömbökben a csapat-id párokra (ismeretlen csapat: 1.0 szorzó)."""
+    n = len(home_ids)
+    att_h = np.fromiter((rates.att.get(t, 1.0) for t in home_ids), dtype=float, count=n)
+    att_a = np.fromiter((rates.att.get(t, 1.0) for t in away_ids), dtype=float, count=n)
+    def_h = np.fromiter((rates.deff.get(t, 1.0) for t in home_ids), dtype=float, count=n)
+    def_a = np.fromiter((rates.deff.get(t, 1.0) for t in away_ids), dtype=float, count=n)
+    lam_h = np.maximum(rates.base_home * att_h * def_a * HFA_MULT, 0.05)
+    lam_a = np.maximum(rates.base_away * att_a * def_h, 0.05)
+    return lam_h, lam_a
+
+@staged("model_poisson")
+def run_poisson(db: Session, workers: int = MODEL_WORKERS) -> Tuple[int, int]:
+    """
+    Liga-szintű att/def becslés, majd scheduled meccsekre 1X2 valószínűségek.
+    A ligák adatai tömbökként töltődnek be, az illesztés + pontozás ligánként fut
+    (workers > 1: ProcessPoolExecutor), az eredmény liga-sorrendben egy ModelRun alá íródik.
+    """
+    league_ids = [lid for (lid,) in db.query(League.id).order_by(League.id).all()]
+    prev_leagues = _previous_league_params(db)
+    mr = ModelRun(model_name=MODEL_NAME, version="0.1")
     db.add(mr); db.commit(); db.refresh(mr)
 
-    total = 0
-    for lg in leagues:
-        rates = fit_attack_defence(db, lg.id)
-        q = (
-            db.query(Match)
-            .filter(Match.league_id == lg.id, Match.status == "scheduled")
-            .order_by(Match.start_time.asc())
+    hist = get_history(db)
+    tasks = [prepare_league(db, lid, prev_leagues.get(str(lid)), hist) for lid in league_ids]
+    results = map_leagues(score_league, tasks, workers)
+
+    league_params, fit_modes = {}, {"skip": 0, "warm": 0, "cold": 0}
+    n_matches = 0
+    for res in results:
+        league_params[str(res.league_id)] = res.params
+        fit_modes[res.mode] += 1
+        n_matches += len(res.match_ids)
+
+    if n_matches:
+        rows = (
+            (mid, sel, p, round(1.0/max(p,1e-9), 4))
+            for res in results
+            for mid, row in zip(res.match_ids.tolist(), res.probs.tolist())
+            for sel, p in zip(("H", "D", "A"), row)
         )
-        for m in q.all():
-            att_h = rates.att.get(m.home_team_id, 1.0)
-            att_a = rates.att.get(m.away_team_id, 1.0)
-            def_h = rates.deff.get(m.home_team_id, 1.0)
-            def_a = rates.deff.get(m.away_team_id, 1.0)
-
-            lam_h = max(rates.base_home * att_h * def_a * HFA_MULT, 0.05)
-            lam_a = max(rates.base_away * att_a * def_h, 0.05)
-            pH, pD, pA = probs_1x2_from_lambdas(lam_h, lam_a)
-            for sel, p in (("H", pH), ("D", pD), ("A", pA)):
-                db.add(Probability(
-                    model_run_id=mr.id, match_id=m.id, market="1X2",
-                    selection=sel, prob=p, fair_odds=round(1.0/max(p,1e-9), 4)
-                ))
-            total += 1
+        n_rows, secs = bulk_insert_probabilities(db, mr.id, rows)
+        record_write_stats(mr, n_rows, secs)
+    mr.params = {**(mr.params or {}), "leagues": league_params, "fit": fit_modes}
     db.commit()
-    return mr.id, total
+    add_rows(n_matches, "matches")
+    return mr.id, n_matches
 
 def dixon_coles_adjust(mat: np.ndarray, lam_h: float, lam_a: float, rho: float) -> np.ndarray:
     """
@@ -0,0 +1,219 @@
+"""
+odds_snapshots havi RANGE partíciók karbantartása (captured_at szerint).
+
+    python -m herculesbet.partitions ensure            # partíciók a meglévő adatra + előre
+    python -m herculesbet.partitions maintain [--drop] # régi hónapok összesítése + leválasztása
+    python -m herculesbet.partitions migrate           # régi (nem particionált) tábla átalakítása
+"""
+from __future__ import annotations
+import re
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .db import engine
+from .config import ODDS_PARTITION_MONTHS_AHEAD, ODDS_RETENTION_MONTHS
+
+PARENT = "odds_snapshots"
+DEFAULT_PARTITION = f"{PARENT}_default"
+_NAME_RE = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+
+def month_start(d: date | datetime) -> date:
+    return date(d.year, d.month, 1)
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :t "
+        "AND pg_table_is_visible(c.oid))"), {"t": PARENT}).scalar())
+
+def list_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """A csatolt havi partíciók (név, hónap) időrendben; a default kimarad."""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :t AND pg_table_is_visible(p.oid)"), {"t": PARENT}).scalars()
+    out = []
+    for name in rows:
+        m = _NAME_RE.match(name)
+        if m:
+            out.append((name, date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(out, key=lambda x: x[1])
+
+def create_month(conn: Connection, month: date) -> bool:
+    """
+    Egy havi partíció létrehozása (ha még nincs). Ha a default partícióban már vannak
+    erre a hónapra eső sorok, azokat átteszi, különben a PG nem engedné a csatolást.
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": name}).scalar():
+        return False
+    lo, hi = month, add_months(month, 1)
+    params = {"lo": lo, "hi": hi}
+    has_default = conn.execute(
+        text("SELECT to_regclass(:n) IS NOT NULL"), {"n": DEFAULT_PARTITION}).scalar()
+    moved = False
+    if has_default and conn.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            "WHERE captured_at >= :lo AND captured_at < :hi)"), params).scalar():
+        conn.execute(text(
+            f"CREATE TEMP TABLE _odds_move ON COMMIT DROP AS SELECT * FROM {DEFAULT_PARTITION} "
+            "WHERE captured_at >= :lo AND captured_at < :hi"), params)
+        conn.execute(text(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE captured_at >= :lo AND captured_at < :hi"), params)
+        moved = True
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"))
+    if moved:
+        conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM _odds_move"))
+        conn.execute(text("DROP TABLE _odds_move"))
+    return True
+
+def ensure_partitions(conn: Connection, months_ahead: int = ODDS_PARTITION_MONTHS_AHEAD,
+                      since: Optional[datetime] = None) -> int:
+    """
+    Havi partíciók a legkorábbi meglévő snapshottól (vagy a mostani hónaptól) months_ahead hónapig,
+    plusz egy default partíció a tartományon kívül érkező sorokra. Visszaad: új partíciók száma.
+    since: legalább ettől a hónaptól (pl. még be nem másolt adat legkorábbi captured_at-ja).
+    """
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+    this_month = month_start(datetime.utcnow())
+    first = conn.execute(text(f"SELECT min(captured_at) FROM {DEFAULT_PARTITION}")).scalar()
+    parts = list_partitions(conn)
+    start = min([this_month]
+                + ([month_start(first)] if first else [])
+                + ([month_start(since)] if since else [])
+                + ([parts[-1][1]] if parts else []))
+    created = 0
+    month = start
+    end = add_months(this_month, months_ahead)
+    while month <= end:
+        created += create_month(conn, month)
+        month = add_months(month, 1)
+    return created
+
+_ENSURE_LOCK_KEY = 0x6f646473   # pg_advisory_xact_lock: párhuzamos ingestek ne hozzák létre kétszer
+
+def ensure_partitions_for_ingest(conn: Connection,
+                                 months_ahead: int = ODDS_PARTITION_MONTHS_AHEAD) -> int:
+    """
+    Ingest elején: a hiányzó előre-partíciók pótlása, hogy az új snapshotok ne a defaultba essenek.
+    Gyors út: ha a legtávolabbi előre-hónap partíciója megvan, nincs teendő (egy katalógus-lekérdezés).
+    Nem particionált táblánál no-op. Commit a hívó dolga (rögtön, hogy a DDL zár ne tartson sokáig).
+    """
+    last = partition_name(add_months(month_start(datetime.utcnow()), months_ahead))
+    if conn.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": last}).scalar():
+        return 0
+    if not is_partitioned(conn):
+        return 0
+    conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _ENSURE_LOCK_KEY})
+    return ensure_partitions(conn, months_ahead)
+
+# hónaponként kulcsonként open/close/min/max – újrafuttatható (ON CONFLICT felülírja)
+_SQL_ROLLUP = """
+INSERT INTO odds_archive
+  (match_id, bookmaker_id, market, selection, month,
+   open_odds, close_odds, min_odds, max_odds, first_at, last_at, n_snapshots)
+SELECT o.match_id, o.bookmaker_id, o.market, o.selection, :month,
+       (array_agg(o.odds ORDER BY o.captured_at))[1],
+       (array_agg(o.odds ORDER BY o.captured_at DESC))[1],
+       MIN(o.odds), MAX(o.odds),
+       MIN(o.captured_at), MAX(COALESCE(o.last_seen_at, o.captured_at)), COUNT(*)
+FROM {part} o
+GROUP BY o.match_id, o.bookmaker_id, o.market, o.selection
+ON CONFLICT (match_id, bookmaker_id, market, selection, month) DO UPDATE
+SET open_odds = EXCLUDED.open_odds, close_odds = EXCLUDED.close_odds,
+    min_odds = EXCLUDED.min_odds, max_odds = EXCLUDED.max_odds,
+    first_at = EXCLUDED.first_at, last_at = EXCLUDED.last_at,
+    n_snapshots = EXCLUDED.n_snapshots
+"""
+
+def rollup_partition(conn: Connection, name: str, month: date) -> int:
+    return conn.execute(text(_SQL_ROLLUP.format(part=name)), {"month": month}).rowcount
+
+def retire_old_partitions(conn: Connection, retention_months: int = ODDS_RETENTION_MONTHS,
+                          drop: bool = False, now: Optional[datetime] = None) -> List[str]:
+    """
+    A retention_months-nál régebbi havi partíciókat összesíti az odds_archive-ba,
+    majd leválasztja (drop=True esetén törli is). Visszaad: az érintett partíciók nevei.
+    """
+    cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+    done = []
+    for name, month in list_partitions(conn):
+        if add_months(month, 1) > cutoff:
+            break
+        rollup_partition(conn, name, month)
+        conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        done.append(name)
+    return done
+
+def migrate_to_partitioned(conn: Connection) -> int:
+    """
+    Régi, nem particionált odds_snapshots átalakítása: átnevezés, particionált tábla létrehozása
+    (models.py szerint), havi partíciók, adatmásolás, régi tábla törlése. Visszaad: másolt sorok.
+    """
+    from .models import OddsSnapshot
+
+    if is_partitioned(conn):
+        return 0
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {PARENT}_legacy"))
+    # a régi constraint/index nevek ütköznének az újakkal
+    conn.execute(text(f"ALTER TABLE {PARENT}_legacy RENAME CONSTRAINT uq_odds_point_in_time "
+                      "TO uq_odds_point_in_time_legacy"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_odds_snapshots_seen"))
+    seq = conn.execute(text(f"SELECT pg_get_serial_sequence('{PARENT}_legacy', 'id')")).scalar()
+    OddsSnapshot.__table__.create(conn)
+    # a partíciók a régi adat első hónapjától, így a másolás rögtön a havi partíciókba ír (nem a defaultba)
+    first = conn.execute(text(f"SELECT min(captured_at) FROM {PARENT}_legacy")).scalar()
+    ensure_partitions(conn, since=first)
+    n = conn.execute(text(
+        f"INSERT INTO {PARENT} (id, match_id, bookmaker_id, market, selection, odds, "
+        "captured_at, last_seen_at) "
+        "SELECT id, match_id, bookmaker_id, market, selection, odds, captured_at, last_seen_at "
+        f"FROM {PARENT}_legacy")).rowcount
+    # az id sorszám folytatódjon
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT}', 'id'), "
+        f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM {PARENT}), 1))"))
+    conn.execute(text(f"DROP TABLE {PARENT}_legacy"))
+    if seq:
+        conn.execute(text(f"DROP SEQUENCE IF EXISTS {seq}"))
+    return n
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("ensure", help="Havi partíciók létrehozása (meglévő adat + előre)")
+    ap_m = sub.add_parser("maintain", help="Régi hónapok összesítése és leválasztása")
+    ap_m.add_argument("--retention-months", type=int, default=ODDS_RETENTION_MONTHS)
+    ap_m.add_argument("--drop", action="store_true", help="Leválasztás után törölje is")
+    sub.add_parser("migrate", help="Régi, nem particionált odds_snapshots átalakítása")
+    args = ap.parse_args()
+
+    with engine.begin() as conn:
+        if args.cmd == "migrate":
+            n = migrate_to_partitioned(conn)
+            print(f"✔ odds_snapshots partitioned (copied {n} rows)")
+        elif args.cmd == "ensure":
+            n = ensure_partitions(conn)
+            print(f"✔ odds_snapshots partitions ensured (created {n})")
+        else:
+            ensure_partitions(conn)
+            done = retire_old_partitions(conn, args.retention_months, args.drop)
+            print(f"✔ odds partitions rolled up and {'dropped' if args.drop else 'detached'}: "
+                  f"{', '.join(done) or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import json
+import re
 from datetime import datetime, timezone
-from typing import Tuple, List
+from typing import Iterator, Tuple, List, Union
 from .base import Fixture, OddsQuote
 
 def load_from_file(path: str) -> Tuple[List[Fixture], List[OddsQuote]]:
@@ -9,21 +10,184 @@ def load_from_file(path: str) -> Tuple[List[Fixture], List[OddsQuote]]:
 
     fixtures, odds = [], []
     for fx in data.get("fixtures", []):
-        fixtures.append(Fixture(
-            ext_match_id=str(fx["ext_match_id"]),
-            league=fx["league"],
-            home=fx["home"],
-            away=fx["away"],
-            start_time=datetime.fromisoformat(fx["start_time"]),
-        ))
+        fixtures.append(_fixture(fx))
     for q in data.get("odds", []):
-        odds.append(OddsQuote(
-            ext_match_id=str(q["ext_match_id"]),
-            bookmaker=q["bookmaker"],
-            market="1X2",
-            selection=q["selection"],
-            odds=float(q["odds"]),
-            captured_at=datetime.fromisoformat(q["captured_at"]),
-        ))
+        odds.append(_quote(q))
     return fixtures, odds
 
+def _fixture(fx: dict) -> Fixture:
+    return Fixture(
+        ext_match_id=str(fx["ext_match_id"]),
+        league=fx["league"],
+        home=fx["home"],
+        away=fx["away"],
+        start_time=datetime.fromisoformat(fx["start_time"]),
+    )
+
+def _quote(q: dict) -> OddsQuote:
+    return OddsQuote(
+        ext_match_id=str(q["ext_match_id"]),
+        bookmaker=q["bookmaker"],
+        market="1X2",
+        selection=q["selection"],
+        odds=float(q["odds"]),
+        captured_at=datetime.fromisoformat(q["captured_at"]),
+    )
+
+# -----------------------------
+# Streaming olvasás (nagy dumpok): a fájl sosem kerül egészben memóriába
+# -----------------------------
+Record = Union[Fixture, OddsQuote]
+
+READ_CHUNK = 1 << 20   # 1 MiB
+
+def _record(obj: dict, kind: str = "") -> Record:
+    """Egy JSON objektum -> Fixture / OddsQuote; kind híján a "kind" mezőből vagy a kulcsokból."""
+    kind = kind or obj.get("kind") or ("fixture" if "home" in obj else "odds")
+    return _fixture(obj) if kind == "fixture" else _quote(obj)
+
+class _JsonStream:
+    """Minimális inkrementális JSON olvasó: pufferelt raw_decode, a felhasznált rész eldobva."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.dec = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Következő nem-whitespace karakter ('' = fájl vége)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"expected {ch!r}, got {got!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.dec.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # szám a puffer végén lehet csonka -> csak teljes értéket fogadunk el
+            if end == len(self.buf) and not self.eof and not isinstance(obj, (dict, list, str)):
+                if self._fill():
+                    continue
+            self.pos = end
+            return obj
+
+    def array_items(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            ch = self.peek()
+            self.pos += 1
+            if ch == "]":
+                return
+            if ch != ",":
+                raise ValueError(f"expected ',' or ']', got {ch!r}")
+
+def _iter_ndjson(f) -> Iterator[Record]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield _record(json.loads(line))
+
+def _iter_document(f) -> Iterator[Record]:
+    """{"fixtures": [...], "odds": [...]} vagy egy felső szintű tömb, elemenként."""
+    s = _JsonStream(f)
+    if s.peek() == "[":
+        for obj in s.array_items():
+            yield _record(obj)
+        return
+    s.expect("{")
+    if s.peek() == "}":
+        return
+    while True:
+        key = s.value()
+        s.expect(":")
+        if key in ("fixtures", "odds") and s.peek() == "[":
+            kind = "fixture" if key == "fixtures" else "odds"
+            for obj in s.array_items():
+                yield _record(obj, kind)
+        else:
+            s.value()   # ismeretlen kulcs értéke: átugorjuk
+        ch = s.peek()
+        s.pos += 1
+        if ch == "}":
+            return
+        if ch != ",":
+            raise ValueError(f"expected ',' or '}}', got {ch!r}")
+
+# formátum-szimatolás: csak ekkora prefix (karakter); egy NDJSON rekord ennél jóval rövidebb
+SNIFF_CHARS = 64 * 1024
+
+_FIRST_KEY = re.compile(r'\{\s*"((?:[^"\\]|\\.)*)"\s*:\s*(\S)')
+
+def _detect_format(path: str) -> str:
+    """
+    Kiterjesztés, különben korlátos prefix: az első nem-whitespace karakter és az első kulcs.
+    Az első sort nem olvassuk be egészben (minifikált dokumentumnál az a teljes fájl).
+    """
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(SNIFF_CHARS)
+        eof = len(head) < SNIFF_CHARS
+    head = head.lstrip()
+    if not head.startswith("{"):
+        return "document"       # felső szintű tömb (vagy üres fájl)
+    m = _FIRST_KEY.match(head)
+    if m is None:
+        return "document"       # üres objektum
+    key, first = m.groups()
+    if key in ("fixtures", "odds") and first == "[":
+        return "document"       # NDJSON rekordban az "odds" szám, nem tömb
+    line, nl, _ = head.partition("\n")
+    if not (nl or eof):
+        return "document"       # az első sor hosszabb a prefixnél -> nem NDJSON rekord
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError:
+        return "document"       # több soros (pretty-print) dokumentum
+    return "document" if ("fixtures" in obj or isinstance(obj.get("odds"), list)) else "ndjson"
+
+def iter_feed(path: str, fmt: str = "auto") -> Iterator[Record]:
+    """
+    Fixture / OddsQuote generátor a feedből, konstans memóriával.
+    fmt: "ndjson" (soronként egy objektum, "kind": "fixture"|"odds" vagy kulcsokból kikövetkeztetve),
+    "document" ({"fixtures": [...], "odds": [...]} vagy felső szintű tömb), "auto" (kiterjesztés / a fájl eleje).
+    """
+    if fmt == "auto":
+        fmt = _detect_format(path)
+    with open(path, "r", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            yield from _iter_ndjson(f)
+        else:
+            yield from _iter_document(f)
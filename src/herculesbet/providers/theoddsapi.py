@@ -1,32 +1,34 @@
-import requests
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
 from .base import Fixture, OddsQuote
-from ..config import ODDS_API_KEY, ODDS_SPORT_KEY, ODDS_REGIONS, ODDS_MARKET
+from ..config import (
+    ODDS_API_KEY, ODDS_REGIONS, ODDS_API_BASE_URL, ODDS_SPORT_KEYS, ODDS_MARKETS,
+    ODDS_FETCH_CONCURRENCY, ODDS_FETCH_RETRIES, ODDS_FETCH_BACKOFF, ODDS_FETCH_TIMEOUT,
+    ODDS_QUOTA_MIN_REMAINING,
+)
 
-BASE_URL = "https://api.the-odds-api.com/v4"
+BASE_URL = ODDS_API_BASE_URL
+
+# ezekre érdemes újrapróbálni (rate limit, átmeneti szerverhiba); más 4xx azonnal hiba
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 def _iso_utc(s: str) -> datetime:
     # API ISO8601 → datetime (UTC)
     return datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
 
-def fetch_fixtures_and_odds() -> Tuple[List[Fixture], List[OddsQuote]]:
-    if not ODDS_API_KEY:
-        raise RuntimeError("ODDS_API_KEY missing in env")
-
-    url = f"{BASE_URL}/sports/{ODDS_SPORT_KEY}/odds"
-    params = {
-        "apiKey": ODDS_API_KEY,
-        "regions": ODDS_REGIONS,
-        "markets": ODDS_MARKET,
-        "oddsFormat": "decimal",
-    }
-    r = requests.get(url, params=params, timeout=20)
-    r.raise_for_status()
-    data = r.json()
-
+def parse_events(data: list, markets: Sequence[str]) -> Tuple[List[Fixture], List[OddsQuote]]:
+    """/sports/{sport}/odds válasz -> fixture-k + quote-ok (a kért piacokra)."""
     fixtures: List[Fixture] = []
     quotes: List[OddsQuote] = []
+    wanted = set(markets)
 
     for ev in data:
         ext_id = str(ev["id"])
@@ -53,7 +55,8 @@ def fetch_fixtures_and_odds() -> Tuple[List[Fixture], List[OddsQuote]]:
             bname = bk.get("title") or bk.get("key")
             captured = _iso_utc(bk["last_update"])
             for market in bk.get("markets", []):
-                if market.get("key") != ODDS_MARKET:
+                mkey = market.get("key")
+                if mkey not in wanted:
                     continue
                 for outc in market.get("outcomes", []):
                     oname = (outc.get("name") or "").strip()
@@ -76,7 +79,7 @@ def fetch_fixtures_and_odds() -> Tuple[List[Fixture], List[OddsQuote]]:
                     quotes.append(OddsQuote(
                         ext_match_id=ext_id,
                         bookmaker=bname,
-                        market="1X2" if ODDS_MARKET == "h2h" else ODDS_MARKET,
+                        market="1X2" if mkey == "h2h" else mkey,
                         selection=sel,
                         odds=float(price),
                         captured_at=captured,
@@ -84,3 +87,161 @@ def fetch_fixtures_and_odds() -> Tuple[List[Fixture], List[OddsQuote]]:
 
     return fixtures, quotes
 
+@dataclass
+class Quota:
+    """API kvóta a válaszfejlécekből (x-requests-remaining / -used / -last); szálbiztos."""
+    remaining: Optional[int] = None
+    used: Optional[int] = None
+    last_cost: Optional[int] = None
+    requests: int = 0
+    in_flight: int = 0     # elindított, még válasz nélküli kérések becsült költsége
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def update(self, headers) -> None:
+        def _int(name):
+            v = headers.get(name)
+            try:
+                return int(float(v)) if v is not None else None
+            except ValueError:
+                return None
+        with self._lock:
+            self.requests += 1
+            rem, used, last = (_int("x-requests-remaining"), _int("x-requests-used"),
+                               _int("x-requests-last"))
+            # párhuzamos válaszok sorrendje tetszőleges -> a legkisebb remaining / legnagyobb used nyer
+            if rem is not None:
+                self.remaining = rem if self.remaining is None else min(self.remaining, rem)
+            if used is not None:
+                self.used = used if self.used is None else max(self.used, used)
+            if last is not None:
+                self.last_cost = last
+
+    def reserve(self, cost: int, min_remaining: int) -> bool:
+        """Kérés előtt: a futó kérések várható költségével együtt belefér-e még a kvótába."""
+        with self._lock:
+            if self.remaining is not None and self.remaining - self.in_flight - cost < min_remaining:
+                return False
+            self.in_flight += cost
+            return True
+
+    def release(self, cost: int) -> None:
+        with self._lock:
+            self.in_flight -= cost
+
+class QuotaExhausted(RuntimeError):
+    pass
+
+@dataclass
+class FetchResult:
+    fixtures: List[Fixture] = field(default_factory=list)
+    quotes: List[OddsQuote] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)   # sport -> hibaüzenet
+    seconds: float = 0.0
+
+class OddsApiClient:
+    """
+    The Odds API kliens: egy keep-alive requests.Session (pool = concurrency),
+    sportonként egy kérés a kért piacokkal, ThreadPoolExecutor-ral párhuzamosan.
+    Újrapróbálás: hálózati hiba, 429 és 5xx -> exponenciális backoff (Retry-After-t követi).
+    """
+
+    def __init__(self, api_key: str = ODDS_API_KEY, base_url: str = BASE_URL,
+                 regions: str = ODDS_REGIONS, concurrency: int = ODDS_FETCH_CONCURRENCY,
+                 retries: int = ODDS_FETCH_RETRIES, backoff: float = ODDS_FETCH_BACKOFF,
+                 timeout: float = ODDS_FETCH_TIMEOUT,
+                 min_remaining: int = ODDS_QUOTA_MIN_REMAINING):
+        if not api_key:
+            raise RuntimeError("ODDS_API_KEY missing in env")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.regions = regions
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.min_remaining = min_remaining
+        self.quota = Quota()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _sleep_before_retry(self, attempt: int, resp: Optional[requests.Response]) -> None:
+        delay = self.backoff * (2 ** attempt)
+        if resp is not None and resp.headers.get("Retry-After"):
+            try:
+                delay = max(delay, float(resp.headers["Retry-After"]))
+            except ValueError:
+                pass
+        time.sleep(delay * (1 + 0.1 * random.random()))   # kis jitter, hogy a szálak ne egyszerre jöjjenek
+
+    def get_odds(self, sport: str, markets: Sequence[str]) -> list:
+        """Egy sport odds-listája (nyers JSON), újrapróbálással."""
+        url = f"{self.base_url}/sports/{sport}/odds"
+        params = {
+            "apiKey": self.api_key,
+            "regions": self.regions,
+            "markets": ",".join(markets),
+            "oddsFormat": "decimal",
+        }
+        # a The Odds API költsége: piacok x régiók
+        cost = len(markets) * max(1, len(self.regions.split(",")))
+        for attempt in range(self.retries + 1):
+            if not self.quota.reserve(cost, self.min_remaining):
+                raise QuotaExhausted(f"quota remaining {self.quota.remaining} "
+                                     f"(in flight {self.quota.in_flight}) < {self.min_remaining} + {cost}")
+            resp = None
+            try:
+                try:
+                    resp = self.session.get(url, params=params, timeout=self.timeout)
+                finally:
+                    self.quota.release(cost)
+                self.quota.update(resp.headers)
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                    return resp.json()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            if attempt == self.retries:
+                resp.raise_for_status()
+            self._sleep_before_retry(attempt, resp)
+        raise AssertionError("unreachable")
+
+    def fetch(self, sport: str, markets: Sequence[str]) -> Tuple[List[Fixture], List[OddsQuote]]:
+        return parse_events(self.get_odds(sport, markets), markets)
+
+    def fetch_many(self, sports: Sequence[str], markets: Sequence[str]) -> FetchResult:
+        """Minden sport párhuzamosan (legfeljebb concurrency szál); egy sport hibája nem állítja meg a többit."""
+        t0 = time.perf_counter()
+        out = FetchResult()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {sport: pool.submit(self.fetch, sport, markets) for sport in sports}
+            for sport, fut in futures.items():   # sport-sorrendben -> determinisztikus kimenet
+                try:
+                    fixtures, quotes = fut.result()
+                except Exception as e:
+                    out.errors[sport] = f"{type(e).__name__}: {e}"
+                    continue
+                out.fixtures.extend(fixtures)
+                out.quotes.extend(quotes)
+        out.seconds = time.perf_counter() - t0
+        return out
+
+def fetch_fixtures_and_odds(sports: Optional[Sequence[str]] = None,
+                            markets: Optional[Sequence[str]] = None) -> Tuple[List[Fixture], List[OddsQuote]]:
+    """Régi belépési pont: ODDS_SPORT_KEYS x ODDS_MARKETS; bármely sport hibája -> kivétel."""
+    with OddsApiClient() as client:
+        res = client.fetch_many(sports or ODDS_SPORT_KEYS, markets or ODDS_MARKETS)
+    if res.errors:
+        raise RuntimeError("; ".join(f"{s}: {e}" for s, e in res.errors.items()))
+    return res.fixtures, res.quotes
@@ -1,11 +1,16 @@
 from .db import SessionLocal
+from .metrics import cli
+from .models import ModelRun
 from .models_baseline import run
 
+@cli("model_baseline")
 def main():
     db = SessionLocal()
     run_id, n = run(db)
+    mr = db.get(ModelRun, run_id)
+    write = ((mr.params or {}) if mr else {}).get("prob_write", {})
     db.close()
-    print(f"✔ probabilities stored for {n} matches (model_run_id={run_id})")
+    print(f"✔ probabilities stored for {n} matches (model_run_id={run_id}, write {write.get('rows', 0)} rows in {write.get('seconds', 0.0)}s)")
 
 if __name__ == "__main__":
     main()
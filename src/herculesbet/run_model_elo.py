@@ -1,11 +1,16 @@
 from .db import SessionLocal
+from .metrics import cli
+from .models import ModelRun
 from .models_elo import run_elo
 
+@cli("model_elo")
 def main():
     db = SessionLocal()
     run_id, n = run_elo(db)
+    mr = db.get(ModelRun, run_id)
+    write = ((mr.params or {}) if mr else {}).get("prob_write", {})
     db.close()
-    print(f"✔ ELO model probabilities stored for {n} matches (model_run_id={run_id})")
+    print(f"✔ ELO model probabilities stored for {n} matches (model_run_id={run_id}, write {write.get('rows', 0)} rows in {write.get('seconds', 0.0)}s)")
 
 if __name__ == "__main__":
     main()
@@ -1,40 +1,246 @@
+"""
+Pipeline: ingest -> modellek -> pickek -> settlement, stage-gráfként.
+
+inprocess (alap): egy interpreter, egy közös engine (connection pool); minden stage saját
+Session-t kap, a függőségeik lefutása után indul, a független stage-ek (pl. Poisson és ELO)
+párhuzamosan futnak (PIPELINE_WORKERS szál). Hibás stage -> a ráépülők skipped.
+subprocess (fallback): a régi viselkedés, modulonként `python -m`, sorban.
+Mindkét mód stage-enkénti falióra-időt (és inprocess módban sorszámot) ír a
+pipeline_runs / pipeline_stages táblába.
+"""
+import argparse
+import importlib
 import os
-import sys
 import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
 
-def run(modname: str):
-    print(f"[{datetime.utcnow().isoformat()}Z] -> python -m {modname}", flush=True)
-    subprocess.run([sys.executable, "-m", modname], check=True)
+from .config import PIPELINE_MODE, PIPELINE_WORKERS, PIPELINE_MODELS
+from .db import SessionLocal
+from .metrics import cli, record_stage, stage as metrics_stage
+from .models import PipelineRun, PipelineStage
 
-def main():
-    # Opcionális: csak akkor próbáljuk az API-Football ingestet, ha van kulcs
-    api_football_key = os.getenv("API_FOOTBALL_KEY", "").strip()
+@dataclass
+class Stage:
+    name: str
+    module: str                       # subprocess módban: python -m <module>
+    fn: Callable[..., Optional[int]]  # inprocess: fn(db) -> sorok száma (vagy None)
+    deps: Tuple[str, ...] = ()
+    optional: bool = False            # hibája csak WARN, a ráépülők futnak
+    env: Dict[str, str] = field(default_factory=dict)   # subprocess módban extra env
 
-    # 1) The Odds API ingest (biztosan működik nálad)
-    run("herculesbet.ingest_theodds")
+@dataclass
+class StageResult:
+    status: str                       # ok|failed|skipped
+    started_at: Optional[datetime] = None
+    seconds: Optional[float] = None
+    rows: Optional[int] = None
+    error: Optional[str] = None
 
-    # 2) API-Football ingest (ha van kulcsod és be van kötve)
-    if api_football_key:
-        try:
-            run("herculesbet.ingest_apifootball")
-        except Exception as e:
-            print(f"[WARN] ingest_apifootball skipped with error: {e}", flush=True)
+# -----------------------------
+# Stage függvények (a modulok importja lusta: subprocess módban nem kell)
+# -----------------------------
+def _ingest(db) -> int:
+    from .ingest_theodds import ingest
+    res, quota, n_odds = ingest(db)
+    print(f"  the-odds-api fixtures={len(res.fixtures)} odds={len(res.quotes)} "
+          f"(quota remaining={quota.remaining})", flush=True)
+    return n_odds
 
-    # 3) Modellek
-    run("herculesbet.run_model_poisson")
+def _apifootball(db) -> None:
+    importlib.import_module("herculesbet.ingest_apifootball").main()
 
-    # 4) Picks generálás
-    run("herculesbet.generate_picks")
+def _poisson(db) -> int:
+    from .models_poisson import run_poisson
+    return run_poisson(db)[1]
 
-if __name__ == "__main__":
+def _elo(db) -> int:
+    from .models_elo import run_elo
+    return run_elo(db)[1]
+
+MODEL_STAGES = {
+    # név PIPELINE_MODELS-ben -> (stage, modul, fn, model_runs.model_name modul + attribútum)
+    "poisson": ("model_poisson", "herculesbet.run_model_poisson", _poisson, "models_poisson"),
+    "elo": ("model_elo", "herculesbet.run_model_elo", _elo, "models_elo"),
+}
+
+def _picks_fn(model_name: str):
+    def _picks(db) -> int:
+        from .generate_picks import run_once
+        counts = run_once(db, model=model_name)
+        db.commit()
+        return counts.inserted + counts.updated
+    return _picks
+
+def _settle(db) -> int:
+    from .settlement import settle_finished_matches
+    return settle_finished_matches(db)
+
+def build_stages(models: List[str] = PIPELINE_MODELS) -> List[Stage]:
+    """A pipeline gráfja; a sorrend egyben a subprocess mód (topologikus) sorrendje."""
+    unknown = [m for m in models if m not in MODEL_STAGES]
+    if unknown or not models:
+        raise ValueError(f"unknown PIPELINE_MODELS: {unknown or models} (known: {', '.join(MODEL_STAGES)})")
+
+    stages = [Stage("ingest", "herculesbet.ingest_theodds", _ingest)]
+    if os.getenv("API_FOOTBALL_KEY", "").strip():
+        stages.append(Stage("ingest_apifootball", "herculesbet.ingest_apifootball", _apifootball,
+                            deps=("ingest",), optional=True))
+    ingest_deps = tuple(s.name for s in stages)
+    model_deps = []
+    for m in models:
+        name, module, fn, _ = MODEL_STAGES[m]
+        stages.append(Stage(name, module, fn, deps=ingest_deps))
+        model_deps.append(name)
+
+    # több párhuzamos modell mellett a "legutolsó model_run" nem egyértelmű -> PICKS_MODEL vagy az első
+    picks_model = os.getenv("PICKS_MODEL", "")
+    if not picks_model and len(models) > 1:
+        picks_model = importlib.import_module(f"herculesbet.{MODEL_STAGES[models[0]][3]}").MODEL_NAME
+    stages.append(Stage("picks", "herculesbet.generate_picks", _picks_fn(picks_model),
+                        deps=tuple(model_deps), env={"PICKS_MODEL": picks_model} if picks_model else {}))
+    stages.append(Stage("settlement", "herculesbet.settlement", _settle, deps=("picks",)))
+    return stages
+
+# -----------------------------
+# Futtatás
+# -----------------------------
+def _log(msg: str) -> None:
+    print(f"[{datetime.utcnow().isoformat()}Z] {msg}", flush=True)
+
+def _run_stage_inprocess(stage: Stage) -> StageResult:
+    started = datetime.utcnow()
+    t0 = time.perf_counter()
+    db = SessionLocal()
     try:
-        main()
-        print(f"[{datetime.utcnow().isoformat()}Z] DONE", flush=True)
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] step failed: {e}", flush=True)
-        sys.exit(1)
+        with metrics_stage(stage.name):
+            rows = stage.fn(db)
+        return StageResult("ok", started, time.perf_counter() - t0, rows)
     except Exception as e:
-        print(f"[ERROR] unexpected: {e}", flush=True)
+        db.rollback()
+        return StageResult("failed", started, time.perf_counter() - t0, error=f"{type(e).__name__}: {e}")
+    finally:
+        db.close()
+
+def _run_stage_subprocess(stage: Stage) -> StageResult:
+    started = datetime.utcnow()
+    t0 = time.perf_counter()
+    _log(f"-> python -m {stage.module}")
+    proc = subprocess.run([sys.executable, "-m", stage.module], env={**os.environ, **stage.env})
+    secs = time.perf_counter() - t0
+    record_stage(stage.name, secs, proc.returncode == 0)
+    if proc.returncode != 0:
+        return StageResult("failed", started, secs, error=f"exit code {proc.returncode}")
+    return StageResult("ok", started, secs)
+
+def _blocked(stage: Stage, results: Dict[str, StageResult], by_name: Dict[str, Stage]) -> bool:
+    """Van-e olyan függőség, ami hibázott / kimaradt (opcionális stage hibája nem blokkol)."""
+    for d in stage.deps:
+        r = results[d]
+        if r.status == "skipped" or (r.status == "failed" and not by_name[d].optional):
+            return True
+    return False
+
+def run_inprocess(stages: List[Stage], workers: int = PIPELINE_WORKERS,
+                  on_done: Callable[[Stage, StageResult], None] = lambda s, r: None) -> Dict[str, StageResult]:
+    """Egy stage akkor indul, ha minden függősége kész; a független stage-ek párhuzamosan."""
+    by_name = {s.name: s for s in stages}
+    results: Dict[str, StageResult] = {}
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            for s in list(pending):
+                if not all(d in results for d in s.deps):
+                    continue
+                pending.remove(s)
+                if _blocked(s, results, by_name):
+                    results[s.name] = StageResult("skipped", error="dependency failed")
+                    on_done(s, results[s.name])
+                    continue
+                _log(f"-> {s.name}")
+                running[pool.submit(_run_stage_inprocess, s)] = s
+            if not running:
+                continue   # csak skipped-ek születtek -> újra a pending-re
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                s = running.pop(fut)
+                results[s.name] = fut.result()
+                on_done(s, results[s.name])
+    return results
+
+def run_subprocess(stages: List[Stage],
+                   on_done: Callable[[Stage, StageResult], None] = lambda s, r: None) -> Dict[str, StageResult]:
+    """Régi mód: modulonként új interpreter, a stage-lista sorrendjében."""
+    by_name = {s.name: s for s in stages}
+    results: Dict[str, StageResult] = {}
+    for s in stages:
+        if _blocked(s, results, by_name):
+            results[s.name] = StageResult("skipped", error="dependency failed")
+        else:
+            results[s.name] = _run_stage_subprocess(s)
+        on_done(s, results[s.name])
+    return results
+
+def _print_result(stage: Stage, r: StageResult) -> None:
+    if r.status == "ok":
+        rows = "" if r.rows is None else f" rows={r.rows}"
+        print(f"✔ {stage.name:<20} {r.seconds:7.2f}s{rows}", flush=True)
+    elif r.status == "failed" and stage.optional:
+        print(f"[WARN] {stage.name} skipped with error: {r.error}", flush=True)
+    else:
+        print(f"[{'ERROR' if r.status == 'failed' else 'SKIP'}] {stage.name}: {r.error}", flush=True)
+
+def run_pipeline(mode: str = PIPELINE_MODE, models: List[str] = PIPELINE_MODELS,
+                 workers: int = PIPELINE_WORKERS) -> Tuple[int, str, Dict[str, StageResult]]:
+    """Lefuttatja a gráfot és naplózza a DB-be; visszaad: (pipeline_runs.id, ok|failed, stage-eredmények)."""
+    stages = build_stages(models)
+    log = SessionLocal()
+    try:
+        run = PipelineRun(mode=mode)
+        log.add(run); log.commit(); log.refresh(run)
+        t0 = time.perf_counter()
+
+        def on_done(stage: Stage, r: StageResult) -> None:
+            _print_result(stage, r)
+            log.add(PipelineStage(run_id=run.id, stage=stage.name, status=r.status,
+                                  started_at=r.started_at, seconds=r.seconds, rows=r.rows,
+                                  error=(r.error or None) and r.error[:1000]))
+            log.commit()
+
+        if mode == "subprocess":
+            results = run_subprocess(stages, on_done)
+        else:
+            results = run_inprocess(stages, workers, on_done)
+
+        failed = any(results[s.name].status != "ok" and not s.optional for s in stages)
+        run.status = "failed" if failed else "ok"
+        run.seconds = time.perf_counter() - t0
+        run.finished_at = datetime.utcnow()
+        log.commit()
+        return run.id, run.status, results
+    finally:
+        log.close()
+
+@cli("pipeline")
+def main():
+    ap = argparse.ArgumentParser(description="Pipeline: ingest -> modellek -> pickek -> settlement")
+    ap.add_argument("--mode", choices=("inprocess", "subprocess"), default=PIPELINE_MODE)
+    ap.add_argument("--models", type=lambda s: [m.strip() for m in s.split(",") if m.strip()],
+                    default=PIPELINE_MODELS, help="pl. poisson,elo (párhuzamosan futnak)")
+    ap.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    run_id, status, _ = run_pipeline(args.mode, args.models, args.workers)
+    if status != "ok":
+        _log(f"FAILED (pipeline_run_id={run_id})")
         sys.exit(1)
+    _log(f"DONE [{args.mode}] in {time.perf_counter() - t0:.2f}s (pipeline_run_id={run_id})")
 
+if __name__ == "__main__":
+    main()
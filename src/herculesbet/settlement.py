@@ -1,85 +1,60 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import bindparam, text
 from .db import SessionLocal
-from .models import Match, OddsSnapshot, EdgePick, BankrollLog
+from .models import BankrollLog
+from .metrics import add_rows, cli, staged
+from .stats import invalidate_pick_stats
 
-def _match_result(m: Match) -> str | None:
-    if m.home_score is None or m.away_score is None:
-        return None
-    if m.home_score > m.away_score:
-        return "H"
-    if m.home_score < m.away_score:
-        return "A"
-    return "D"
+# függő (megtett) pickek: 'proposed'/'placed'; a generate_picks 'open' ajánlásai nem fogadások,
+# ezért nem záródnak le és a bankroll logba sem számítanak
+PENDING_STATUSES = ("proposed", "placed")
 
-def _closing_odds(db: Session, match_id: int, selection: str, bookmaker_id: int) -> float | None:
-    row = (
-        db.query(func.max(OddsSnapshot.captured_at))
-        .filter(OddsSnapshot.match_id == match_id,
-                OddsSnapshot.bookmaker_id == bookmaker_id,     # <-- EZ ÚJ
-                OddsSnapshot.market == "1X2",
-                OddsSnapshot.selection == selection)
-        .one()
-    )
-    last_ts = row[0]
-    if not last_ts:
-        return None
-    o = (
-        db.query(OddsSnapshot.odds)
-        .filter(OddsSnapshot.match_id == match_id,
-                OddsSnapshot.bookmaker_id == bookmaker_id,     # <-- EZ ÚJ
-                OddsSnapshot.market == "1X2",
-                OddsSnapshot.selection == selection,
-                OddsSnapshot.captured_at == last_ts)
-        .scalar()
-    )
-    return float(o) if o is not None else None
+# Egyetlen set-alapú UPDATE: eredmény a meccs állásából, closing odds az odds_latest-ből
+# (kulcsonként pontosan az utolsó tárolt ár, PK-lookup), profit/CLV egység-bankroll modellel.
+# stake_fraction a bankroll %-a; valódi HUF tétnél a bet placementnél kell a tétet eltárolni.
+SQL_SETTLE = text("""
+WITH pending AS (
+  SELECT ep.id,
+         CASE WHEN m.home_score > m.away_score THEN 'H'
+              WHEN m.home_score < m.away_score THEN 'A'
+              ELSE 'D' END AS res,
+         cl.odds AS closing_odds
+  FROM edge_picks ep
+  JOIN matches m ON m.id = ep.match_id
+  LEFT JOIN odds_latest cl
+    ON cl.match_id = ep.match_id AND cl.bookmaker_id = ep.bookmaker_id
+   AND cl.market = '1X2' AND cl.selection = ep.selection
+  WHERE m.status = 'finished'
+    AND m.home_score IS NOT NULL AND m.away_score IS NOT NULL
+    AND ep.status IN :pending
+)
+UPDATE edge_picks ep
+SET status = 'settled',
+    result = CASE WHEN p.res = ep.selection THEN 'win' ELSE 'loss' END,
+    profit = CASE WHEN p.res = ep.selection THEN ep.stake_fraction * (ep.offered_odds - 1.0)
+                  ELSE -ep.stake_fraction END,
+    closing_odds = p.closing_odds,
+    clv = (ep.offered_odds - p.closing_odds) / NULLIF(p.closing_odds, 0)
+FROM pending p
+WHERE ep.id = p.id
+RETURNING ep.profit
+""").bindparams(bindparam("pending", expanding=True))
 
+@staged("settlement")
 def settle_finished_matches(db: Session, starting_bankroll: float | None = None):
     """
-    Az összes 'proposed' vagy 'placed' picket lezárja, ha a meccs 'finished'.
+    Az összes függő ('proposed', 'placed') picket lezárja, ha a meccs 'finished'.
     Számolja: result, profit, closing_odds, CLV, és opcionálisan bankroll logot frissít.
     CLV = (offered_odds - closing_odds) / closing_odds
+    Egy UPDATE + opcionális bankroll log, egy tranzakcióban.
     """
-    # gyűjtsük ki azokat a pickeket, ahol a match finished
-    rows = (
-        db.query(EdgePick, Match)
-        .join(Match, EdgePick.match_id == Match.id)
-        .filter(Match.status == "finished",
-                EdgePick.status.in_(["proposed", "placed"]))
-        .all()
-    )
-    settled = 0
-    total_profit = 0.0
-
-    for ep, m in rows:
-        res = _match_result(m)
-        if not res:
-            continue
-
-        ep.status = "settled"
-        if res == ep.selection:
-            # win -> profit = stake * (odds - 1)
-            # stake_fraction a bankroll %-a volt; settlementkor nincs tényleges BR, így jelképesen 1.0 egység BR-rel számolunk,
-            # a "profit" mezőt HUF-ban tartjuk általában tényleges tétek alapján. Itt egyszerűsítünk:
-            # ha valódi téttel dolgozunk, a bet placementnél kell eltárolni a HUF összeget is.
-            # Most: "egység-bankroll" feltételezéssel:
-            profit = ep.stake_fraction * (ep.offered_odds - 1.0)
-            ep.profit = profit
-            ep.result = "win"
-        else:
-            profit = -ep.stake_fraction
-            ep.profit = profit
-            ep.result = "loss"
-
-        co = _closing_odds(db, ep.match_id, ep.selection, ep.bookmaker_id)
-        ep.closing_odds = co
-        if co:
-            ep.clv = (ep.offered_odds - co) / co
-
-        total_profit += profit
-        settled += 1
+    profits = db.execute(SQL_SETTLE, {"pending": list(PENDING_STATUSES)}).scalars().all()
+    settled = len(profits)
+    add_rows(settled, "picks_settled")
+    total_profit = float(sum(profits))
+    if settled:
+        invalidate_pick_stats(db)
 
     # opcionális bankroll log
     if starting_bankroll is not None and settled:
@@ -91,6 +66,7 @@ def settle_finished_matches(db: Session, starting_bankroll: float | None = None)
     db.commit()
     return settled
 
+@cli("settlement")
 def main():
     import argparse
     ap = argparse.ArgumentParser()
@@ -0,0 +1,61 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+STATS_FIELDS = ("picks_total", "picks_settled", "wins", "profit_sum_units", "avg_edge", "avg_clv")
+
+# Egyetlen aggregáló menet az edge_picks-en (FILTER), a korábbi hat külön lekérdezés helyett
+SQL_PICK_STATS = """
+SELECT count(*)                                                  AS picks_total,
+       count(*) FILTER (WHERE status = 'settled')                AS picks_settled,
+       count(*) FILTER (WHERE status = 'settled' AND result = 'win') AS wins,
+       COALESCE(sum(profit) FILTER (WHERE status = 'settled'), 0.0) AS profit_sum_units,
+       avg(edge)                                                 AS avg_edge,
+       avg(clv)                                                  AS avg_clv
+FROM edge_picks
+"""
+
+SQL_COMPUTE_STATS = text(SQL_PICK_STATS)
+
+# Írók (generate_picks / settlement): csak a verziót léptetik a saját tranzakciójukban,
+# a teljes aggregátum nem fut minden írásnál. Hiányzó sor -> beszúrás "elavult" állapotban.
+SQL_INVALIDATE_STATS = text("""
+INSERT INTO pick_stats (id, picks_total, picks_settled, wins, profit_sum_units,
+                        version, computed_version, updated_at)
+VALUES (1, 0, 0, 0, 0.0, 1, 0, now())
+ON CONFLICT (id) DO UPDATE SET version = pick_stats.version + 1
+""")
+
+SQL_CACHED_STATS = text(f"SELECT {', '.join(STATS_FIELDS)}, version = computed_version AS fresh "
+                        "FROM pick_stats WHERE id = 1")
+
+# Olvasó: elavult gyorsítótár -> egy aggregáló menet. A v.version az utasítás snapshotjából jön,
+# így az aggregátum minden addigi írót lát; a később commitoló író újra lépteti a verziót.
+# Párhuzamos olvasó közül csak az első ír (a feltételt a frissített soron újraértékeli a Postgres),
+# a többi üres RETURNING után a már friss sort olvassa.
+SQL_RECOMPUTE_STATS = text("""
+WITH v AS (SELECT version FROM pick_stats WHERE id = 1),
+     s AS (""" + SQL_PICK_STATS + """)
+UPDATE pick_stats p
+SET picks_total = s.picks_total,
+    picks_settled = s.picks_settled,
+    wins = s.wins,
+    profit_sum_units = s.profit_sum_units,
+    avg_edge = s.avg_edge,
+    avg_clv = s.avg_clv,
+    computed_version = v.version,
+    updated_at = now()
+FROM v, s
+WHERE p.id = 1 AND p.computed_version < v.version
+RETURNING """ + ", ".join(f"s.{f}" for f in STATS_FIELDS) + """
+""")
+
+def invalidate_pick_stats(db: Session) -> None:
+    """pick_stats elavulttá jelölése a hívó tranzakciójában (az edge_picks-et író jobok hívják)."""
+    db.execute(SQL_INVALIDATE_STATS)
+
+def summary_from_row(row) -> dict:
+    d = dict(zip(STATS_FIELDS, row))
+    d["avg_edge"] = d["avg_edge"] or 0.0
+    d["hit_rate"] = (d["wins"] / d["picks_settled"]) if d["picks_settled"] else None
+    return {k: d[k] for k in ("picks_total", "picks_settled", "wins", "hit_rate",
+                              "profit_sum_units", "avg_edge", "avg_clv")}
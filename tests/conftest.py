@@ -0,0 +1,5 @@
+import os
+import sys
+
+# a csomag a src/ alatt van, telepítés nélkül
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
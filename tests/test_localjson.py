@@ -0,0 +1,62 @@
+import json
+import tracemalloc
+
+import pytest
+
+from herculesbet.providers import localjson
+from herculesbet.providers.base import Fixture, OddsQuote
+from herculesbet.providers.localjson import _detect_format, iter_feed, load_from_file
+
+def _feed(n_matches: int) -> dict:
+    fixtures, odds = [], []
+    for i in range(n_matches):
+        ext = f"m-{i}"
+        fixtures.append({"ext_match_id": ext, "league": "Test League", "home": f"Home {i}",
+                         "away": f"Away {i}", "start_time": "2025-01-04T15:00:00"})
+        for sel, o in (("H", 2.05 + i / 1000), ("D", 3.4), ("A", 3.85)):
+            odds.append({"ext_match_id": ext, "bookmaker": "Book", "selection": sel,
+                         "odds": o, "captured_at": "2025-01-03T12:00:00"})
+    return {"fixtures": fixtures, "odds": odds}
+
+def _split(records):
+    records = list(records)
+    return ([r for r in records if isinstance(r, Fixture)],
+            [r for r in records if isinstance(r, OddsQuote)])
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # kis puffer: az értékek (számok, stringek) a puffer határán is átnyúlnak
+    monkeypatch.setattr(localjson, "READ_CHUNK", 7)
+
+def test_minified_document_matches_load_from_file(tmp_path):
+    path = tmp_path / "feed.json"
+    path.write_text(json.dumps(_feed(50)), encoding="utf-8")   # egyetlen sor
+    assert _detect_format(str(path)) == "document"
+    assert _split(iter_feed(str(path))) == load_from_file(str(path))
+
+def test_ndjson_matches_load_from_file(tmp_path):
+    data = _feed(50)
+    doc = tmp_path / "feed.json"
+    doc.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    nd = tmp_path / "feed.txt"       # kiterjesztés nélkül: a tartalomból ismeri fel
+    with open(nd, "w", encoding="utf-8") as f:
+        for fx in data["fixtures"]:
+            f.write(json.dumps({"kind": "fixture", **fx}) + "\n")
+        for q in data["odds"]:
+            f.write(json.dumps(q) + "\n")    # "kind" nélkül, az "odds" kulcs szám
+    assert _detect_format(str(nd)) == "ndjson"
+    assert _split(iter_feed(str(nd))) == load_from_file(str(doc))
+    assert _split(iter_feed(str(doc))) == load_from_file(str(doc))
+
+def test_auto_detect_does_not_load_minified_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(localjson, "READ_CHUNK", 64 * 1024)
+    path = tmp_path / "big.json"
+    path.write_text(json.dumps(_feed(20_000)), encoding="utf-8")   # ~5 MB, egy sor
+    tracemalloc.start()
+    try:
+        n = sum(1 for _ in iter_feed(str(path), "auto"))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert n == 80_000
+    assert peak < path.stat().st_size // 4